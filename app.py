@@ -1,5 +1,8 @@
 # Add this at the top with other imports
 import uuid
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import streamlit as st
 import os
@@ -15,52 +18,130 @@ st.set_page_config(
 )
 
 # Import our modules - removing chat_history and session_management imports
-from philosophers import PHILOSOPHERS, get_philosopher, get_all_philosophers
+from philosophers import PHILOSOPHERS, get_philosopher, get_all_philosophers, get_system_message, PERSONA_PROMPTS
 from groq_client import GroqClient
+from context_window import build_context
 
 # Load environment variables
 load_dotenv()
 
 # Simplified functions without session saving
-def get_philosopher_response(user_input):
-    """Get response from the philosopher"""
-    philosopher = PHILOSOPHERS[st.session_state.current_philosopher]
+def build_philosopher_messages():
+    """Build the message list sent to the philosopher within the token budget"""
+    # Only the turns not yet folded into the rolling summary are candidates
+    history = st.session_state.messages[st.session_state.context_folded:]
     
-    # Create a properly ordered message list
-    messages = []
+    window = build_context(
+        get_system_message(st.session_state.current_philosopher),
+        history,
+        summary=st.session_state.context_summary,
+        persona_prompts=PERSONA_PROMPTS
+    )
     
-    # First add system message
-    messages.append({'role': 'system', 'content': philosopher['system_message']})
+    # Remember what was folded so the next turn does not re-send it
+    st.session_state.context_summary = window.summary
+    st.session_state.context_folded += window.folded
     
-    # Add conversation history
-    history = st.session_state.messages.copy()
-    
-    # Add all previous messages
-    for msg in history:
-        messages.append(msg)
-    
-    # Create a new Groq client instance
-    groq_client = GroqClient()
-    
-    # Get response from Groq
+    return window.messages
+
+def reset_context_window():
+    """Forget the rolling summary when a different chat is loaded"""
+    st.session_state.context_summary = ''
+    st.session_state.context_folded = 0
+
+def stream_philosopher_response():
+    """Stream the philosopher's response token by token"""
     try:
-        response = groq_client.generate_response(messages)
-        return response
+        # Create a new Groq client instance
+        groq_client = GroqClient()
+        yield from groq_client.stream_response(
+            build_philosopher_messages(),
+            philosopher=st.session_state.current_philosopher
+        )
     except Exception as e:
         print(f"Error getting response: {e}")
-        return "I apologize, but I need a moment to gather my thoughts. Please try your question again."
+        yield "I apologize, but I need a moment to gather my thoughts. Please try your question again."
+
+@st.cache_resource
+def get_summary_executor():
+    """Background executor shared by all sessions for summary generation"""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary")
 
-def summarize_conversation(messages):
-    """Generate a summary of the conversation"""
-    if not messages or len(messages) < 2:
-        return "New conversation"
+def transcript_hash(messages):
+    """Stable hash of a transcript, used to skip re-summarizing unchanged chats"""
+    return hashlib.sha256(json.dumps(messages, sort_keys=True).encode()).hexdigest()
+
+def request_summary(chat_id):
+    """Refresh a chat's summary in the background if its transcript changed.
+    
+    Only the turns added since the last summary are sent, together with that
+    summary. The chat keeps showing its last known summary until the job
+    finishes and collect_summaries() picks up the result.
+    """
+    chat = st.session_state.chats.get(chat_id)
+    if not chat or len(chat['messages']) < 2:
+        return
+    
+    messages = chat['messages']
+    digest = transcript_hash(messages)
+    if chat.get('summary_hash') == digest:
+        return
+    
+    job = st.session_state.summary_jobs.get(chat_id)
+    if job and job['hash'] == digest:
+        return
     
+    summarized = chat.get('summarized_count', 0)
+    previous_summary = chat.get('summary') if summarized else None
     try:
+        # Create the client here: st.secrets is only reliable on the script thread
         groq_client = GroqClient()
-        return groq_client.summarize_conversation(messages)
     except Exception as e:
         print(f"Error summarizing conversation: {e}")
-        return "Philosophical dialogue"
+        return
+    
+    st.session_state.summary_jobs[chat_id] = {
+        'hash': digest,
+        'count': len(messages),
+        'future': get_summary_executor().submit(
+            groq_client.summarize_incremental, previous_summary, messages[summarized:]
+        )
+    }
+
+def collect_summaries():
+    """Apply finished background summaries to their chats"""
+    for chat_id, job in list(st.session_state.summary_jobs.items()):
+        if not job['future'].done():
+            continue
+        del st.session_state.summary_jobs[chat_id]
+        
+        chat = st.session_state.chats.get(chat_id)
+        if chat is None:
+            continue
+        try:
+            summary = job['future'].result()
+        except Exception as e:
+            # Keep the last good summary; the transcript is summarized again on the next save
+            print(f"Error summarizing conversation: {e}")
+            continue
+        chat['summary'] = summary
+        chat['summary_hash'] = job['hash']
+        chat['summarized_count'] = job['count']
+
+def save_current_chat():
+    """Store the current chat in the chats dictionary and refresh its summary in the background"""
+    chat_id = st.session_state.current_chat_id
+    previous = st.session_state.chats.get(chat_id, {})
+    st.session_state.chats[chat_id] = {
+        'messages': st.session_state.messages.copy(),
+        'philosopher': st.session_state.current_philosopher,
+        'timestamp': datetime.now().isoformat(),
+        # Show the last known summary until the new one is ready
+        'summary': previous.get('summary', "New conversation"),
+        'summary_hash': previous.get('summary_hash'),
+        'summarized_count': previous.get('summarized_count', 0)
+    }
+    request_summary(chat_id)
 
 def create_new_chat():
     """Create a new chat session"""
@@ -73,16 +154,11 @@ def create_new_chat():
     
     # Save current chat if it exists
     if 'current_chat_id' in st.session_state and st.session_state.messages:
-        current_id = st.session_state.current_chat_id
-        st.session_state.chats[current_id] = {
-            'messages': st.session_state.messages.copy(),
-            'philosopher': st.session_state.current_philosopher,
-            'timestamp': datetime.now().isoformat(),
-            'summary': summarize_conversation(st.session_state.messages)
-        }
+        save_current_chat()
     
     # Create new empty chat
     st.session_state.messages = []
+    reset_context_window()
     st.session_state.current_chat_id = chat_id
     st.session_state.summary = "New conversation"
     
@@ -104,20 +180,15 @@ def switch_chat(chat_id):
     if chat_id not in st.session_state.chats:
         st.error(f"Chat {chat_id} not found")
         return
-        
+    
     # Save current chat
     if st.session_state.messages:
-        current_id = st.session_state.current_chat_id
-        st.session_state.chats[current_id] = {
-            'messages': st.session_state.messages.copy(),
-            'philosopher': st.session_state.current_philosopher,
-            'timestamp': datetime.now().isoformat(),
-            'summary': summarize_conversation(st.session_state.messages)
-        }
+        save_current_chat()
     
     # Load selected chat
     chat_data = st.session_state.chats[chat_id]
     st.session_state.messages = chat_data['messages'].copy()  # Use copy to avoid reference issues
+    reset_context_window()
     st.session_state.current_philosopher = chat_data['philosopher']
     st.session_state.current_chat_id = chat_id
     
@@ -144,6 +215,7 @@ def delete_chat(chat_id):
                 # Load that chat
                 chat_data = st.session_state.chats[new_chat_id]
                 st.session_state.messages = chat_data['messages'].copy()
+                reset_context_window()
                 st.session_state.current_philosopher = chat_data['philosopher']
                 st.session_state.current_chat_id = new_chat_id
             else:
@@ -172,6 +244,13 @@ if 'current_chat_id' not in st.session_state:
     st.session_state.current_chat_id = f"chat_{uuid.uuid4().hex[:8]}_{int(time.time())}"
 if 'summary' not in st.session_state:
     st.session_state.summary = "New conversation"
+if 'context_summary' not in st.session_state:
+    reset_context_window()
+if 'summary_jobs' not in st.session_state:
+    st.session_state.summary_jobs = {}
+
+# Pick up summaries that finished in the background since the last run
+collect_summaries()
 
 # Sidebar for chat history only
 with st.sidebar:
@@ -263,31 +342,19 @@ for message in st.session_state.messages:
 
 # Chat input
 if prompt := st.chat_input('What philosophical question would you like to explore?'):
-    # Add user message to chat history
+    # Add user message to chat history and display it immediately
     st.session_state.messages.append({'role': 'user', 'content': prompt})
-    
-    # Force a rerun to display the user message immediately
-    st.rerun()
+    with st.chat_message("user", avatar="👤"):
+        st.write(prompt)
 
-# Check if we need to generate a response (when the last message is from the user)
+# Generate a response when the last message is from the user
 if st.session_state.messages and st.session_state.messages[-1]['role'] == 'user':
-    with st.spinner(f"{current_philosopher['name']} is contemplating..."):
-        # Get the last user message
-        last_user_message = st.session_state.messages[-1]['content']
-        
-        # Generate response
-        response = get_philosopher_response(last_user_message)
-        
-        # Add assistant response to chat history
-        st.session_state.messages.append({'role': 'assistant', 'content': response})
-        
-        # Update the current chat in the chats dictionary
-        st.session_state.chats[st.session_state.current_chat_id] = {
-            'messages': st.session_state.messages.copy(),
-            'philosopher': st.session_state.current_philosopher,
-            'timestamp': datetime.now().isoformat(),
-            'summary': summarize_conversation(st.session_state.messages)
-        }
-        
-        # Force a rerun to display the assistant message
-        st.rerun()
+    # Render the response token by token as it is generated
+    with st.chat_message("assistant", avatar=current_philosopher['avatar']):
+        response = st.write_stream(stream_philosopher_response())
+    
+    # Add assistant response to chat history
+    st.session_state.messages.append({'role': 'assistant', 'content': response})
+    
+    # Update the current chat in the chats dictionary
+    save_current_chat()
\ No newline at end of file
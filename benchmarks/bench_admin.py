@@ -0,0 +1,112 @@
+"""Admin changelist load times for ChatSession and ChatMessage on a large generated dataset.
+
+Generates the rows with SQL (the full-text index triggers run, so search
+has an index to use), then times the ChatMessage and ChatSession changelist
+pages as a superuser: first page, a page deep into the table, the role and
+date filters and a search. For comparison it also times what the previous
+admin ran for its first page: a full COUNT(*) and an OFFSET page ordered by
+seq with a session query per row.
+
+    python -m benchmarks.bench_admin --messages 5000000
+"""
+import argparse
+import re
+import time
+
+from benchmarks.django_env import setup_django
+
+WORDS = ('virtue duty reason nature death fear desire will power suffering love freedom fate '
+         'time soul truth justice courage wisdom pleasure pain memory guilt law trial castle').split()
+
+def generate(sessions, messages):
+    """Insert sessions and messages spread over the past year with INSERT ... SELECT"""
+    from django.contrib.auth import get_user_model
+    from django.db import connection, transaction
+    
+    user = get_user_model().objects.create_user('bench')
+    words = ' || '.join(f"CASE abs(random()) %% {len(WORDS)} {''.join(f'WHEN {i} THEN {w!r} ' for i, w in enumerate(WORDS))}END || ' '"
+                        for _ in range(6))
+    per_session = messages // sessions
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"""
+            WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i + 1 < %s)
+            INSERT INTO philosophy_api_chatsession
+                (id, user_id, session_id, philosopher, summary, context_summary, context_folded, last_seq, archived,
+                 created_at, updated_at)
+            SELECT lower(hex(randomblob(16))), %s, 'bench-' || i, 'kafka', 'Chat ' || i, '', 0, %s, 0,
+                   datetime('now', '-' || (365 - i * 365 / %s) || ' days'), datetime('now', '-' || (365 - i * 365 / %s) || ' days')
+            FROM n
+        """, [sessions, user.pk, per_session, sessions, sessions])
+        cursor.execute(f"""
+            WITH RECURSIVE n(j) AS (SELECT 1 UNION ALL SELECT j + 1 FROM n WHERE j < %s)
+            INSERT INTO philosophy_api_chatmessage (id, session_id, role, content, timestamp, seq)
+            SELECT lower(hex(randomblob(16))), session.id, CASE j %% 2 WHEN 1 THEN 'user' ELSE 'assistant' END,
+                   {words}, strftime('%%Y-%%m-%%d %%H:%%M:%%f', session.created_at, '+' || j || ' seconds'), j
+            FROM philosophy_api_chatsession session, n
+        """, [per_session])
+    return per_session * sessions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=50000)
+    parser.add_argument('--messages', type=int, default=5000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from philosophy_api.models import ChatMessage
+    
+    start = time.perf_counter()
+    total = generate(args.sessions, args.messages)
+    print(f"generated {args.sessions} sessions, {total} messages in {time.perf_counter() - start:.0f} s")
+    
+    get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin-password')
+    client = Client()
+    client.login(username='admin', password='admin-password')
+    
+    def load(url):
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+        return response
+    
+    def measure(label, url):
+        load(url)
+        samples = []
+        for _ in range(args.repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = load(url)
+                samples.append((time.perf_counter() - start) * 1000)
+        print(f"{label:>32}: {sorted(samples)[len(samples) // 2]:8.1f} ms  {len(queries):3d} queries")
+        return response
+    
+    messages_url = '/admin/philosophy_api/chatmessage/'
+    page = measure('messages, first page', messages_url)
+    # Follow the next link a few times, then jump deep with a cursor built from an old row
+    for _ in range(3):
+        url = re.search(r'href="(\?p=[^"]+)">Next', page.content.decode()).group(1).replace('&amp;', '&')
+        page = measure('messages, next page', messages_url + url)
+    from philosophy_api.pagination import encode_keyset_cursor
+    old = ChatMessage.objects.order_by('timestamp', 'pk').only('timestamp')[total // 10]
+    deep = encode_keyset_cursor('next', [old._meta.get_field('timestamp').value_to_string(old), str(old.pk)])
+    measure('messages, page 90% deep', f'{messages_url}?p={deep}')
+    measure('messages, role filter', f'{messages_url}?role=user')
+    measure('messages, past 7 days', f'{messages_url}?timestamp__gte=' + time.strftime('%Y-%m-%d+00:00:00%%2B00:00', time.gmtime(time.time() - 7 * 86400)))
+    measure('messages, search (FTS5)', f'{messages_url}?q=wisdom')
+    measure('sessions, first page', '/admin/philosophy_api/chatsession/')
+    measure('sessions, philosopher filter', '/admin/philosophy_api/chatsession/?philosopher=kafka')
+    
+    # The previous admin's first page: COUNT(*) twice, OFFSET page ordered by seq, a session per row
+    start = time.perf_counter()
+    ChatMessage.objects.count()
+    ChatMessage.objects.count()
+    for message in ChatMessage.objects.order_by('seq', '-pk')[:100]:
+        str(message.session)
+    print(f"{'previous admin, first page':>32}: {(time.perf_counter() - start) * 1000:8.1f} ms (queries only)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Database size and query times before and after archiving idle sessions.
+
+Seeds one user with many sessions, most of them idle, and measures the
+database file, the session list and a retrieve of an active session, then
+runs manage.py archive_sessions and measures them again, along with opening
+(and so rehydrating) an archived session.
+
+    python -m benchmarks.bench_archive --sessions 2000 --messages 100 --idle 0.9
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+from benchmarks.django_env import setup_django
+from benchmarks.bench_session_list import seed
+
+def timed_ms(fn, repeat=20):
+    """Median milliseconds of repeat calls to fn()"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return sorted(samples)[len(samples) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=2000)
+    parser.add_argument('--messages', type=int, default=100)
+    parser.add_argument('--idle', type=float, default=0.9, help='fraction of sessions idle past the cutoff')
+    args = parser.parse_args()
+    
+    os.environ.setdefault('CHAT_ARCHIVE_DIR', tempfile.mkdtemp(prefix='philosophy_archive_'))
+    db_path = setup_django()
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.utils import timezone
+    from rest_framework.test import APIClient
+    from philosophy_api.models import ChatSession
+    
+    user = get_user_model().objects.create_user('bench')
+    sessions = seed(user, args.sessions, args.messages)
+    idle = sessions[:int(len(sessions) * args.idle)]
+    ChatSession.objects.filter(pk__in=[session.pk for session in idle]) \
+        .update(updated_at=timezone.now() - timedelta(days=365))
+    active = sessions[-1]
+    
+    client = APIClient()
+    client.force_authenticate(user)
+    
+    def get(url):
+        response = client.get(url)
+        assert response.status_code == 200, response.content
+        return response.json()
+    
+    def report(label):
+        print(f"{label:>8}: db {os.path.getsize(db_path) / 1024 / 1024:7.1f} MiB  "
+              f"list {timed_ms(lambda: get('/api/sessions/')):6.2f} ms  "
+              f"retrieve active {timed_ms(lambda: get(f'/api/sessions/{active.pk}/')):6.2f} ms")
+    
+    print(f"{args.sessions} sessions x {args.messages} messages, {len(idle)} idle")
+    get('/api/ping/')
+    report('before')
+    
+    start = time.perf_counter()
+    # No saved Streamlit sessions here, only the database
+    call_command('archive_sessions', '--days', '90', '--files-dir', tempfile.mkdtemp())
+    print(f"archived in {time.perf_counter() - start:.1f} s")
+    segments = sum(entry.stat().st_size for entry in os.scandir(settings.CHAT_ARCHIVE_DIR))
+    print(f"segments: {segments / 1024 / 1024:.1f} MiB")
+    report('after')
+    
+    # Opening an archived session restores it; later opens are ordinary retrieves
+    reopened = idle[len(idle) // 2]
+    start = time.perf_counter()
+    data = get(f'/api/sessions/{reopened.pk}/')
+    print(f"rehydrate on open: {(time.perf_counter() - start) * 1000:.2f} ms")
+    assert len(data['messages']) == args.messages
+    print(f"reopen: {timed_ms(lambda: get(f'/api/sessions/{reopened.pk}/')):.2f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Throughput of the WSGI (gunicorn gthread) and ASGI (uvicorn) chat paths.
+
+Both servers get one worker process and talk to a stub LLM with a fixed
+latency, so throughput is bounded by how many upstream waits a worker can
+hold at once.
+
+    python -m benchmarks.bench_asgi --concurrency 64 --latency 0.5
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.stub_llm import start_stub_server
+from benchmarks.django_env import BASE_DIR, bench_env, setup_django
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(kind, port, env, threads, workers=1):
+    """Start gunicorn (wsgi) or uvicorn (asgi), with a single worker unless told otherwise"""
+    if kind == 'wsgi':
+        cmd = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'philosophy_project.wsgi',
+               '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', str(threads)]
+    else:
+        cmd = [sys.executable, '-m', 'uvicorn', 'philosophy_project.asgi:application',
+               '--port', str(port), '--workers', str(workers), '--log-level', 'warning']
+    process = subprocess.Popen(cmd, cwd=BASE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    
+    for _ in range(100):
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/api/ping/', timeout=1).status_code == 200:
+                return process
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f'{kind} server did not start')
+
+def drive(base_url, path_template, token, session_ids, messages_per_session):
+    """Send add_message calls from one client thread per session"""
+    def conversation(session_id):
+        http = requests.Session()
+        http.headers['Authorization'] = f'Bearer {token}'
+        latencies, errors = [], 0
+        for i in range(messages_per_session):
+            start = time.perf_counter()
+            response = http.post(f'{base_url}{path_template.format(session_id)}',
+                                 json={'message': f'Question {i}'}, timeout=120)
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+        return latencies, errors
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(session_ids)) as executor:
+        results = list(executor.map(conversation, session_ids))
+    elapsed = time.perf_counter() - start
+    
+    latencies = [value for result in results for value in result[0]]
+    errors = sum(result[1] for result in results)
+    return elapsed, latencies, errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--messages', type=int, default=3, help='add_message calls per session')
+    parser.add_argument('--latency', type=float, default=0.5, help='fixed upstream latency in seconds')
+    parser.add_argument('--threads', type=int, default=8, help='gthread threads for the WSGI worker')
+    args = parser.parse_args()
+    
+    server, stub, url = start_stub_server(first_token_latency=args.latency, tokens_per_sec=1e9)
+    
+    db_path = setup_django()
+    from django.contrib.auth import get_user_model
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from philosophy_api.models import ChatSession
+    
+    user = get_user_model().objects.create_user('bench', 'bench@example.com', 'bench-password')
+    token = str(RefreshToken.for_user(user).access_token)
+    session_ids = [
+        str(ChatSession.objects.create(session_id=f'bench-{i}', philosopher='marcus_aurelius', user=user).id)
+        for i in range(args.concurrency)
+    ]
+    
+    # Every session asks the same questions: keep the cache and request
+    # coalescing from answering them without an upstream call each
+    env = {**os.environ, **bench_env(db_path), 'GROQ_API_URL': url, 'GROQ_API_KEY': 'stub-key',
+           'GROQ_WARM_CONNECTIONS': '0', 'LLM_CACHE_BACKEND': 'none', 'LLM_SINGLEFLIGHT': '0'}
+    paths = {
+        'wsgi': '/api/sessions/{}/add_message/',
+        'asgi': '/api/async/sessions/{}/add_message/',
+    }
+    
+    print(f"{args.concurrency} concurrent conversations x {args.messages} messages, "
+          f"upstream latency {args.latency:.2f}s, WSGI threads {args.threads}")
+    for kind, path in paths.items():
+        port = free_port()
+        process = start_server(kind, port, env, args.threads)
+        try:
+            elapsed, latencies, errors = drive(f'http://127.0.0.1:{port}', path, token,
+                                               session_ids, args.messages)
+        finally:
+            process.terminate()
+            process.wait()
+        
+        print(f"{kind}: {len(latencies) / elapsed:7.1f} req/s  "
+              f"p50 {statistics.median(latencies) * 1000:7.0f} ms  "
+              f"max {max(latencies) * 1000:7.0f} ms  errors {errors}")
+    
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Replay a chat workload with and without the exact-match response cache.
+
+Opening questions are drawn from a Zipf-like distribution over a fixed pool
+(popular starter questions repeat often), sent to the Django GroqClient
+pointed at a stub LLM with fixed latency.
+
+    python -m benchmarks.bench_cache --requests 500 --distinct 50 --latency 0.05
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import llm_cache
+from benchmarks.stub_llm import start_stub_server
+from philosophers import PHILOSOPHERS
+
+def workload(count, distinct, seed=7):
+    """(philosopher, messages) pairs with a skewed popularity distribution"""
+    rng = random.Random(seed)
+    philosophers = list(PHILOSOPHERS)
+    pool = [
+        (philosophers[i % len(philosophers)], f"Starter question number {i}: how should I live?")
+        for i in range(distinct)
+    ]
+    weights = [1 / (rank + 1) for rank in range(distinct)]
+    requests = []
+    for philosopher, question in rng.choices(pool, weights=weights, k=count):
+        requests.append((philosopher, [
+            {'role': 'system', 'content': PHILOSOPHERS[philosopher]['system_message']},
+            {'role': 'user', 'content': question},
+        ]))
+    return requests
+
+def replay(backend_name, requests, stub):
+    from philosophy_api.groq_client_django import GroqClient
+    
+    os.environ['LLM_CACHE_BACKEND'] = backend_name
+    llm_cache._response_cache = None  # pick up the new configuration
+    
+    upstream_before = stub.requests
+    latencies = []
+    for philosopher, messages in requests:
+        start = time.perf_counter()
+        GroqClient().generate_response(messages, philosopher=philosopher)
+        latencies.append(time.perf_counter() - start)
+    
+    return latencies, stub.requests - upstream_before, llm_cache.get_response_cache().stats()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--distinct', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+    
+    server, stub, url = start_stub_server(first_token_latency=args.latency, tokens_per_sec=1e9)
+    os.environ['GROQ_API_URL'] = url
+    os.environ.setdefault('GROQ_API_KEY', 'stub-key')
+    os.environ['LLM_CACHE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='llm_cache_'), 'cache.sqlite3')
+    
+    requests = workload(args.requests, args.distinct)
+    print(f"{args.requests} requests over {args.distinct} distinct prompts, upstream latency {args.latency * 1000:.0f} ms")
+    for backend_name in ('none', 'memory', 'sqlite'):
+        latencies, upstream, stats = replay(backend_name, requests, stub)
+        print(f"{backend_name:>6}: upstream calls {upstream:4d}  hit rate {stats['hit_rate']:5.1%}  "
+              f"mean {statistics.mean(latencies) * 1000:6.1f} ms  p50 {statistics.median(latencies) * 1000:6.2f} ms  "
+              f"total {sum(latencies):6.2f} s")
+    
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
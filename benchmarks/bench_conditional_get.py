@@ -0,0 +1,63 @@
+"""Bytes and CPU per poll with and without If-None-Match.
+
+Seeds one user with sessions of long transcripts, then polls the endpoints
+clients refresh (the philosopher list, the session list, a session retrieve
+and the messages page past the last seen message) once without a validator
+and once sending back the ETag of the previous response, which is answered
+304 before anything is serialized.
+
+    python -m benchmarks.bench_conditional_get --sessions 200 --messages 200
+"""
+import argparse
+import time
+
+from benchmarks.django_env import setup_django
+from benchmarks.bench_session_list import seed
+
+def poll(client, url, repeat, **headers):
+    """Median CPU and wall milliseconds, and the status and body bytes, of repeat GETs of url"""
+    cpu, wall = [], []
+    for _ in range(repeat):
+        start_cpu, start = time.process_time(), time.perf_counter()
+        response = client.get(url, **headers)
+        cpu.append((time.process_time() - start_cpu) * 1000)
+        wall.append((time.perf_counter() - start) * 1000)
+    return sorted(cpu)[repeat // 2], sorted(wall)[repeat // 2], response
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from rest_framework.test import APIClient
+    
+    user = get_user_model().objects.create_user('bench')
+    sessions = seed(user, args.sessions, args.messages)
+    client = APIClient()
+    client.force_authenticate(user)
+    
+    session = sessions[-1]
+    last = client.get(f'/api/sessions/{session.pk}/messages/', {'limit': args.messages}).json()['next']
+    urls = {
+        'philosophers': '/api/philosophers/',
+        'session list': '/api/sessions/',
+        f'retrieve ({args.messages} msgs)': f'/api/sessions/{session.pk}/',
+        'messages after last': f'/api/sessions/{session.pk}/messages/?after={last}',
+    }
+    
+    print(f"{args.sessions} sessions x {args.messages} messages, median of {args.repeat} polls")
+    for label, url in urls.items():
+        full_cpu, full_wall, full = poll(client, url, args.repeat)
+        assert full.status_code == 200, full.content
+        cpu, wall, response = poll(client, url, args.repeat, HTTP_IF_NONE_MATCH=full['ETag'])
+        assert response.status_code == 304, response.status_code
+        print(f"{label:>24}: 200 {len(full.content):8d} B {full_cpu:6.2f} ms CPU {full_wall:6.2f} ms  |  "
+              f"304 {len(response.content):3d} B {cpu:6.2f} ms CPU {wall:6.2f} ms  |  "
+              f"saved {len(full.content) - len(response.content)} B, {full_cpu - cpu:.2f} ms CPU per poll")
+
+if __name__ == '__main__':
+    main()
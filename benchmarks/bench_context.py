@@ -0,0 +1,73 @@
+"""Prompt tokens per turn: full transcript vs. the token-budgeted context window.
+
+Replays a synthetic long conversation through the same steps as add_message
+(rolling summary and folded count carried between turns) and reports the
+approximate prompt size at several turn counts.
+    
+    python -m benchmarks.bench_context --turns 200 --budget 4096
+"""
+import argparse
+import random
+import time
+
+from context_window import build_context, count_tokens, message_tokens
+from philosophers import PHILOSOPHERS
+
+WORDS = ("virtue reason nature fate control judgment duty courage justice temperance wisdom "
+         "mind fear desire death time change soul freedom meaning suffering will power").split()
+
+def synthetic_message(role, words, rng):
+    sentences = []
+    while words > 0:
+        length = min(words, rng.randint(8, 20))
+        sentences.append(' '.join(rng.choice(WORDS) for _ in range(length)).capitalize() + '.')
+        words -= length
+    return {'role': role, 'content': ' '.join(sentences)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--turns', type=int, default=200, help='user/assistant exchanges')
+    parser.add_argument('--budget', type=int, default=4096)
+    parser.add_argument('--summary-budget', type=int, default=256)
+    parser.add_argument('--philosopher', default='marcus_aurelius')
+    args = parser.parse_args()
+    
+    rng = random.Random(42)
+    system_prompt = PHILOSOPHERS[args.philosopher]['system_message']
+    persona_prompts = [p['system_message'] for p in PHILOSOPHERS.values()]
+    
+    transcript = []
+    summary, folded = '', 0
+    full_total = windowed_total = 0
+    build_seconds = 0.0
+    checkpoints = {10, 25, 50, 100, 200, 500, args.turns}
+    
+    print(f"{'turn':>5} {'full prompt':>12} {'windowed':>10} {'saved':>7}")
+    for turn in range(1, args.turns + 1):
+        transcript.append(synthetic_message('user', rng.randint(15, 60), rng))
+        # Emulate change_philosopher inserting the persona prompt again
+        if turn % 40 == 0:
+            transcript.append({'role': 'system', 'content': system_prompt})
+        
+        full_tokens = message_tokens({'content': system_prompt}) + sum(message_tokens(m) for m in transcript)
+        
+        start = time.perf_counter()
+        window = build_context(system_prompt, transcript[folded:], summary=summary, budget=args.budget,
+                               summary_budget=args.summary_budget, persona_prompts=persona_prompts)
+        build_seconds += time.perf_counter() - start
+        summary, folded = window.summary, folded + window.folded
+        
+        full_total += full_tokens
+        windowed_total += window.tokens
+        if turn in checkpoints:
+            print(f"{turn:>5} {full_tokens:>12} {window.tokens:>10} {1 - window.tokens / full_tokens:>6.0%}")
+        
+        transcript.append(synthetic_message('assistant', rng.randint(80, 220), rng))
+    
+    print(f"total prompt tokens over {args.turns} turns: full {full_total}, windowed {windowed_total} "
+          f"({1 - windowed_total / full_total:.0%} fewer)")
+    print(f"context assembly: {build_seconds / args.turns * 1000:.2f} ms per turn "
+          f"(token counter: {count_tokens(system_prompt)} tokens in the system prompt)")
+
+if __name__ == '__main__':
+    main()
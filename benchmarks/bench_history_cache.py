@@ -0,0 +1,78 @@
+"""Database work per add_message turn with and without the history cache.
+
+Replays conversations through the add_message endpoint (LLM replaced by the
+local stub) on sessions that already hold a long history, and reports queries
+and time per turn. Also checks that both runs sent identical prompts.
+
+    python -m benchmarks.bench_history_cache --history 200 --turns 50
+"""
+import argparse
+import os
+import statistics
+import time
+
+from benchmarks.django_env import setup_django
+from benchmarks.stub_llm import start_stub_server
+
+def replay(client, session_pk, turns):
+    """Run the turns; returns per-turn query counts and latencies"""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    
+    queries, latencies = [], []
+    for turn in range(turns):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = client.post(f'/api/sessions/{session_pk}/add_message/',
+                                   {'message': f"Turn {turn}: what would you do in my place?"}, format='json')
+            latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.content
+        queries.append(len(captured))
+    return queries, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--history', type=int, default=200, help='messages already in each session')
+    parser.add_argument('--turns', type=int, default=50)
+    args = parser.parse_args()
+    
+    server, stub, url = start_stub_server(first_token_latency=0, tokens_per_sec=1e9)
+    os.environ.update(GROQ_API_URL=url, GROQ_API_KEY='stub-key', LLM_CACHE_BACKEND='none')
+    setup_django()
+    
+    from django.contrib.auth import get_user_model
+    from django.test import override_settings
+    from rest_framework.test import APIClient
+    from benchmarks.bench_session_list import seed
+    from philosophy_api import history_cache, views
+    
+    user = get_user_model().objects.create_user('bench')
+    client = APIClient()
+    client.force_authenticate(user)
+    sessions = seed(user, 2, args.history)
+    
+    # Record the prompt of every turn to compare the two runs
+    prompts = {}
+    build_prompt = views.build_prompt
+    
+    def recording_build_prompt(session, history, *args, **kwargs):
+        messages = build_prompt(session, history, *args, **kwargs)
+        prompts.setdefault(session.pk, []).append(messages)
+        return messages
+    views.build_prompt = recording_build_prompt
+    
+    print(f"{args.turns} turns on a session with {args.history} messages")
+    for session, max_bytes in zip(sessions, (0, 64 * 1024 * 1024)):
+        history_cache._history_cache = None
+        with override_settings(CHAT_HISTORY_CACHE_MAX_BYTES=max_bytes):
+            queries, latencies = replay(client, session.pk, args.turns)
+        label = 'history cache' if max_bytes else 'no cache'
+        print(f"{label:>14}: first turn {queries[0]} queries, later turns {statistics.median(queries[1:]):.0f} queries, "
+              f"median {statistics.median(latencies) * 1000:.2f} ms")
+    
+    first, second = (prompts[session.pk] for session in sessions)
+    print(f"identical prompts: {first == second}")
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+"""End-to-end load test: virtual users register, log in and chat over HTTP.
+
+Starts the stub LLM (latency distribution, tokens/sec and error rate are
+configurable), points a gunicorn (wsgi) or uvicorn (asgi) server at it via
+GROQ_API_URL, and runs --users virtual users, --concurrency at a time. Each
+one goes register -> login -> create_session -> --messages x add_message;
+a user whose register, login or create_session fails stops there.
+
+Reports throughput, p50/p95/p99 latency and the error rate of every step
+(and time to first token with --stream). --json writes the run's settings
+and results so runs can be compared with --compare:
+
+    python -m benchmarks.bench_load --users 200 --concurrency 32 --json before.json
+    python -m benchmarks.bench_load --users 200 --concurrency 32 --compare before.json
+
+With --url the harness drives a server that is already running (which must
+point at a stub or provider of its own) instead of starting one.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+from benchmarks.bench_asgi import free_port, start_server
+from benchmarks.stub_llm import LATENCY_DISTRIBUTIONS, start_stub_server
+from benchmarks.django_env import BASE_DIR, bench_env, setup_django
+
+STEPS = ('register', 'login', 'create_session', 'add_message')
+PERCENTILES = (50, 95, 99)
+
+def percentile(samples, p):
+    """Nearest-rank percentile of sorted samples"""
+    if not samples:
+        return None
+    rank = max(1, -(-len(samples) * p // 100))
+    return samples[int(rank) - 1]
+
+class Recorder:
+    """Latencies and errors per step, shared by the virtual user threads"""
+    
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+    
+    def success(self, step, seconds):
+        with self.lock:
+            self.latencies.setdefault(step, []).append(seconds)
+    
+    def error(self, step, kind):
+        with self.lock:
+            errors = self.errors.setdefault(step, {})
+            errors[kind] = errors.get(kind, 0) + 1
+    
+    def summary(self, step):
+        latencies = sorted(self.latencies.get(step, []))
+        errors = self.errors.get(step, {})
+        count = len(latencies) + sum(errors.values())
+        result = {
+            'requests': count,
+            'errors': sum(errors.values()),
+            'error_rate': sum(errors.values()) / count if count else 0.0,
+            'errors_by_kind': errors,
+        }
+        for p in PERCENTILES:
+            value = percentile(latencies, p)
+            result[f'p{p}_ms'] = round(value * 1000, 2) if value is not None else None
+        result['max_ms'] = round(latencies[-1] * 1000, 2) if latencies else None
+        return result
+
+def read_stream(response, start):
+    """Seconds from start to the first token event, and whether the stream ended with done"""
+    first_token, event = None, None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith('event:'):
+            event = line[len('event:'):].strip()
+        elif line.startswith('data:'):
+            if event is None and first_token is None:
+                first_token = time.perf_counter() - start
+            if event in ('done', 'error'):
+                return first_token, event == 'done'
+            event = None
+    return first_token, False
+
+class VirtualUser:
+    """One client going through the whole signup-to-chat flow"""
+    
+    def __init__(self, base_url, paths, args, recorder, run_id, index):
+        self.base_url = base_url
+        self.paths = paths
+        self.args = args
+        self.recorder = recorder
+        self.username = f'load-{run_id}-{index}'
+        self.http = requests.Session()
+    
+    def call(self, step, method, path, ok=(200, 201), **kwargs):
+        """Send one request, recording its latency or error; returns the response or None"""
+        start = time.perf_counter()
+        try:
+            response = self.http.request(method, f'{self.base_url}{path}', timeout=self.args.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.recorder.error(step, type(e).__name__)
+            return None
+        
+        if response.status_code not in ok:
+            self.recorder.error(step, str(response.status_code))
+            return None
+        if not kwargs.get('stream'):
+            self.recorder.success(step, time.perf_counter() - start)
+        return response
+    
+    def send_message(self, session_id, text):
+        """Send one add_message, reading the SSE stream to the end with --stream"""
+        if not self.args.stream:
+            self.call('add_message', 'post', self.paths['add_message'].format(session_id), json={'message': text})
+            return
+        
+        start = time.perf_counter()
+        response = self.call('add_message', 'post', self.paths['add_message'].format(session_id),
+                             json={'message': text}, stream=True)
+        if response is None:
+            return
+        try:
+            with response:
+                first_token, done = read_stream(response, start)
+        except requests.RequestException as e:
+            self.recorder.error('add_message', type(e).__name__)
+            return
+        
+        if not done:
+            self.recorder.error('add_message', 'stream error')
+            return
+        self.recorder.success('add_message', time.perf_counter() - start)
+        if first_token is not None:
+            self.recorder.success('first_token', first_token)
+    
+    def run(self):
+        password = 'load-Test-password-1'
+        response = self.call('register', 'post', '/api/auth/register/', json={
+            'username': self.username,
+            'email': f'{self.username}@example.com',
+            'password': password,
+            'password2': password,
+        })
+        if response is None:
+            return
+        
+        response = self.call('login', 'post', '/api/auth/login/',
+                             json={'username': self.username, 'password': password})
+        if response is None:
+            return
+        self.http.headers['Authorization'] = f"Bearer {response.json()['access']}"
+        
+        response = self.call('create_session', 'post', self.paths['create_session'],
+                             json={'philosopher': self.args.philosopher})
+        if response is None:
+            return
+        session_id = response.json()['id']
+        
+        # Unique messages, so no response cache or request coalescing answers for the stub
+        for i in range(self.args.messages):
+            self.send_message(session_id, f'Question {i} from {self.username}: what should I do with my life?')
+
+def run_load(base_url, paths, args):
+    """Run every virtual user; returns the recorder and the wall-clock seconds taken"""
+    recorder = Recorder()
+    run_id = uuid.uuid4().hex[:8]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [
+            executor.submit(VirtualUser(base_url, paths, args, recorder, run_id, index).run)
+            for index in range(args.users)
+        ]
+        for future in futures:
+            future.result()
+    return recorder, time.perf_counter() - start
+
+def report(args, recorder, elapsed, stub):
+    """Results of a run as a JSON-serialisable dict"""
+    steps = {step: recorder.summary(step) for step in STEPS}
+    if args.stream:
+        steps['first_token'] = recorder.summary('first_token')
+    requests_sent = sum(steps[step]['requests'] for step in STEPS)
+    errors = sum(steps[step]['errors'] for step in STEPS)
+    messages = steps['add_message']['requests'] - steps['add_message']['errors']
+    return {
+        'config': {
+            **{key: value for key, value in vars(args).items() if key not in ('json', 'compare')},
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+        },
+        'elapsed_s': round(elapsed, 3),
+        'throughput': {
+            'requests_per_s': round(requests_sent / elapsed, 2),
+            'messages_per_s': round(messages / elapsed, 2),
+        },
+        'error_rate': errors / requests_sent if requests_sent else 0.0,
+        'steps': steps,
+        'stub': {'requests': stub.requests, 'injected_errors': stub.errors} if stub else None,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def format_ms(value):
+    return f"{value:8.1f}" if value is not None else "       -"
+
+def print_report(result):
+    config = result['config']
+    print(f"{config['users']} users x {config['messages']} messages, concurrency {config['concurrency']}, "
+          f"{config['server']}{' streaming' if config['stream'] else ''}: "
+          f"{result['elapsed_s']:.1f}s, {result['throughput']['requests_per_s']:.1f} req/s, "
+          f"{result['throughput']['messages_per_s']:.1f} messages/s, errors {result['error_rate']:.2%}")
+    print(f"{'step':>16} {'requests':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for step, summary in result['steps'].items():
+        print(f"{step:>16} {summary['requests']:8d} {summary['error_rate']:7.2%} "
+              f"{format_ms(summary['p50_ms'])} {format_ms(summary['p95_ms'])} "
+              f"{format_ms(summary['p99_ms'])} {format_ms(summary['max_ms'])}"
+              + (f"  {summary['errors_by_kind']}" if summary['errors_by_kind'] else ""))
+    if result['stub']:
+        print(f"stub: {result['stub']['requests']} completions, {result['stub']['injected_errors']} injected errors")
+
+def change(old, new):
+    if old is None or new is None:
+        return "       -"
+    if not old:
+        return f"{new - old:+8.2f}"
+    return f"{(new - old) / old:+8.1%}"
+
+def print_comparison(baseline, result):
+    """Print how result moved against an earlier run's JSON"""
+    print(f"\nvs. {baseline['config'].get('git_commit') or 'baseline'} "
+          f"({baseline['config'].get('started_at', 'unknown time')}):")
+    for key in ('requests_per_s', 'messages_per_s'):
+        old, new = baseline['throughput'][key], result['throughput'][key]
+        print(f"{key:>16}: {old:8.1f} -> {new:8.1f} {change(old, new)}")
+    print(f"{'step':>16} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>8}")
+    for step, summary in result['steps'].items():
+        old = baseline['steps'].get(step)
+        if old is None:
+            continue
+        print(f"{step:>16} " + " ".join(change(old[f'p{p}_ms'], summary[f'p{p}_ms']) for p in PERCENTILES)
+              + f" {(summary['error_rate'] - old['error_rate']) * 100:+7.2f}pp")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50, help='virtual users in total')
+    parser.add_argument('--concurrency', type=int, default=10, help='virtual users running at once')
+    parser.add_argument('--messages', type=int, default=5, help='add_message calls per user')
+    parser.add_argument('--stream', action='store_true', help='use ?stream=1 and read the SSE stream')
+    parser.add_argument('--philosopher', default='marcus_aurelius')
+    parser.add_argument('--timeout', type=float, default=120.0, help='client timeout per request in seconds')
+    parser.add_argument('--server', choices=('wsgi', 'asgi'), default='wsgi',
+                        help='gunicorn with the sync views, or uvicorn with the async ones '
+                             '(--stream always uses the sync streaming view)')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=8, help='gthread threads per WSGI worker')
+    parser.add_argument('--url', help='drive an already running server instead of starting one')
+    parser.add_argument('--llm-url', help='chat completions URL for the server (default: in-process stub)')
+    parser.add_argument('--latency', type=float, default=0.3, help='stub first-token latency in seconds')
+    parser.add_argument('--latency-distribution', choices=LATENCY_DISTRIBUTIONS, default='lognormal')
+    parser.add_argument('--latency-spread', type=float, default=0.5,
+                        help='relative width (uniform) or sigma (lognormal) of the stub latency')
+    parser.add_argument('--tokens-per-sec', type=float, default=200.0, help='stub generation speed')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of stub completions that fail')
+    parser.add_argument('--seed', type=int, help='seed for the stub latencies and errors')
+    parser.add_argument('--json', help='write the settings and results of the run to this file')
+    parser.add_argument('--compare', help='JSON of an earlier run to compare against')
+    args = parser.parse_args()
+    
+    server, stub = None, None
+    llm_url = args.llm_url
+    if not args.url and not llm_url:
+        server, stub, llm_url = start_stub_server(
+            first_token_latency=args.latency,
+            tokens_per_sec=args.tokens_per_sec,
+            latency_distribution=args.latency_distribution,
+            latency_spread=args.latency_spread,
+            error_rate=args.error_rate,
+            seed=args.seed
+        )
+    
+    paths = {
+        'create_session': '/api/sessions/create_session/',
+        'add_message': '/api/sessions/{}/add_message/?stream=1' if args.stream else '/api/sessions/{}/add_message/',
+    }
+    if args.server == 'asgi':
+        paths['create_session'] = '/api/async/sessions/create_session/'
+        if not args.stream:
+            paths['add_message'] = '/api/async/sessions/{}/add_message/'
+    
+    process = None
+    base_url = args.url
+    if base_url is None:
+        db_path = setup_django()
+        env = {**os.environ, **bench_env(db_path), 'GROQ_API_URL': llm_url, 'GROQ_API_KEY': 'stub-key',
+               'GROQ_WARM_CONNECTIONS': '0', 'LLM_CACHE_BACKEND': 'none'}
+        port = free_port()
+        process = start_server(args.server, port, env, args.threads, args.workers)
+        base_url = f'http://127.0.0.1:{port}'
+    
+    try:
+        recorder, elapsed = run_load(base_url.rstrip('/'), paths, args)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if server is not None:
+            server.shutdown()
+    
+    result = report(args, recorder, elapsed, stub)
+    print_report(result)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nwrote {args.json}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Append and range-read throughput of the ORM and MongoDB message stores.
+
+Both stores allocate seq from the same SQLite session table, so appends
+include that UPDATE. Without --mongo-uri the MongoDB store runs against
+mongomock, which checks behaviour and query shapes but is an in-process
+imitation; use a local mongod for numbers worth comparing.
+
+    python -m benchmarks.bench_message_store --sessions 20 --messages 500
+    python -m benchmarks.bench_message_store --mongo-uri mongodb://localhost:27017/
+"""
+import argparse
+import random
+import time
+
+from benchmarks.django_env import setup_django
+
+def mongo_collection(uri):
+    """A fresh chat_messages collection on the server at uri, or in mongomock"""
+    if uri:
+        import pymongo
+        client = pymongo.MongoClient(uri, tz_aware=True, serverSelectionTimeoutMS=5000)
+    else:
+        import mongomock
+        client = mongomock.MongoClient(tz_aware=True)
+    database = client['philosophy_ai_bench']
+    database.drop_collection('chat_messages')
+    return database['chat_messages']
+
+def timed(fn, count):
+    """Call fn() count times; returns calls per second"""
+    start = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return count / (time.perf_counter() - start)
+
+def run(store, sessions, messages, batch, page_size, reads):
+    """Fill the sessions through store and read them back; returns rates per second"""
+    half = messages // 2
+    text = 'Some thoughts on how to live well. ' * 8
+    
+    # Single appends, the add_message pattern (one per user message and reply)
+    single_sessions = [session for session in sessions for _ in range(half)]
+    appends = iter(single_sessions)
+    append_rate = timed(lambda: store.append(next(appends), 'user', text), len(single_sessions))
+    
+    # Bulk appends of batch messages per call
+    batches = [session for session in sessions for _ in range((messages - half) // batch)]
+    pending = iter(batches)
+    batch_rate = timed(lambda: store.append_many(next(pending), [('assistant', text)] * batch), len(batches))
+    
+    rng = random.Random(0)
+    
+    def read_page():
+        session = rng.choice(sessions)
+        rows = store.page(session, after=rng.randrange(session.last_seq - page_size), limit=page_size)
+        assert len(rows) == page_size + 1
+    
+    def read_history():
+        store.history(rng.choice(sessions))
+    
+    return {
+        'appends/s': append_rate,
+        'bulk msgs/s': batch_rate * batch,
+        'pages/s': timed(read_page, reads),
+        'histories/s': timed(read_history, max(1, reads // 10)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=500, help='messages written per session')
+    parser.add_argument('--batch', type=int, default=50, help='messages per append_many call')
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--reads', type=int, default=2000, help='page reads per store')
+    parser.add_argument('--mongo-uri', help='MongoDB server to use instead of mongomock')
+    args = parser.parse_args()
+    
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from philosophy_api.message_store import MongoMessageStore, ORMMessageStore
+    from philosophy_api.models import ChatSession
+    
+    collection = mongo_collection(args.mongo_uri)
+    mongo_store = MongoMessageStore(collection)
+    mongo_store.ensure_indexes()
+    stores = {'orm': ORMMessageStore(), 'mongodb': mongo_store}
+    
+    user = get_user_model().objects.create_user('bench')
+    print(f"{args.sessions} sessions x {args.messages} messages, "
+          f"MongoDB: {args.mongo_uri or 'mongomock (in-process, not representative)'}")
+    for name, store in stores.items():
+        sessions = [
+            ChatSession.objects.create(session_id=f'{name}-{i}', philosopher='marcus_aurelius', user=user)
+            for i in range(args.sessions)
+        ]
+        rates = run(store, sessions, args.messages, args.batch, args.page_size, args.reads)
+        print(f"{name:>8}: " + '  '.join(f"{rate:9.0f} {label}" for label, rate in rates.items()))
+    
+    if args.mongo_uri:
+        # A page read should be an IXSCAN of session_seq with no in-memory SORT stage
+        plan = collection.find({'session_id': str(sessions[0].pk), 'seq': {'$gt': 1}}, MongoMessageStore.FIELDS) \
+            .sort('seq', 1).limit(args.page_size + 1).explain()
+        print(f"mongodb page plan: {plan['queryPlanner']['winningPlan']}")
+        collection.drop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Cost of the metrics and Server-Timing instrumentation on the add_message hot path.
+
+Times POST /api/sessions/{id}/add_message/ against an instant stub LLM with
+and without MetricsMiddleware and ServerTimingMiddleware, then the per-call
+cost of each recording primitive a turn goes through, and how long a scrape
+takes to render.
+
+    python -m benchmarks.bench_metrics --turns 300
+"""
+import argparse
+import os
+import statistics
+import time
+
+from benchmarks.stub_llm import start_stub_server
+from benchmarks.django_env import setup_django
+
+def per_call_us(fn, calls=100000):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+def turn_ms(client, session_id, turns):
+    """Median milliseconds of an add_message turn"""
+    samples = []
+    for i in range(turns):
+        start = time.perf_counter()
+        response = client.post(f'/api/sessions/{session_id}/add_message/', {'message': f'Question {i}?'}, format='json')
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.content
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--turns', type=int, default=300)
+    args = parser.parse_args()
+    
+    server, stub, url = start_stub_server(first_token_latency=0, tokens_per_sec=1e9)
+    os.environ['GROQ_API_URL'] = url
+    os.environ.setdefault('GROQ_API_KEY', 'stub-key')
+    os.environ['LLM_CACHE_BACKEND'] = 'none'
+    # Measure the header whatever DEBUG is
+    os.environ['SERVER_TIMING_HEADER'] = '1'
+    
+    setup_django()
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.test import RequestFactory, override_settings
+    from django.http import HttpResponse
+    from django.urls import resolve
+    from rest_framework.test import APIClient
+    from philosophy_api import metrics
+    from philosophy_api import timing
+    from philosophy_api.middleware import MetricsMiddleware, ServerTimingMiddleware
+    
+    user = get_user_model().objects.create_user('bench')
+    without = [name for name in settings.MIDDLEWARE if not name.startswith('philosophy_api.middleware.')]
+    results = {}
+    # Alternate the variants so drift in the machine affects both alike
+    for _ in range(2):
+        for label, middleware in (('instrumented', settings.MIDDLEWARE), ('uninstrumented', without)):
+            with override_settings(MIDDLEWARE=middleware):
+                client = APIClient()
+                client.force_authenticate(user)
+                session_id = client.post('/api/sessions/create_session/', {'philosopher': 'kafka'},
+                                         format='json').data['id']
+                results.setdefault(label, []).append(turn_ms(client, session_id, args.turns // 2))
+    for label, samples in results.items():
+        print(f"add_message {label:>16}: {statistics.mean(samples):6.3f} ms median per turn")
+    
+    request = RequestFactory().post('/api/sessions/00000000-0000-0000-0000-000000000000/add_message/')
+    request.resolver_match = resolve(request.path)
+    response = HttpResponse()
+    middleware = MetricsMiddleware(lambda request: response)
+    server_timing = ServerTimingMiddleware(lambda request: response)
+    messages = [{'role': 'system', 'content': 'You are Franz Kafka. ' * 300}, {'role': 'user', 'content': 'Why?'}]
+    
+    def llm_call():
+        with metrics.LLMCall('kafka', 'stub') as call:
+            call.record_tokens(messages, 'Because.', {'prompt_tokens': 1500, 'completion_tokens': 200})
+    
+    def llm_call_estimated():
+        with metrics.LLMCall('kafka', 'stub') as call:
+            call.record_tokens(messages, 'Because. ' * 100)
+    
+    def empty_span():
+        with timing.span('prompt'):
+            pass
+    
+    totals = [0, 0.0]
+    metrics.REQUEST_QUERIES.set(totals)
+    print(f"middleware per request:           {per_call_us(lambda: middleware(request)):6.2f} us")
+    print(f"Server-Timing per request:        {per_call_us(lambda: server_timing(request)):6.2f} us")
+    timing.CURRENT.set(timing.RequestTimings())
+    print(f"span per phase:                   {per_call_us(empty_span):6.2f} us")
+    print(f"query wrapper per query:          "
+          f"{per_call_us(lambda: metrics.observe_query(lambda *args: None, '', (), False, {})):6.2f} us")
+    print(f"LLM call, usage reported:         {per_call_us(llm_call):6.2f} us")
+    print(f"LLM call, tokens estimated:       {per_call_us(llm_call_estimated, 2000):6.2f} us")
+    print(f"scrape render:                    {per_call_us(metrics.render, 200) / 1000:6.2f} ms")
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
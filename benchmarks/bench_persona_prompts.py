@@ -0,0 +1,82 @@
+"""Prompt tokens and latency per persona: full vs. compact persona prompts.
+
+Lists the precomputed token counts of each persona, then has a short
+conversation with every philosopher in each prompt style through
+POST /api/sessions/{id}/add_message/ against the stub LLM, which charges
+time for every prompt token it reads (--prompt-tokens-per-sec).
+
+    python -m benchmarks.bench_persona_prompts --turns 5 --prompt-tokens-per-sec 2000
+"""
+import argparse
+import os
+import statistics
+import time
+
+from benchmarks.stub_llm import start_stub_server
+from benchmarks.django_env import setup_django
+
+QUESTIONS = [
+    "How should I face a setback at work?",
+    "Is it wrong to want to be admired?",
+    "What do I owe to my family?",
+    "How can I stop fearing death?",
+    "Why do I keep procrastinating?",
+]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--turns', type=int, default=5, help='messages per conversation')
+    parser.add_argument('--first-token-latency', type=float, default=0.05)
+    parser.add_argument('--tokens-per-sec', type=float, default=500.0)
+    parser.add_argument('--prompt-tokens-per-sec', type=float, default=2000.0)
+    args = parser.parse_args()
+    
+    server, stub, url = start_stub_server(
+        first_token_latency=args.first_token_latency,
+        tokens_per_sec=args.tokens_per_sec,
+        prompt_tokens_per_sec=args.prompt_tokens_per_sec
+    )
+    os.environ['GROQ_API_URL'] = url
+    os.environ.setdefault('GROQ_API_KEY', 'stub-key')
+    # Every turn must reach the LLM
+    os.environ['LLM_CACHE_BACKEND'] = 'none'
+    
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from rest_framework.test import APIClient
+    from philosophers import PHILOSOPHERS, PROMPT_STYLES
+    
+    print("persona prompt tokens (estimated):")
+    for philosopher_id, philosopher in PHILOSOPHERS.items():
+        tokens = philosopher['prompt_tokens']
+        print(f"{philosopher_id:>16}: full {tokens['full']:5d}  compact {tokens['compact']:5d}  "
+              f"({1 - tokens['compact'] / tokens['full']:.0%} fewer)")
+    
+    user = get_user_model().objects.create_user('bench')
+    client = APIClient()
+    client.force_authenticate(user)
+    
+    print(f"\n{args.turns} turns per conversation, stub reading {args.prompt_tokens_per_sec:.0f} prompt tokens/s")
+    for philosopher_id in PHILOSOPHERS:
+        results = {}
+        for style in PROMPT_STYLES:
+            session_id = client.post('/api/sessions/create_session/', {'philosopher': philosopher_id},
+                                     format='json').data['id']
+            prompt_tokens = stub.prompt_tokens
+            latencies = []
+            for turn in range(args.turns):
+                start = time.perf_counter()
+                response = client.post(f'/api/sessions/{session_id}/add_message/',
+                                       {'message': QUESTIONS[turn % len(QUESTIONS)], 'prompt_style': style},
+                                       format='json')
+                latencies.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 200, response.content
+            results[style] = ((stub.prompt_tokens - prompt_tokens) / args.turns, statistics.median(latencies))
+        
+        print(f"{philosopher_id:>16}: " + "  |  ".join(
+            f"{style} {tokens:6.0f} prompt tokens/turn {latency:6.1f} ms" for style, (tokens, latency) in results.items()
+        ))
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Lookup latency and hit rate of the near-duplicate opening-question cache.
+
+Fills a QuestionCache with synthetic opening questions, then looks up
+paraphrases of cached questions (should hit) and unrelated questions
+(should miss).
+
+    python -m benchmarks.bench_question_cache --entries 100000 --lookups 2000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from philosophers import PHILOSOPHERS
+from question_cache import QuestionCache
+
+TOPICS = ("the future", "my career", "death", "love", "failure", "my family", "money", "loneliness",
+          "ambition", "anger", "grief", "change", "purpose", "success", "my health", "friendship")
+FEELINGS = ("anxious", "worried", "confused", "angry", "afraid", "uncertain", "hopeless", "restless")
+ASKS = ("How can I find peace?", "What should I do?", "How do I cope with it?",
+        "How can I accept it?", "What would you advise?", "Where do I begin?")
+
+def question(rng):
+    return (f"I'm feeling {rng.choice(FEELINGS)} about {rng.choice(TOPICS)} and "
+            f"{rng.choice(TOPICS)} lately, question {rng.randint(0, 10 ** 6)}. {rng.choice(ASKS)}")
+
+def paraphrase(text, rng):
+    """Cheap paraphrase: case, punctuation and contraction changes plus a filler word"""
+    text = text.replace("I'm", rng.choice(["I am", "im", "I'm"])).replace("lately", rng.choice(["lately", "recently"]))
+    text = text.rstrip('?') + rng.choice(['?', '??', '', ' please?'])
+    return text.lower() if rng.random() < 0.5 else text
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--threshold', type=float, default=0.7)
+    args = parser.parse_args()
+    
+    rng = random.Random(3)
+    philosophers = list(PHILOSOPHERS)
+    cache = QuestionCache(threshold=args.threshold, max_entries=args.entries)
+    
+    stored = []
+    start = time.perf_counter()
+    for i in range(args.entries):
+        philosopher, text = philosophers[i % len(philosophers)], question(rng)
+        cache.add(philosopher, text, f"answer {i}")
+        stored.append((philosopher, text, f"answer {i}"))
+    print(f"indexed {args.entries} questions in {time.perf_counter() - start:.1f} s")
+    
+    def run(label, probes):
+        latencies, correct = [], 0
+        for philosopher, text, expected in probes:
+            begin = time.perf_counter()
+            answer, _ = cache.lookup(philosopher, text)
+            latencies.append(time.perf_counter() - begin)
+            correct += answer == expected
+        latencies.sort()
+        print(f"{label:>12}: {'hit' if probes[0][2] else 'miss'} as expected {correct / len(probes):6.1%}  "
+              f"p50 {statistics.median(latencies) * 1000:.3f} ms  "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.3f} ms")
+    
+    paraphrases = [(p, paraphrase(t, rng), a) for p, t, a in rng.sample(stored, args.lookups)]
+    unrelated = [(rng.choice(philosophers), f"What did {rng.choice(TOPICS)} mean to the Romans in year {i}?", None)
+                 for i in range(args.lookups)]
+    run('paraphrases', paraphrases)
+    run('unrelated', unrelated)
+    print(f"cache stats: {cache.stats()}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Message search latency: LIKE '%...%' scan vs. the FTS5 index.
+
+Seeds many users with sessions of generated messages (inserted through the
+ORM, so the index triggers run), then times a user's search for rare and
+common words through the FTS5 index and through a content__icontains scan
+of the user's messages (what a LIKE search does), and the API endpoint end to
+end with the index and with the store's LIKE fallback it replaces.
+
+    python -m benchmarks.bench_search --users 100 --messages 1000000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.django_env import setup_django
+
+WORDS = ('virtue duty reason nature death fear desire will power suffering love freedom fate '
+         'time soul truth justice courage wisdom pleasure pain memory guilt law trial castle '
+         'insect father god abyss overcome eternal recurrence stoic control obstacle path').split()
+
+def sentence(rng, rare):
+    words = rng.choices(WORDS, k=24)
+    if rng.random() < 0.001:
+        words.insert(rng.randrange(len(words)), rare)
+    return ' '.join(words).capitalize() + '.'
+
+def seed(users, sessions_per_user, messages):
+    from django.contrib.auth import get_user_model
+    from philosophy_api.models import ChatMessage, ChatSession
+    
+    rng = random.Random(0)
+    per_session = max(1, messages // (users * sessions_per_user))
+    created = []
+    for u in range(users):
+        user = get_user_model().objects.create_user(f'bench{u}')
+        created.append(user)
+        sessions = ChatSession.objects.bulk_create(
+            ChatSession(session_id=f'bench-{u}-{i}', philosopher='kafka', user=user, last_seq=per_session)
+            for i in range(sessions_per_user)
+        )
+        ChatMessage.objects.bulk_create(
+            (ChatMessage(session=session, seq=j + 1, role='user' if j % 2 == 0 else 'assistant',
+                         content=sentence(rng, 'metamorphosis'))
+             for session in sessions for j in range(per_session)),
+            batch_size=5000
+        )
+    return created, per_session * sessions_per_user * users
+
+def timed_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.95)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--sessions', type=int, default=20, help='sessions per user')
+    parser.add_argument('--messages', type=int, default=1000000, help='messages in total')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    
+    setup_django()
+    from rest_framework.test import APIClient
+    from philosophy_api import message_store
+    from philosophy_api.models import ChatMessage
+    from philosophy_api.search import search_messages
+    
+    start = time.perf_counter()
+    users, total = seed(args.users, args.sessions, args.messages)
+    print(f"seeded {total} messages for {args.users} users in {time.perf_counter() - start:.0f} s (indexed on insert)")
+    
+    search_index_exists = message_store.search_index_exists
+    user = users[len(users) // 2]
+    client = APIClient()
+    client.force_authenticate(user)
+    queries = {'rare word': 'metamorphosis', 'common word': 'virtue', 'two words': 'eternal recurrence'}
+    for label, text in queries.items():
+        hits = len(search_messages(user, text))
+        fts = timed_ms(lambda: search_messages(user, text), args.repeat)
+        api = timed_ms(lambda: client.get('/api/sessions/search/', {'q': text}), args.repeat)
+        like = timed_ms(lambda: list(ChatMessage.objects.filter(session__user=user, content__icontains=text.split()[0])
+                                     .order_by('-timestamp')[:20]), max(1, args.repeat // 10))
+        # The endpoint as it answers on a database without the index
+        message_store.search_index_exists = lambda: False
+        try:
+            api_like = timed_ms(lambda: client.get('/api/sessions/search/', {'q': text}), max(1, args.repeat // 10))
+        finally:
+            message_store.search_index_exists = search_index_exists
+        print(f"{label:>12} ({hits:2d} hits): FTS5 p50 {fts[0]:6.2f} ms p95 {fts[1]:6.2f} ms  "
+              f"LIKE scan p50 {like[0]:8.2f} ms  |  API p50 {api[0]:6.2f} ms, "
+              f"without index {api_like[0]:8.2f} ms")
+
+if __name__ == '__main__':
+    main()
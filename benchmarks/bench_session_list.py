@@ -0,0 +1,106 @@
+"""Queries, latency and payload size of the session list and retrieve endpoints.
+
+Seeds one user with many long sessions, then compares the old list (every
+transcript nested, messages loaded per session) with the slim cursor-paginated
+list, retrieve through the serializer alone and through the API, and a client
+refresh through retrieve vs. the incremental messages endpoint.
+
+    python -m benchmarks.bench_session_list --sessions 1000 --messages 200
+"""
+import argparse
+import json
+import time
+
+from benchmarks.django_env import setup_django
+
+def seed(user, sessions, messages):
+    from philosophy_api.models import ChatSession, ChatMessage
+    
+    created = ChatSession.objects.bulk_create(
+        ChatSession(session_id=f"bench-{i}", philosopher='marcus_aurelius', user=user, summary=f"Chat {i}",
+                    last_seq=messages)
+        for i in range(sessions)
+    )
+    batch = []
+    for session in created:
+        for j in range(messages):
+            role = 'user' if j % 2 == 0 else 'assistant'
+            # bulk_create skips ChatMessage.save(), so number the messages here
+            batch.append(ChatMessage(session=session, seq=j + 1, role=role,
+                                     content=f"Message {j} about virtue and duty. " * 8))
+        if len(batch) >= 20000:
+            ChatMessage.objects.bulk_create(batch)
+            batch = []
+    ChatMessage.objects.bulk_create(batch)
+    return created
+
+def measure(label, fn):
+    """Run fn once under a query counter and print queries, time and response size"""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        data = fn()
+        elapsed = time.perf_counter() - start
+    size = len(json.dumps(data, default=str))
+    print(f"{label:<34} queries {len(queries):5d}  {elapsed * 1000:9.1f} ms  {size / 1024:9.1f} KiB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--messages', type=int, default=200)
+    args = parser.parse_args()
+    
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from rest_framework.test import APIClient
+    from philosophy_api.models import ChatSession
+    from philosophy_api.serializers import ChatSessionSerializer
+    
+    user = get_user_model().objects.create_user('bench', password='bench-password')
+    start = time.perf_counter()
+    sessions = seed(user, args.sessions, args.messages)
+    print(f"seeded {args.sessions} sessions x {args.messages} messages in {time.perf_counter() - start:.1f} s")
+    
+    client = APIClient()
+    client.force_authenticate(user)
+    
+    def get(url):
+        response = client.get(url)
+        assert response.status_code == 200, response.content
+        return response.json()
+    
+    def walk_pages():
+        page, results = get('/api/sessions/?page_size=100'), []
+        results.extend(page['results'])
+        while page['next']:
+            page = get(page['next'])
+            results.extend(page['results'])
+        return results
+    
+    # Load URLconf, serializers and the page cache before timing anything
+    get('/api/ping/')
+    ChatSession.objects.filter(user=user).count()
+    
+    # What the list endpoint used to do: nest every transcript, one query per session
+    measure('list, nested transcripts (before)',
+            lambda: ChatSessionSerializer(ChatSession.objects.filter(user=user), many=True).data)
+    measure('list, first slim page', lambda: get('/api/sessions/'))
+    measure('list, all slim pages', walk_pages)
+    
+    session = sessions[len(sessions) // 2]
+    measure('retrieve, lazy messages (before)',
+            lambda: ChatSessionSerializer(ChatSession.objects.get(pk=session.pk)).data)
+    measure('retrieve, session row + transcript', lambda: get(f'/api/sessions/{session.pk}/'))
+    
+    # Refresh after one more exchange: whole transcript vs. messages after the client's cursor
+    from philosophy_api.models import ChatMessage
+    cursor = get(f'/api/sessions/{session.pk}/messages/?limit=500')['next']
+    ChatMessage.objects.create(session=session, role='user', content='One more question.')
+    ChatMessage.objects.create(session=session, role='assistant', content='One more answer.')
+    measure('refresh, full retrieve (before)', lambda: get(f'/api/sessions/{session.pk}/'))
+    measure('refresh, messages after cursor', lambda: get(f'/api/sessions/{session.pk}/messages/?after={cursor}'))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Cost of saving a Streamlit chat session after every turn: whole-file JSON vs. the JSONL log.
+
+Replays a conversation, saving after each turn (a user message and a reply)
+the way the apps do, once with the previous save_chat_session body (the whole
+session as indented JSON plus a checkpoints copy) and once with
+session_log.write_session. Reports time per save, bytes handed to write()
+and the size left on disk.
+
+    python -m benchmarks.bench_session_log --turns 200
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.django_env import BASE_DIR
+
+def write_legacy(user_dir, filename, session_data):
+    """The body of save_chat_session before the JSONL log"""
+    with open(user_dir / filename, 'w') as f:
+        json.dump({
+            'metadata': {
+                'created_at': str(datetime.now()),
+                'philosopher': session_data['philosopher'],
+                'summary': session_data['summary'],
+                'username': session_data['username']
+            },
+            'checkpoints': session_data['messages'][::5] + [session_data['messages'][-1]],
+            'full_log': session_data['messages']
+        }, f, indent=2)
+    return filename
+
+def bytes_written():
+    """Bytes this process has passed to write() so far (Linux)"""
+    with open('/proc/self/io') as f:
+        return int(next(line for line in f if line.startswith('wchar:')).split()[1])
+
+def replay(save, turns, reply_chars):
+    """Save after each of turns turns; returns per-save seconds, bytes written and the directory"""
+    user_dir = Path(tempfile.mkdtemp(prefix='philosophy_bench_'))
+    session = {'philosopher': 'marcus_aurelius', 'summary': None, 'username': 'bench', 'messages': []}
+    filename = None
+    latencies = []
+    start_bytes = bytes_written()
+    for turn in range(turns):
+        session['messages'].append({'role': 'user', 'content': f"Question {turn}: how should I live?"})
+        session['messages'].append({'role': 'assistant', 'content': 'Reflect on what is in your control. ' * (reply_chars // 37)})
+        start = time.perf_counter()
+        filename = save(user_dir, filename or 'bench_session.json', session)
+        latencies.append(time.perf_counter() - start)
+    return latencies, bytes_written() - start_bytes, user_dir
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--turns', type=int, default=200)
+    parser.add_argument('--reply-chars', type=int, default=800)
+    args = parser.parse_args()
+    
+    sys.path.insert(0, str(BASE_DIR))
+    from session_log import read_session, write_session
+    
+    savers = {
+        'whole-file JSON': write_legacy,
+        'JSONL log': lambda user_dir, filename, session: write_session(
+            user_dir, filename, session['messages'], session),
+    }
+    print(f"{args.turns} turns, {args.reply_chars}-character replies, saved after every turn")
+    for name, save in savers.items():
+        latencies, written, user_dir = replay(save, args.turns, args.reply_chars)
+        on_disk = sum(path.stat().st_size for path in user_dir.iterdir())
+        messages = read_session(user_dir, next(p.name for p in user_dir.iterdir() if not p.name.endswith('.meta.json')))['messages']
+        assert len(messages) == 2 * args.turns
+        last = sorted(latencies[-10:])[5]
+        print(f"{name:>16}: last saves {last * 1000:7.2f} ms  total {sum(latencies):6.2f} s  "
+              f"written {written / 1024 / 1024:8.1f} MiB  on disk {on_disk / 1024:7.1f} KiB")
+
+if __name__ == '__main__':
+    main()
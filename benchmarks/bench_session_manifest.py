@@ -0,0 +1,153 @@
+"""Listing a user's saved sessions: parsing every file vs. the session manifest.
+
+Creates a user directory with many saved sessions and times the previous
+load_chat_sessions body (json.load of every file, then sort) against
+session_log.list_sessions, cold (manifest built from the files) and warm
+(manifest only), for the newest page only, and again right after a save.
+Then times saving a conversation turn by turn with the manifest connection
+kept open in WAL mode, and with it opened (rollback journal, schema checked)
+on every save as before.
+
+    python -m benchmarks.bench_session_manifest --sessions 10000 --turns 200
+"""
+import argparse
+import json
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.django_env import BASE_DIR
+
+def load_by_parsing(user_dir):
+    """The body of load_chat_sessions before the manifest"""
+    sessions = []
+    for file_path in user_dir.glob('*.json'):
+        with open(file_path) as f:
+            data = json.load(f)
+            sessions.append({
+                'filename': file_path.name,
+                'timestamp': data['metadata']['created_at'],
+                'philosopher': data['metadata']['philosopher'],
+                'summary': data['metadata']['summary'],
+                'messages': data['full_log'],
+                'username': data['metadata']['username']
+            })
+    return sorted(sessions, key=lambda x: x['timestamp'], reverse=True)
+
+def populate(user_dir, sessions, messages):
+    """Write sessions in the single-file format, as older versions saved them"""
+    log = [{'role': 'user' if i % 2 == 0 else 'assistant', 'content': 'A thought worth keeping. ' * 20}
+           for i in range(messages)]
+    for i in range(sessions):
+        with open(user_dir / f"session_{i:05d}.json", 'w') as f:
+            json.dump({
+                'metadata': {'created_at': f"2024-01-01 00:00:{i:05d}", 'philosopher': 'kafka',
+                             'summary': f"Session {i}", 'username': 'bench'},
+                'checkpoints': log[::5],
+                'full_log': log
+            }, f, indent=2)
+
+def bytes_written():
+    """Bytes this process has passed to write() so far (Linux)"""
+    with open('/proc/self/io') as f:
+        return int(next(line for line in f if line.startswith('wchar:')).split()[1])
+
+def per_save_manifest(session_log):
+    """The Manifest before connections were kept: opened, schema checked and closed on every use"""
+    class PerSaveManifest(session_log.Manifest):
+        def __enter__(self):
+            self.conn = sqlite3.connect(self.path, timeout=30)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    filename TEXT PRIMARY KEY,
+                    timestamp TEXT,
+                    philosopher TEXT,
+                    summary TEXT,
+                    username TEXT,
+                    message_count INTEGER,
+                    source_mtime_ns INTEGER
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS sessions_timestamp ON sessions (timestamp)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER)")
+            return self
+        
+        def __exit__(self, exc_type, exc, tb):
+            if exc_type is None:
+                self.conn.commit()
+            self.conn.close()
+    return PerSaveManifest
+
+def save_turns(write_session, user_dir, turns):
+    """Median milliseconds per save and bytes written, saving after each of turns turns"""
+    messages, latencies = [], []
+    filename = 'saved_turns.jsonl'
+    start_bytes = bytes_written()
+    for turn in range(turns):
+        messages.append({'role': 'user', 'content': f"Question {turn}: how should I live?"})
+        messages.append({'role': 'assistant', 'content': 'Reflect on what is in your control. ' * 20})
+        start = time.perf_counter()
+        write_session(user_dir, filename, messages, {'philosopher': 'kafka', 'summary': None, 'username': 'bench'})
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies) * 1000, bytes_written() - start_bytes
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=10000)
+    parser.add_argument('--messages', type=int, default=20, help='messages per session')
+    parser.add_argument('--turns', type=int, default=200, help='saves of one conversation')
+    args = parser.parse_args()
+    
+    sys.path.insert(0, str(BASE_DIR))
+    import session_log
+    from session_log import list_sessions, write_session
+    
+    user_dir = Path(tempfile.mkdtemp(prefix='philosophy_bench_')) / 'bench'
+    user_dir.mkdir()
+    populate(user_dir, args.sessions, args.messages)
+    
+    print(f"{args.sessions} sessions x {args.messages} messages")
+    parsed, ms = timed(lambda: load_by_parsing(user_dir))
+    print(f"{'parse every file':>28}: {ms:9.1f} ms")
+    _, ms = timed(lambda: list_sessions(user_dir))
+    print(f"{'manifest, cold (building)':>28}: {ms:9.1f} ms")
+    listed, ms = timed(lambda: list_sessions(user_dir))
+    print(f"{'manifest, warm':>28}: {ms:9.1f} ms")
+    _, ms = timed(lambda: list_sessions(user_dir, limit=50))
+    print(f"{'manifest, newest 50':>28}: {ms:9.1f} ms")
+    
+    write_session(user_dir, 'new_session.jsonl', [{'role': 'user', 'content': 'Hello'}],
+                  {'philosopher': 'kafka', 'summary': None, 'username': 'bench'})
+    after_save, ms = timed(lambda: list_sessions(user_dir))
+    print(f"{'manifest, after a save':>28}: {ms:9.1f} ms")
+    
+    assert [s['filename'] for s in listed] == [s['filename'] for s in parsed]
+    assert len(after_save) == len(parsed) + 1
+    _, ms = timed(lambda: listed[0]['messages'])
+    print(f"{'first messages access':>28}: {ms:9.1f} ms")
+    
+    print(f"\nsaving after each of {args.turns} turns")
+    kept = session_log.Manifest
+    for label, manifest in (('manifest opened per save', per_save_manifest(session_log)),
+                            ('manifest kept open (WAL)', kept)):
+        # A user directory of its own, so each variant gets a manifest in its own journal mode
+        save_dir = user_dir.parent / label.replace(' ', '_')
+        save_dir.mkdir()
+        session_log.Manifest = manifest
+        try:
+            list_sessions(save_dir)
+            ms, written = save_turns(write_session, save_dir, args.turns)
+        finally:
+            session_log.Manifest = kept
+        print(f"{label:>28}: {ms:9.2f} ms per save  written {written / 1024 / 1024:6.1f} MiB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+"""Django settings for benchmark runs: project settings on a throwaway database.
+
+The database path comes from BENCH_DB_PATH so that benchmark servers started
+as subprocesses share the database prepared by the driving script.
+"""
+import os
+
+from philosophy_project.settings import *  # noqa: F401,F403
+from philosophy_project.settings import DATABASES, LOGGING
+
+DATABASES['default']['NAME'] = os.environ['BENCH_DB_PATH']
+
+# Never append to django_debug.log from a benchmark
+LOGGING['handlers'].pop('file', None)
+LOGGING['loggers'] = {
+    name: {'handlers': ['console'], 'level': 'WARNING', 'propagate': False}
+    for name in LOGGING['loggers']
+}
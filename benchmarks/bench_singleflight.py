@@ -0,0 +1,81 @@
+"""Fire bursts of identical requests at a slow stub LLM and count upstream calls.
+
+Each burst sends the same prompt from many threads at once (and, in the
+cross-process run, from several worker processes) with the response cache
+disabled, so every saved upstream call is due to single-flight coalescing.
+
+    python -m benchmarks.bench_singleflight --threads 32 --processes 4 --latency 0.5
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stub_llm import start_stub_server
+from philosophy_api import singleflight
+
+MESSAGES = [
+    {'role': 'system', 'content': 'You are Marcus Aurelius.'},
+    {'role': 'user', 'content': 'How do I stay calm when everything goes wrong?'},
+]
+
+def burst(threads):
+    """Send the same prompt from every thread at once; returns the distinct answers"""
+    from philosophy_api.groq_client_django import GroqClient
+    
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        answers = list(executor.map(lambda _: GroqClient().generate_response(MESSAGES), range(threads)))
+    return set(answers)
+
+def worker(threads, start_event):
+    start_event.wait()
+    burst(threads)
+
+def run(mode, threads, processes, stub):
+    os.environ['LLM_SINGLEFLIGHT'] = '0' if mode == 'off' else '1'
+    if mode == 'process':
+        os.environ['LLM_SINGLEFLIGHT_LOCK_PATH'] = os.path.join(tempfile.mkdtemp(prefix='singleflight_'), 'locks.sqlite3')
+    else:
+        os.environ.pop('LLM_SINGLEFLIGHT_LOCK_PATH', None)
+    singleflight._coalescer = None  # pick up the new configuration
+    
+    upstream_before = stub.requests
+    start = time.perf_counter()
+    
+    # Forked workers share the stub (in this process) and the lock table
+    context = multiprocessing.get_context('fork')
+    start_event = context.Event()
+    workers = [context.Process(target=worker, args=(threads, start_event)) for _ in range(processes)]
+    for process in workers:
+        process.start()
+    start_event.set()
+    for process in workers:
+        process.join()
+    
+    return stub.requests - upstream_before, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.5)
+    args = parser.parse_args()
+    
+    server, stub, url = start_stub_server(first_token_latency=args.latency, tokens_per_sec=1e9)
+    os.environ['GROQ_API_URL'] = url
+    os.environ.setdefault('GROQ_API_KEY', 'stub-key')
+    os.environ['LLM_CACHE_BACKEND'] = 'none'
+    
+    total = args.threads * args.processes
+    print(f"{args.processes} processes x {args.threads} threads = {total} identical requests, "
+          f"upstream latency {args.latency * 1000:.0f} ms")
+    for mode in ('off', 'thread', 'process'):
+        upstream, elapsed = run(mode, args.threads, args.processes, stub)
+        print(f"{mode:>7}: upstream calls {upstream:4d}  coalesced {total - upstream:4d}  wall {elapsed:5.2f} s")
+    
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
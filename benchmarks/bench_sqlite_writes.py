@@ -0,0 +1,124 @@
+"""Concurrent chat-turn writes on SQLite: default settings vs. SQLITE_PRODUCTION.
+
+Each worker thread plays request after request of the add_message write
+pattern (load session, save the user message, read the history, save the
+reply and the session in one transaction), closing or keeping its connection
+between requests like Django's request signals do. Every profile runs in its
+own subprocess on a fresh database so the settings are read at startup.
+
+    python -m benchmarks.bench_sqlite_writes --threads 8 --requests 200
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.django_env import BASE_DIR, bench_env, setup_django
+
+PROFILES = {
+    'default': {'SQLITE_PRODUCTION': '0'},
+    'production': {'SQLITE_PRODUCTION': '1'},
+}
+
+def run_workers(threads, requests_per_thread):
+    """Body of the child process; returns throughput, latencies and failures"""
+    from django.contrib.auth import get_user_model
+    from django.db import OperationalError, close_old_connections, connection
+    from philosophy_api.models import ChatMessage, ChatSession
+    from philosophy_api.message_store import get_message_store
+    from philosophy_api.views import save_reply
+    
+    user = get_user_model().objects.create_user('bench')
+    session_pks = [
+        ChatSession.objects.create(session_id=f'bench-{i}', philosopher='marcus_aurelius', user=user).pk
+        for i in range(threads)
+    ]
+    journal_mode = connection.cursor().execute('PRAGMA journal_mode').fetchone()[0]
+    connection.close()
+    
+    latencies, failures, connects = [], [], []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(threads)
+    
+    def worker(session_pk):
+        start_barrier.wait()
+        opened = 0
+        for i in range(requests_per_thread):
+            # What request_started/request_finished do around every request
+            close_old_connections()
+            if connection.connection is None:
+                opened += 1
+            start = time.perf_counter()
+            try:
+                session = ChatSession.objects.get(pk=session_pk)
+                ChatMessage.objects.create(session=session, role='user', content=f'Question {i} ' * 20)
+                get_message_store().history(session)
+                save_reply(session, f'Answer {i} ' * 80)
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+            except OperationalError as e:
+                with lock:
+                    failures.append(str(e))
+            close_old_connections()
+        connection.close()
+        with lock:
+            connects.append(opened)
+    
+    workers = [threading.Thread(target=worker, args=(pk,)) for pk in session_pks]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    
+    return {
+        'journal_mode': journal_mode,
+        'turns_per_sec': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000 if latencies else None,
+        'p99_ms': statistics.quantiles(latencies, n=100)[98] * 1000 if len(latencies) >= 100 else None,
+        'failures': len(failures),
+        'failure_sample': failures[:1],
+        'connections_opened': sum(connects),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='turns per thread')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        setup_django(os.environ['BENCH_DB_PATH'])
+        # Keep the benchmark about the database
+        from django.test import override_settings
+        with override_settings(CHAT_HISTORY_CACHE_MAX_BYTES=0):
+            print(json.dumps(run_workers(args.threads, args.requests)))
+        return
+    
+    print(f"{args.threads} threads x {args.requests} chat turns")
+    for name, profile_env in PROFILES.items():
+        db_path = os.path.join(tempfile.mkdtemp(prefix='philosophy_bench_'), 'bench.sqlite3')
+        env = {**os.environ, **bench_env(db_path), **profile_env}
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_sqlite_writes', '--child',
+             '--threads', str(args.threads), '--requests', str(args.requests)],
+            cwd=BASE_DIR, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        
+        p99 = f"{result['p99_ms']:7.1f}" if result['p99_ms'] is not None else '    n/a'
+        print(f"{name:>10} ({result['journal_mode']}): {result['turns_per_sec']:7.1f} turns/s  "
+              f"p50 {result['p50_ms']:6.1f} ms  p99 {p99} ms  "
+              f"locked errors {result['failures']:4d}  connections opened {result['connections_opened']}")
+        if result['failure_sample']:
+            print(f"{'':>12}e.g. {result['failure_sample'][0]}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Per-request overhead of a fresh connection vs. the pooled keep-alive transport.
+
+Sends sequential non-streaming completions to a zero-latency HTTPS stub:
+once with bare requests.post (what GroqClient used to do) and once through
+GroqClient and its shared session.
+    
+    python -m benchmarks.bench_transport --requests 200
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+
+import requests
+
+from benchmarks.stub_llm import start_stub_server
+
+def make_self_signed_cert(directory):
+    """Create a throwaway certificate for 127.0.0.1 with the openssl CLI"""
+    certfile = os.path.join(directory, 'stub.pem')
+    keyfile = os.path.join(directory, 'stub.key')
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+        '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+        '-keyout', keyfile, '-out', certfile
+    ], check=True, capture_output=True)
+    return certfile, keyfile
+
+def timed(fn, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--no-tls', action='store_true', help='Use plain HTTP (hides the TLS handshake cost)')
+    args = parser.parse_args()
+    
+    certfile = keyfile = None
+    if not args.no_tls:
+        certfile, keyfile = make_self_signed_cert(tempfile.mkdtemp(prefix='stub_tls_'))
+        # Trusted by both bare requests and the shared session
+        os.environ['REQUESTS_CA_BUNDLE'] = certfile
+    
+    server, stub, url = start_stub_server(
+        certfile=certfile, keyfile=keyfile,
+        first_token_latency=0.0, tokens_per_sec=1e9
+    )
+    os.environ['GROQ_API_URL'] = url
+    os.environ.setdefault('GROQ_API_KEY', 'stub-key')
+    # The pooled loop repeats one prompt: every call must reach the stub
+    os.environ['LLM_CACHE_BACKEND'] = 'none'
+    
+    from philosophy_api.groq_client_django import GroqClient, warm_connections
+    messages = [{'role': 'user', 'content': 'What is virtue?'}]
+    client = GroqClient()
+    headers, data = client._build_request(messages)
+    
+    def fresh_connection():
+        requests.post(url, headers=headers, json=data, timeout=client.timeout).raise_for_status()
+    
+    def pooled_connection():
+        GroqClient().generate_response(messages)
+    
+    fresh = timed(fresh_connection, args.requests)
+    warm_connections(1)
+    pooled = timed(pooled_connection, args.requests)
+    server.shutdown()
+    
+    fresh_ms = statistics.median(fresh) * 1000
+    pooled_ms = statistics.median(pooled) * 1000
+    print(f"{'https' if certfile else 'http'} stub, {args.requests} sequential requests each")
+    print(f"fresh connection per request: median {fresh_ms:7.2f} ms")
+    print(f"pooled keep-alive transport:  median {pooled_ms:7.2f} ms")
+    print(f"overhead saved per request:          {fresh_ms - pooled_ms:7.2f} ms")
+
+if __name__ == '__main__':
+    main()
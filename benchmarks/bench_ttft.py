@@ -0,0 +1,65 @@
+"""Time-to-first-token: blocking add_message vs. the SSE streaming mode.
+
+Runs both variants of POST /api/sessions/{id}/add_message/ against the local
+stub LLM and reports when the first byte of the answer reaches the client.
+    
+    python -m benchmarks.bench_ttft --runs 5 --first-token-latency 0.3 --tokens-per-sec 40
+"""
+import argparse
+import os
+import statistics
+import time
+
+from benchmarks.stub_llm import start_stub_server
+from benchmarks.django_env import setup_django
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--first-token-latency', type=float, default=0.3)
+    parser.add_argument('--tokens-per-sec', type=float, default=40.0)
+    args = parser.parse_args()
+    
+    server, stub, url = start_stub_server(
+        first_token_latency=args.first_token_latency,
+        tokens_per_sec=args.tokens_per_sec
+    )
+    os.environ['GROQ_API_URL'] = url
+    os.environ.setdefault('GROQ_API_KEY', 'stub-key')
+    
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from rest_framework.test import APIClient
+    
+    user = get_user_model().objects.create_user('bench', 'bench@example.com', 'bench-password')
+    client = APIClient()
+    client.force_authenticate(user)
+    session_id = client.post('/api/sessions/create_session/', {'philosopher': 'marcus_aurelius'}, format='json').data['id']
+    endpoint = f'/api/sessions/{session_id}/add_message/'
+    
+    blocking, streaming_first, streaming_total = [], [], []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        response = client.post(endpoint, {'message': 'How do I find peace?'}, format='json')
+        assert response.status_code == 200, response.content
+        blocking.append(time.perf_counter() - start)
+        
+        start = time.perf_counter()
+        response = client.post(f'{endpoint}?stream=1', {'message': 'How do I find peace?'}, format='json')
+        chunks = iter(response.streaming_content)
+        next(chunks)
+        streaming_first.append(time.perf_counter() - start)
+        for _ in chunks:
+            pass
+        streaming_total.append(time.perf_counter() - start)
+        response.close()
+    
+    server.shutdown()
+    
+    print(f"upstream: first token after {args.first_token_latency:.2f}s, {args.tokens_per_sec:.0f} tokens/s, {len(stub.tokens())} tokens")
+    print(f"blocking   time to first token: median {statistics.median(blocking) * 1000:8.1f} ms")
+    print(f"streaming  time to first token: median {statistics.median(streaming_first) * 1000:8.1f} ms")
+    print(f"streaming  time to last token:  median {statistics.median(streaming_total) * 1000:8.1f} ms")
+
+if __name__ == '__main__':
+    main()
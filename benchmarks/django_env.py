@@ -0,0 +1,36 @@
+"""Bootstrap Django against a throwaway SQLite database for benchmarks"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+def setup_django(db_path=None, migrate=True):
+    """Configure Django with benchmarks.bench_settings and an isolated database.
+    
+    Returns the path of the database file so callers can reuse it (e.g. from
+    a server subprocess started with bench_env()).
+    """
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='philosophy_bench_'), 'bench.sqlite3')
+    os.environ.update(bench_env(db_path))
+    
+    import django
+    django.setup()
+    
+    if migrate:
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+    
+    return db_path
+
+def bench_env(db_path):
+    """Environment variables that point a Django process at the benchmark database"""
+    return {
+        'DJANGO_SETTINGS_MODULE': 'benchmarks.bench_settings',
+        'BENCH_DB_PATH': str(db_path),
+    }
@@ -0,0 +1,242 @@
+"""Local stub of an OpenAI-compatible chat completions endpoint.
+
+Used by the benchmark scripts so they can run without Groq credentials or
+network access. The first-token latency can be fixed or drawn from a
+distribution around --first-token-latency, and a fraction of requests can
+be failed on purpose. Run standalone with:
+    
+    python -m benchmarks.stub_llm --port 8001 --first-token-latency 0.5 \
+        --latency-distribution lognormal --latency-spread 0.5 --error-rate 0.01
+
+and point the Django client at it with
+GROQ_API_URL=http://127.0.0.1:8001/openai/v1/chat/completions
+"""
+import argparse
+import json
+import logging
+import random
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from context_window import message_tokens
+
+logger = logging.getLogger(__name__)
+
+# How first-token latencies are drawn; first_token_latency is the median
+# (fixed, uniform, lognormal) or the mean (exponential)
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal', 'exponential')
+
+STUB_REPLY = ("The obstacle in the path becomes the path. Never forget, within every "
+              "obstacle is an opportunity to improve our condition.")
+
+class StubConfig:
+    """Behaviour of the stub server"""
+    
+    def __init__(self, first_token_latency=0.3, tokens_per_sec=50.0, reply=STUB_REPLY, prompt_tokens_per_sec=None,
+                 latency_distribution='fixed', latency_spread=0.5, error_rate=0.0, error_status=500, seed=None):
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency_distribution must be one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+        self.first_token_latency = first_token_latency
+        self.tokens_per_sec = tokens_per_sec
+        self.reply = reply
+        # Prompt processing speed; None makes the prompt free
+        self.prompt_tokens_per_sec = prompt_tokens_per_sec
+        self.latency_distribution = latency_distribution
+        # Relative width of uniform latencies, sigma of lognormal ones
+        self.latency_spread = latency_spread
+        # Fraction of requests answered with error_status instead of a completion
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        
+        # Counters the benchmarks read back
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.aborted_streams = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+    
+    def tokens(self):
+        """Split the reply into word-sized tokens"""
+        words = self.reply.split(' ')
+        return [word if i == 0 else ' ' + word for i, word in enumerate(words)]
+    
+    def sample_latency(self):
+        """First-token latency of one request, before prompt processing"""
+        base, spread = self.first_token_latency, self.latency_spread
+        with self.lock:
+            if self.latency_distribution == 'uniform':
+                return self.random.uniform(base * max(0.0, 1 - spread), base * (1 + spread))
+            if self.latency_distribution == 'lognormal':
+                return base * self.random.lognormvariate(0, spread)
+            if self.latency_distribution == 'exponential' and base > 0:
+                return self.random.expovariate(1 / base)
+        return base
+    
+    def should_fail(self):
+        """Whether to answer this request with an error"""
+        if not self.error_rate:
+            return False
+        with self.lock:
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        return failed
+    
+    def time_to_first_token(self, prompt_tokens):
+        """Seconds before the first token of a reply to a prompt of prompt_tokens"""
+        if not self.prompt_tokens_per_sec:
+            return self.sample_latency()
+        return self.sample_latency() + prompt_tokens / self.prompt_tokens_per_sec
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes; avoid delayed-ACK stalls
+    disable_nagle_algorithm = True
+    config = None
+    
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+    
+    def do_HEAD(self):
+        # Used by GroqClient.warm_connections; keep the connection open
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        
+        prompt_tokens = sum(message_tokens(message) for message in body.get('messages', []))
+        with self.config.lock:
+            self.config.requests += 1
+            self.config.prompt_tokens += prompt_tokens
+        
+        if self.config.should_fail():
+            self._error()
+        elif body.get('stream'):
+            self._stream(body, prompt_tokens)
+        else:
+            self._complete(body, prompt_tokens)
+    
+    def _error(self):
+        payload = json.dumps({
+            'error': {'message': 'Injected stub error', 'type': 'server_error', 'code': self.config.error_status}
+        }).encode()
+        self.send_response(self.config.error_status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def _complete(self, body, prompt_tokens):
+        tokens = self.config.tokens()
+        time.sleep(self.config.time_to_first_token(prompt_tokens) + len(tokens) / self.config.tokens_per_sec)
+        
+        payload = json.dumps({
+            'id': 'chatcmpl-stub',
+            'object': 'chat.completion',
+            'model': body.get('model', 'stub'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': len(tokens),
+                      'total_tokens': prompt_tokens + len(tokens)}
+        }).encode()
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def _stream(self, body, prompt_tokens):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        
+        time.sleep(self.config.time_to_first_token(prompt_tokens))
+        try:
+            for token in self.config.tokens():
+                chunk = {
+                    'id': 'chatcmpl-stub',
+                    'object': 'chat.completion.chunk',
+                    'model': body.get('model', 'stub'),
+                    'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}]
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(1 / self.config.tokens_per_sec)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            with self.config.lock:
+                self.config.aborted_streams += 1
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded server with a listen backlog large enough for request bursts"""
+    daemon_threads = True
+    request_queue_size = 256
+
+def start_stub_server(host='127.0.0.1', port=0, certfile=None, keyfile=None, **config):
+    """Start the stub in a daemon thread and return (server, config, url).
+    
+    Pass certfile/keyfile to serve HTTPS, which makes connection setup cost
+    comparable to the real API.
+    """
+    stub_config = StubConfig(**config)
+    handler = type('ConfiguredStubHandler', (StubHandler,), {'config': stub_config})
+    server = StubServer((host, port), handler)
+    
+    scheme = 'http'
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = 'https'
+    
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    
+    url = f"{scheme}://{host}:{server.server_address[1]}/openai/v1/chat/completions"
+    return server, stub_config, url
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a local OpenAI-compatible stub server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--first-token-latency', type=float, default=0.3)
+    parser.add_argument('--tokens-per-sec', type=float, default=50.0)
+    parser.add_argument('--prompt-tokens-per-sec', type=float, help='prompt processing speed (default: free)')
+    parser.add_argument('--latency-distribution', choices=LATENCY_DISTRIBUTIONS, default='fixed')
+    parser.add_argument('--latency-spread', type=float, default=0.5,
+                        help='relative width (uniform) or sigma (lognormal) of the latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail')
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    server, _, url = start_stub_server(
+        args.host, args.port,
+        first_token_latency=args.first_token_latency,
+        tokens_per_sec=args.tokens_per_sec,
+        prompt_tokens_per_sec=args.prompt_tokens_per_sec,
+        latency_distribution=args.latency_distribution,
+        latency_spread=args.latency_spread,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed
+    )
+    print(f"Stub LLM listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
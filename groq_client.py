@@ -6,6 +6,7 @@ from langchain.memory import ConversationBufferMemory
 from langchain.chains import ConversationChain
 import time
 import streamlit as st
+from llm_cache import cache_key, get_response_cache
 
 # Try to load from .env file for local development
 load_dotenv()
@@ -19,26 +20,72 @@ class GroqClient:
         if not self.api_key:
             raise ValueError("GROQ_API_KEY not found in environment variables or Streamlit secrets")
             
+        self.model = 'llama-3.3-70b-versatile'
+        self.temperature = 0.5  # Lower temperature for more focused responses
+        self.max_tokens = 512  # Limit response length
+        
         # Initialize client with optimized configuration
         self.client = ChatGroq(
             groq_api_key=self.api_key,
-            model_name='llama-3.3-70b-versatile',
-            temperature=0.5,  # Lower temperature for more focused responses
-            max_tokens=512,  # Limit response length 
+            model_name=self.model,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
         )
         
+        # Identical requests are answered from the shared response cache
+        self.cache = get_response_cache()
+        
         # Initialize with buffer memory
         self.memory = ConversationBufferMemory()
 
-    def generate_response(self, messages):
+    def _cache_key(self, messages, philosopher):
+        """Key for the response cache, or None when caching is off for this philosopher"""
+        if not self.cache.enabled_for(philosopher):
+            return None
+        return cache_key(self.model, self.temperature, self.max_tokens, messages)
+
+    def generate_response(self, messages, philosopher=None):
         """Generate response using full conversation history"""
+        key = self._cache_key(messages, philosopher)
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
         try:
             # Pass through messages exactly as received
             response = self.client.invoke(messages)
-            return response.content
         except Exception as e:
             print(f"Groq API Error: {str(e)}")
             return "I need a moment to reflect. Please try your question again."
+        
+        if key:
+            self.cache.set(key, response.content)
+        return response.content
+
+    def stream_response(self, messages, philosopher=None):
+        """Yield the response token by token (suitable for st.write_stream)"""
+        key = self._cache_key(messages, philosopher)
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        
+        tokens = []
+        try:
+            for chunk in self.client.stream(messages):
+                if chunk.content:
+                    tokens.append(chunk.content)
+                    yield chunk.content
+        except Exception as e:
+            print(f"Groq API Error: {str(e)}")
+            yield "I need a moment to reflect. Please try your question again."
+            return
+        
+        # Only complete responses are cached
+        if key:
+            self.cache.set(key, ''.join(tokens))
 
     def load_chat_history(self, messages):
         """
@@ -62,19 +109,36 @@ class GroqClient:
 
     def summarize_conversation(self, messages):
         """Generate a summary of the conversation"""
-        if not messages:
-            return "Empty conversation"
-            
         try:
-            summary_prompt = [
-                {'role': 'system', 'content': "You are Marcus Aurelius. Summarize this philosophical dialogue in your stoic voice, highlighting the key insights. Keep under 100 words."},
-                {'role': 'user', 'content': '\n'.join([m['content'] for m in messages])}
-            ]
-            return self.generate_response(summary_prompt)
+            return self.summarize_incremental(None, messages)
         except Exception as e:
             print(f"Summary generation error: {str(e)}")
             # Return a basic summary if generation fails
             return "A philosophical dialogue on the nature of wisdom and virtue."
+
+    def summarize_incremental(self, previous_summary, new_messages):
+        """Update a previous summary with new turns only, instead of re-reading the whole transcript.
+        
+        Raises if the model call fails, so callers can keep the last good
+        summary rather than store a fallback reply as the summary.
+        """
+        if not previous_summary and not new_messages:
+            return "Empty conversation"
+        
+        turns = '\n'.join([f"{m['role']}: {m['content']}" for m in new_messages])
+        if previous_summary:
+            content = f"Summary so far:\n{previous_summary}\n\nNew exchanges:\n{turns}"
+            instruction = "Update the summary so far with the new exchanges."
+        else:
+            content = turns
+            instruction = "Summarize this philosophical dialogue."
+        
+        summary_prompt = [
+            {'role': 'system', 'content': f"You are Marcus Aurelius. {instruction} Write in your stoic voice, highlighting the key insights. Keep under 100 words."},
+            {'role': 'user', 'content': content}
+        ]
+        # Not generate_response: it turns errors into an apology, which would be saved as the summary
+        return self.client.invoke(summary_prompt).content
         
     def health_check(self):
         """Check if the Groq API is working"""
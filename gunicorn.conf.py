@@ -0,0 +1,26 @@
+"""Gunicorn configuration for the Django API.
+
+Run with: gunicorn -c gunicorn.conf.py philosophy_project.wsgi
+"""
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# Long enough for a slow completion; GROQ_READ_TIMEOUT bounds the upstream wait
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "90"))
+
+def on_starting(server):
+    """Start the metrics of a new server from zero (see philosophy_api/metrics.py)"""
+    metrics_dir = os.getenv("METRICS_DIR")
+    if metrics_dir and os.path.isdir(metrics_dir):
+        for name in os.listdir(metrics_dir):
+            if name.endswith(".json"):
+                os.remove(os.path.join(metrics_dir, name))
+
+def post_worker_init(worker):
+    """Open upstream connections in each worker before it takes traffic"""
+    if os.getenv("GROQ_WARM_CONNECTIONS", "2") != "0":
+        from philosophy_api.groq_client_django import warm_connections
+        warm_connections()
@@ -0,0 +1,215 @@
+"""Exact-match cache for LLM responses.
+
+Both GroqClient implementations look up a response here before calling the
+API. The key is a canonical hash of everything that determines the answer
+(model, temperature, max_tokens and the full message list), so a hit only
+happens for a byte-for-byte identical request - e.g. the same opening
+question to the same philosopher. Caching is opt-in: with a non-zero
+temperature a cached hit replaces a fresh sample, so every user asking the
+same opening question would get the same reply.
+
+Configured through environment variables:
+
+    LLM_CACHE_BACKEND                  none (default), memory or sqlite
+    LLM_CACHE_MAX_ENTRIES              entries kept before evicting the least recently used (1024)
+    LLM_CACHE_TTL                      seconds an entry stays valid (3600)
+    LLM_CACHE_PATH                     database file for the sqlite backend (llm_cache.sqlite3)
+    LLM_CACHE_DISABLED_PHILOSOPHERS    comma-separated philosopher ids that are never cached
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+def cache_key(model, temperature, max_tokens, messages):
+    """Canonical hash of a chat completion request"""
+    canonical = json.dumps(
+        {
+            'model': model,
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+            'messages': [{'role': m['role'], 'content': m['content']} for m in messages],
+        },
+        sort_keys=True,
+        separators=(',', ':'),
+        ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class MemoryCache:
+    """In-process LRU cache with a size limit and per-entry TTL"""
+    
+    def __init__(self, max_entries=1024, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self):
+        return len(self._entries)
+
+class SQLiteCache:
+    """Persistent cache in a SQLite file, shared by every process on the host.
+    
+    Entries expire after ttl seconds; once the table grows past max_entries
+    the least recently used rows are deleted.
+    """
+    
+    def __init__(self, path='llm_cache.sqlite3', max_entries=10000, ttl=3600):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        
+        with self._connection() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS llm_cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, used_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS llm_cache_used_at ON llm_cache (used_at)')
+    
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+    
+    def get(self, key):
+        now = time.time()
+        with self._connection() as connection:
+            row = connection.execute(
+                'SELECT value FROM llm_cache WHERE key = ? AND expires_at > ?', (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute('UPDATE llm_cache SET used_at = ? WHERE key = ?', (now, key))
+        return row[0]
+    
+    def set(self, key, value):
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO llm_cache (key, value, expires_at, used_at) VALUES (?, ?, ?, ?)',
+                (key, value, now + self.ttl, now)
+            )
+            
+            # Prune now and then rather than on every write
+            self._writes += 1
+            if self._writes % 100 == 0:
+                connection.execute('DELETE FROM llm_cache WHERE expires_at <= ?', (now,))
+                connection.execute(
+                    'DELETE FROM llm_cache WHERE key IN ('
+                    'SELECT key FROM llm_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)',
+                    (self.max_entries,)
+                )
+    
+    def clear(self):
+        with self._connection() as connection:
+            connection.execute('DELETE FROM llm_cache')
+    
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+
+class ResponseCache:
+    """Cache front-end used by the LLM clients: backend, opt-outs and hit/miss counters"""
+    
+    def __init__(self, backend, disabled_philosophers=()):
+        self.backend = backend
+        self.disabled_philosophers = set(disabled_philosophers)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+    
+    def enabled_for(self, philosopher=None):
+        """Whether responses for this philosopher may be cached"""
+        return self.backend is not None and philosopher not in self.disabled_philosophers
+    
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+    
+    def set(self, key, value):
+        self.backend.set(key, value)
+    
+    def stats(self):
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': type(self.backend).__name__ if self.backend else None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+# Process-wide cache shared by every client instance
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Return the process-wide ResponseCache configured from the environment"""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache(
+                    create_backend(os.getenv('LLM_CACHE_BACKEND', 'none')),
+                    [p.strip() for p in os.getenv('LLM_CACHE_DISABLED_PHILOSOPHERS', '').split(',') if p.strip()]
+                )
+    return _response_cache
+
+def create_backend(name):
+    """Build a cache backend by name ('memory', 'sqlite' or 'none')"""
+    ttl = float(os.getenv('LLM_CACHE_TTL', '3600'))
+    if name == 'memory':
+        return MemoryCache(int(os.getenv('LLM_CACHE_MAX_ENTRIES', '1024')), ttl)
+    if name == 'sqlite':
+        return SQLiteCache(
+            os.getenv('LLM_CACHE_PATH', 'llm_cache.sqlite3'),
+            int(os.getenv('LLM_CACHE_MAX_ENTRIES', '10000')),
+            ttl
+        )
+    if name not in ('none', ''):
+        logger.warning(f"Unknown LLM_CACHE_BACKEND {name!r}, caching disabled")
+    return None
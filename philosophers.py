@@ -1,4 +1,8 @@
 from datetime import datetime
+import os
+import re
+
+from context_window import message_tokens
 
 PHILOSOPHERS = {
     'marcus_aurelius': {
@@ -138,6 +142,48 @@ Dostoevsky: "The meaning of life! As Ivan Karamazov said, 'If God does not exist
     }
 }
 
+# "full" sends each persona with its three examples; "compact" keeps the
+# instructions and one shortened example
+PROMPT_STYLES = ('full', 'compact')
+PERSONA_PROMPT_STYLE = os.getenv('PERSONA_PROMPT_STYLE', 'full')
+if PERSONA_PROMPT_STYLE not in PROMPT_STYLES:
+    raise ValueError(f"PERSONA_PROMPT_STYLE must be one of {', '.join(PROMPT_STYLES)}, not {PERSONA_PROMPT_STYLE!r}")
+
+EXAMPLES_HEADER = 'Here are examples of how you should respond:'
+# Sentences of the first example's answer kept in a compact prompt
+COMPACT_EXAMPLE_SENTENCES = 2
+
+def compact_system_message(system_message):
+    """The persona's instructions followed by its first example, cut to a few sentences"""
+    instructions, _, examples = system_message.partition(EXAMPLES_HEADER)
+    example = re.search(r'Example 1:\n(User: .*)\n(.+?): "(.*)"', examples)
+    if not example:
+        return instructions.rstrip()
+    question, speaker, answer = example.groups()
+    sentences = re.split(r'(?<=[.!?])\s+', answer)
+    short = ' '.join(sentences[:COMPACT_EXAMPLE_SENTENCES])
+    return f'{instructions.rstrip()}\n\nExample of how you should respond:\n{question}\n{speaker}: "{short}"'
+
+# Computed once: the compact prompts, and what each variant costs on every turn
+for philosopher in PHILOSOPHERS.values():
+    philosopher['compact_system_message'] = compact_system_message(philosopher['system_message'])
+    philosopher['prompt_tokens'] = {
+        'full': message_tokens({'content': philosopher['system_message']}),
+        'compact': message_tokens({'content': philosopher['compact_system_message']}),
+    }
+
+# Every persona prompt in either style, as stored in system rows
+PERSONA_PROMPTS = {philosopher[key] for philosopher in PHILOSOPHERS.values()
+                   for key in ('system_message', 'compact_system_message')}
+
+def get_system_message(philosopher_id, style=None):
+    """The persona prompt of a philosopher in style (default: PERSONA_PROMPT_STYLE)"""
+    style = style or PERSONA_PROMPT_STYLE
+    if style not in PROMPT_STYLES:
+        raise ValueError(f"Unknown prompt style {style!r}; expected one of {', '.join(PROMPT_STYLES)}")
+    philosopher = PHILOSOPHERS[philosopher_id]
+    return philosopher['system_message'] if style == 'full' else philosopher['compact_system_message']
+
 def get_philosopher(philosopher_id):
     """Get philosopher data by ID"""
     return PHILOSOPHERS.get(philosopher_id)
@@ -148,7 +194,8 @@ def get_all_philosophers():
         {
             "id": key,
             "name": philosopher["name"],
-            "avatar": philosopher["avatar"]
+            "avatar": philosopher["avatar"],
+            "prompt_tokens": philosopher["prompt_tokens"]
         } for key, philosopher in PHILOSOPHERS.items()
     ]
 
@@ -156,6 +203,7 @@ def get_all_philosophers():
 import json
 import os
 from pathlib import Path
+from session_log import list_sessions, write_session
 
 CHAT_HISTORY_DIR = Path("sessions")
 CHAT_HISTORY_DIR.mkdir(exist_ok=True)
@@ -174,47 +222,14 @@ def save_chat_session(session_data):
     
     # If session has a filename, use it (for updating existing sessions)
     if 'filename' in session_data and session_data['filename']:
-        filename = user_dir / session_data['filename']
+        filename = session_data['filename']
     else:
         # Create new filename for new sessions
-        filename = user_dir / f"{first_message}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        filename = f"{first_message}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
     
-    with open(filename, 'w') as f:
-        json.dump({
-            'metadata': {
-                'created_at': str(datetime.now()),
-                'philosopher': session_data['philosopher'],
-                'summary': session_data['summary'],
-                'username': session_data['username']
-            },
-            'checkpoints': session_data['messages'][::5] + [session_data['messages'][-1]],
-            'full_log': session_data['messages']
-        }, f, indent=2)
-    
-    return filename.name
+    # Appends only the messages added since the last save (see session_log.py)
+    return write_session(user_dir, filename, session_data['messages'], session_data)
 
-def load_chat_sessions(username):
-    sessions = []
-    user_dir = CHAT_HISTORY_DIR / username
-    
-    if not user_dir.exists():
-        return sessions
-        
-    for file_path in user_dir.glob('*.json'):
-        try:
-            with open(file_path) as f:
-                data = json.load(f)
-                if not all(key in data for key in ['metadata', 'checkpoints', 'full_log']):
-                    raise ValueError("Invalid session format")
-                
-                sessions.append({
-                    'filename': file_path.name,
-                    'timestamp': data['metadata']['created_at'],
-                    'philosopher': data['metadata']['philosopher'],
-                    'summary': data['metadata']['summary'],
-                    'messages': data['full_log'],
-                    'username': data['metadata']['username']
-                })
-        except Exception as e:
-            print(f"Error loading session {file_path}: {e}")
-    return sorted(sessions, key=lambda x: x['timestamp'], reverse=True)
\ No newline at end of file
+def load_chat_sessions(username, limit=None):
+    """List a user's saved sessions, newest first; each session's messages are read on first access"""
+    return list_sessions(CHAT_HISTORY_DIR / username, limit=limit)
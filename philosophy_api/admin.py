@@ -1,18 +1,135 @@
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters, ShowFacets
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.db.models import Q
+
 from .models import ChatSession, ChatMessage
+from .pagination import EstimatedCountPaginator, decode_keyset_cursor, encode_keyset_cursor
+from .search import fts_query, matching_message_ids, search_index_exists
+
+# Import the philosophers module
+from philosophers import PHILOSOPHERS
+
+class KeysetChangeList(ChangeList):
+    """Changelist paged by a cursor on (keyset_field, pk) instead of OFFSET.
+    
+    Every page, however deep, is a range scan of the index on those columns.
+    The cursor travels in the usual page parameter, so filters and search
+    links keep working; the result count is an estimate.
+    """
+    
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        field = self.lookup_opts.get_field(self.model_admin.keyset_field)
+        queryset, direction = self.queryset, 'next'
+        
+        cursor = request.GET.get(PAGE_VAR)
+        if cursor:
+            try:
+                direction, (value, pk) = decode_keyset_cursor(cursor)
+                value, pk = field.to_python(value), self.lookup_opts.pk.to_python(pk)
+            except (ValueError, TypeError):
+                raise IncorrectLookupParameters
+            # The first condition bounds the index scan, the second breaks ties
+            name = field.name
+            if direction == 'next':
+                queryset = queryset.filter(**{f'{name}__lte': value}).filter(Q(**{f'{name}__lt': value}) | Q(pk__lt=pk))
+            else:
+                queryset = queryset.filter(**{f'{name}__gte': value}).filter(Q(**{f'{name}__gt': value}) | Q(pk__gt=pk))
+                queryset = queryset.reverse()
+        
+        rows = list(queryset[:self.list_per_page + 1])
+        has_more = len(rows) > self.list_per_page
+        rows = rows[:self.list_per_page]
+        if direction == 'previous':
+            rows.reverse()
+        
+        def page_url(direction, row):
+            values = [field.value_to_string(row), str(row.pk)]
+            return self.get_query_string({PAGE_VAR: encode_keyset_cursor(direction, values)})
+        
+        more_after = has_more if direction == 'next' else bool(cursor)
+        more_before = bool(cursor) if direction == 'next' else has_more
+        self.next_page_url = page_url('next', rows[-1]) if rows and more_after else None
+        self.previous_page_url = page_url('previous', rows[0]) if rows and more_before else None
+        
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = bool(self.next_page_url or self.previous_page_url)
+        self.paginator = paginator
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist options for tables too large for COUNT(*), OFFSET pages or sorting by any column"""
+    # Indexed together with the primary key; pages run newest first
+    keyset_field = None
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = ShowFacets.NEVER
+    sortable_by = ()
+    change_list_template = 'admin/philosophy_api/keyset_change_list.html'
+    
+    def get_ordering(self, request):
+        return (f'-{self.keyset_field}', '-pk')
+    
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+class PhilosopherFilter(admin.SimpleListFilter):
+    """Fixed choices, where the default filter would SELECT DISTINCT over the table"""
+    title = 'philosopher'
+    parameter_name = 'philosopher'
+    
+    def lookups(self, request, model_admin):
+        return [(key, philosopher['name']) for key, philosopher in PHILOSOPHERS.items()]
+    
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(philosopher=self.value())
+        return queryset
+
+class RoleFilter(admin.SimpleListFilter):
+    """Fixed choices, where the default filter would SELECT DISTINCT over the table"""
+    title = 'role'
+    parameter_name = 'role'
+    
+    def lookups(self, request, model_admin):
+        return [('user', 'User'), ('assistant', 'Assistant'), ('system', 'System')]
+    
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(role=self.value())
+        return queryset
 
 @admin.register(ChatSession)
-class ChatSessionAdmin(admin.ModelAdmin):
+class ChatSessionAdmin(LargeTableAdmin):
     list_display = ('session_id', 'philosopher', 'summary', 'created_at', 'updated_at')
-    search_fields = ('session_id', 'philosopher', 'summary')
-    list_filter = ('philosopher', 'created_at')
+    # session_id is unique, so an exact match is an index lookup
+    search_fields = ('=session_id', 'summary')
+    list_filter = (PhilosopherFilter, 'updated_at')
+    keyset_field = 'updated_at'
+    raw_id_fields = ('user',)
+    # Maintained by add_message; saving the form does not write them back
+    readonly_fields = ('context_summary', 'context_folded')
 
 @admin.register(ChatMessage)
-class ChatMessageAdmin(admin.ModelAdmin):
+class ChatMessageAdmin(LargeTableAdmin):
     list_display = ('session', 'role', 'content_preview', 'timestamp')
+    list_select_related = ('session',)
     search_fields = ('content',)
-    list_filter = ('role', 'timestamp')
+    list_filter = (RoleFilter, 'timestamp')
+    keyset_field = 'timestamp'
+    raw_id_fields = ('session',)
     
     def content_preview(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
-    content_preview.short_description = 'Content'
\ No newline at end of file
+    content_preview.short_description = 'Content'
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Search through the full-text index when there is one, instead of LIKE over every row"""
+        if fts_query(search_term) and search_index_exists():
+            return queryset.filter(pk__in=matching_message_ids(search_term)), False
+        return super().get_search_results(request, queryset, search_term)
@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 class PhilosophyApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'philosophy_api'
\ No newline at end of file
+    name = 'philosophy_api'
+    
+    def ready(self):
+        from .sqlite_profile import configure_sqlite
+        connection_created.connect(configure_sqlite, dispatch_uid='philosophy_api.configure_sqlite')
+        
+        from .metrics import instrument_connection, start_flusher
+        connection_created.connect(instrument_connection, dispatch_uid='philosophy_api.instrument_connection')
+        start_flusher()
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""Archival tier for the transcripts of idle chat sessions.
+
+manage.py archive_sessions moves the messages of sessions that have not been
+updated for a while out of the message store into append-only segment files
+in CHAT_ARCHIVE_DIR. Each session becomes one gzip member of a segment (so a
+segment is also a valid .gz file as a whole), located by the offset and
+length kept in its SessionArchive stub and in the segment's .idx file. The
+session row stays, flagged archived; the stub carries the message count and
+preview that session lists show.
+
+Opening an archived session through the API calls rehydrate(), which reads
+the member back and restores the messages with their original ids and seqs,
+so message cursors handed out before archival stay valid.
+"""
+import gzip
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .message_store import LAST_MESSAGE_PREVIEW_CHARS, get_message_store
+from .models import ChatMessage, ChatSession, SessionArchive
+
+class SegmentWriter:
+    """Appends gzip members to segment files, starting a new one past CHAT_ARCHIVE_SEGMENT_BYTES"""
+    
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = Path(directory or settings.CHAT_ARCHIVE_DIR)
+        self.max_bytes = max_bytes or settings.CHAT_ARCHIVE_SEGMENT_BYTES
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.file = None
+        self.name = None
+        self.index = {}
+        self.bytes_written = 0
+    
+    def _start_segment(self):
+        self.close()
+        self.name = f"segment-{timezone.now():%Y%m%dT%H%M%S%f}.gz"
+        self.file = open(self.directory / self.name, 'ab')
+        self.index = {}
+    
+    def write(self, key, payload):
+        """Append payload as one gzip member; returns (segment, offset, length)"""
+        if self.file is None or self.file.tell() >= self.max_bytes:
+            self._start_segment()
+        
+        member = gzip.compress(payload)
+        offset = self.file.tell()
+        self.file.write(member)
+        self.file.flush()
+        # The database will point at these bytes once the caller commits
+        os.fsync(self.file.fileno())
+        
+        self.index[key] = [offset, len(member)]
+        self.bytes_written += len(member)
+        return self.name, offset, len(member)
+    
+    def close(self):
+        """Finish the current segment and write its offset index next to it"""
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        with open(self.directory / f"{self.name}.idx", 'w') as f:
+            json.dump(self.index, f)
+
+def encode_transcript(messages):
+    """JSON lines for a transcript, oldest message first"""
+    return ''.join(json.dumps({
+        'id': str(message.pk),
+        'seq': message.seq,
+        'role': message.role,
+        'content': message.content,
+        'timestamp': message.timestamp.isoformat(),
+    }) + '\n' for message in messages).encode()
+
+def read_transcript(archive, session):
+    """The archived messages of session as unsaved ChatMessage instances"""
+    with open(Path(settings.CHAT_ARCHIVE_DIR) / archive.segment, 'rb') as f:
+        f.seek(archive.offset)
+        member = f.read(archive.length)
+    
+    messages = []
+    for line in gzip.decompress(member).decode().splitlines():
+        row = json.loads(line)
+        messages.append(ChatMessage(
+            id=row['id'],
+            session=session,
+            seq=row['seq'],
+            role=row['role'],
+            content=row['content'],
+            timestamp=parse_datetime(row['timestamp']),
+        ))
+    return messages
+
+def archive_session(session, writer, idle_before):
+    """Move the messages of session to a segment; returns False if it was written to meanwhile"""
+    store = get_message_store()
+    messages = store.transcript(session)
+    conversation = [message for message in messages if message.role != 'system']
+    segment, offset, length = writer.write(str(session.pk), encode_transcript(messages))
+    
+    with transaction.atomic():
+        # A message added since the transcript was read bumps last_seq
+        claimed = ChatSession.objects.filter(
+            pk=session.pk, archived=False, last_seq=session.last_seq, updated_at__lt=idle_before
+        ).update(archived=True)
+        if not claimed:
+            return False
+        
+        SessionArchive.objects.create(
+            session=session,
+            segment=segment,
+            offset=offset,
+            length=length,
+            message_count=len(conversation),
+            last_message=conversation[-1].content[:LAST_MESSAGE_PREVIEW_CHARS] if conversation else None
+        )
+        store.remove_transcript(session)
+    
+    session.archived = True
+    return True
+
+def rehydrate(session):
+    """Bring the messages of an archived session back into the message store; no-op otherwise"""
+    if not session.archived:
+        return
+    
+    with transaction.atomic():
+        # Only one request restores the transcript; the others wait here, then find it done
+        if ChatSession.objects.filter(pk=session.pk, archived=True).update(archived=False):
+            archive = SessionArchive.objects.get(session_id=session.pk)
+            get_message_store().restore(session, read_transcript(archive, session))
+            archive.delete()
+    
+    session.archived = False
+    # A transcript prefetched while the session was archived is empty
+    getattr(session, '_prefetched_objects_cache', {}).pop('messages', None)
@@ -0,0 +1,266 @@
+"""Async versions of the chat session endpoints for ASGI deployments.
+
+Served under /api/async/ with the same request and response shapes as
+ChatSessionViewSet. Under uvicorn, a request that waits on the LLM only
+suspends a coroutine, so a single worker can hold many conversations open.
+"""
+import functools
+import json
+import logging
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import ChatSession
+from .serializers import ChatSessionSerializer, ChatSessionListSerializer
+from .groq_client_django import AsyncGroqClient
+from .archive import rehydrate
+from .timing import span
+from .conditional import add_validators, session_etag, not_modified, session_list_etag
+from .message_store import get_message_store
+from .pagination import MAX_SEARCH_PAGE_SIZE, SEARCH_PAGE_SIZE, SessionCursorPagination, message_page_size
+from .views import (
+    build_prompt, cached_history, message_page, message_page_data, prompt_style_error, remember_history, save_reply,
+    search_results, session_summaries, summarize_page
+)
+
+# Import the philosophers module
+from philosophers import PHILOSOPHERS
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+async def authenticate(request):
+    """Return the user for the request's JWT, or None if it is missing or invalid"""
+    jwt_auth = JWTAuthentication()
+    header = jwt_auth.get_header(request)
+    if header is None:
+        return None
+    
+    raw_token = jwt_auth.get_raw_token(header)
+    if raw_token is None:
+        return None
+    
+    try:
+        token = jwt_auth.get_validated_token(raw_token)
+        user_id = token[api_settings.USER_ID_CLAIM]
+    except (InvalidToken, AuthenticationFailed, KeyError):
+        return None
+    
+    try:
+        user = await User.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+    except User.DoesNotExist:
+        return None
+    
+    return user if user.is_active else None
+
+def jwt_required(view):
+    """Authenticate the request with a JWT and set request.user, like IsAuthenticated"""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        with span('auth'):
+            user = await authenticate(request)
+        if user is None:
+            return JsonResponse(
+                {'detail': 'Authentication credentials were not provided or are invalid.'},
+                status=401
+            )
+        request.user = user
+        return await view(request, *args, **kwargs)
+    return csrf_exempt(wrapper)
+
+def parse_body(request):
+    """Parse a JSON request body; raises ValueError if it is malformed"""
+    if not request.body:
+        return {}
+    data = json.loads(request.body)
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+    return data
+
+def bad_request(error):
+    return JsonResponse({'detail': f'JSON parse error - {error}'}, status=400)
+
+async def open_session(session):
+    """Bring the messages of an archived session back before using them"""
+    if session.archived:
+        await sync_to_async(rehydrate)(session)
+    return session
+
+def paginated_session_list(request):
+    """One cursor page of the user's sessions in the same shape as ChatSessionViewSet.list"""
+    paginator = SessionCursorPagination()
+    page = paginator.paginate_queryset(session_summaries(request.user), Request(request))
+    with span('serialize'):
+        data = ChatSessionListSerializer(summarize_page(page), many=True).data
+    return paginator.get_paginated_response(data).data
+
+@require_GET
+@jwt_required
+async def session_list(request):
+    """List the user's chat sessions"""
+    etag = await sync_to_async(session_list_etag)(request, request.user)
+    response = not_modified(request, etag)
+    if response is not None:
+        return add_validators(response, etag)
+    
+    # CursorPagination evaluates the queryset synchronously
+    try:
+        data = await sync_to_async(paginated_session_list)(request)
+    except NotFound as e:
+        return JsonResponse({'detail': str(e.detail)}, status=404)
+    return add_validators(JsonResponse(data), etag)
+
+@require_GET
+@jwt_required
+async def session_search(request):
+    """Full-text search of the user's messages: ?q=<words>, best of the newest matches first"""
+    text = request.GET.get('q', '').strip()
+    if not text:
+        return JsonResponse({'error': 'No query provided'}, status=400)
+    
+    try:
+        limit = message_page_size(request.GET.get('limit'), SEARCH_PAGE_SIZE, MAX_SEARCH_PAGE_SIZE)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse(await sync_to_async(search_results)(request.user, text, limit))
+
+@require_GET
+@jwt_required
+async def session_detail(request, pk):
+    """Retrieve a single chat session with its messages"""
+    try:
+        session = await ChatSession.objects.aget(pk=pk, user=request.user)
+    except ChatSession.DoesNotExist:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    etag = session_etag(request, session, pk)
+    response = not_modified(request, etag)
+    if response is not None:
+        return add_validators(response, etag)
+    
+    session = await open_session(session)
+    with span('serialize'):
+        data = await sync_to_async(lambda: ChatSessionSerializer(session).data)()
+    return add_validators(JsonResponse(data), etag)
+
+@require_GET
+@jwt_required
+async def session_messages(request, pk):
+    """Page through a session's messages: ?after=<cursor> for newer, ?before=<cursor> for older"""
+    try:
+        session = await ChatSession.objects.aget(pk=pk, user=request.user)
+    except ChatSession.DoesNotExist:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    etag = session_etag(request, session, pk)
+    response = not_modified(request, etag)
+    if response is not None:
+        return add_validators(response, etag)
+    
+    session = await open_session(session)
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    try:
+        limit = message_page_size(request.GET.get('limit'))
+        rows = await sync_to_async(message_page)(session, after=after, before=before, limit=limit)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return add_validators(JsonResponse(message_page_data(rows, limit, after=after, before=before)), etag)
+
+@require_POST
+@jwt_required
+async def create_session(request):
+    """Create a new chat session"""
+    try:
+        body = parse_body(request)
+    except ValueError as e:
+        return bad_request(e)
+    
+    try:
+        philosopher_id = body.get('philosopher', 'marcus_aurelius')
+        
+        # Check if philosopher exists
+        if philosopher_id not in PHILOSOPHERS:
+            return JsonResponse({'error': f'Philosopher {philosopher_id} not found'}, status=400)
+        
+        session = await ChatSession.objects.acreate(
+            session_id=str(uuid.uuid4()),
+            philosopher=philosopher_id,
+            user=request.user
+        )
+        
+        # Serialize the (empty) transcript off the event loop
+        response_data = await sync_to_async(lambda: ChatSessionSerializer(session).data)()
+        response_data['id'] = str(session.id)
+        return JsonResponse(response_data)
+    except Exception as e:
+        logger.error(f"Error creating session: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=500)
+
+@require_POST
+@jwt_required
+async def add_message(request, pk):
+    """Add a message to a chat session and get AI response"""
+    try:
+        try:
+            session = await open_session(await ChatSession.objects.aget(pk=pk, user=request.user))
+        except ChatSession.DoesNotExist:
+            return JsonResponse({'detail': 'Not found.'}, status=404)
+        
+        try:
+            data = parse_body(request)
+        except ValueError as e:
+            return bad_request(e)
+        user_message = data.get('message', '')
+        prompt_style = data.get('prompt_style')
+        if not user_message:
+            return JsonResponse({'error': 'No message provided'}, status=400)
+        error = prompt_style_error(prompt_style)
+        if error:
+            return JsonResponse({'error': error}, status=400)
+        
+        # Save user message to database
+        store = get_message_store()
+        message = await sync_to_async(store.append)(session, 'user', user_message)
+        
+        # Get the recent messages that fit in the context window
+        with span('history'):
+            history = cached_history(session, message)
+            if history is None:
+                history = remember_history(session, await sync_to_async(store.history)(session))
+        messages = build_prompt(session, history, prompt_style)
+        
+        # Get AI response without blocking the worker
+        try:
+            response = await AsyncGroqClient().generate_response(messages, philosopher=session.philosopher)
+        except Exception as e:
+            logger.error(f"Error generating response: {str(e)}")
+            return JsonResponse({
+                'error': f"Error generating response: {str(e)}",
+                'details': str(e)
+            }, status=500)
+        
+        # Save AI response and session in one transaction
+        await sync_to_async(save_reply)(session, response)
+        
+        return JsonResponse({
+            'response': response,
+            'session_id': session.session_id
+        })
+    except Exception as e:
+        logger.error(f"Unexpected error in add_message: {str(e)}")
+        return JsonResponse({
+            'error': 'An unexpected error occurred',
+            'details': str(e)
+        }, status=500)
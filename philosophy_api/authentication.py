@@ -0,0 +1,10 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .timing import span
+
+class TimedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that reports its time as the auth phase of Server-Timing"""
+    
+    def authenticate(self, request):
+        with span('auth'):
+            return super().authenticate(request)
@@ -0,0 +1,60 @@
+"""ETags and conditional GETs for the endpoints clients poll.
+
+A validator is worked out from a few columns instead of the response body:
+the philosopher registry is hashed once per process, and a session changes
+exactly when its updated_at or last_seq does (every message bumps last_seq,
+every other edit saves updated_at). A request whose If-None-Match still
+matches is answered 304 before anything is serialized.
+
+Each ETag also covers the request path with its query string and the
+response format, so different pages and renderers never share one.
+"""
+import hashlib
+import json
+
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+from .models import ChatSession
+
+# Seconds clients and shared caches may reuse the philosopher registry without asking
+PHILOSOPHERS_MAX_AGE = 300
+
+def strong_etag(*parts):
+    """A strong ETag for JSON-serializable parts"""
+    digest = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+def representation(request, response_format='json'):
+    """What, besides the data, decides the bytes of a response"""
+    return [request.get_full_path(), response_format]
+
+def session_etag(request, session, pk, response_format='json'):
+    """ETag of a session's detail or messages page, from the session row the view loaded"""
+    return strong_etag('session', str(pk), session.last_seq, session.updated_at,
+                       *representation(request, response_format))
+
+def session_list_etag(request, user, response_format='json'):
+    """ETag of a page of the user's session list: any new message, edit or deletion changes it"""
+    state = ChatSession.objects.filter(user=user).aggregate(
+        count=Count('pk'), updated_at=Max('updated_at'), last_seq=Sum('last_seq')
+    )
+    return strong_etag('sessions', user.pk, state, *representation(request, response_format))
+
+def not_modified(request, etag):
+    """A 304 response if the request's If-None-Match matches etag, else None"""
+    if etag is None:
+        return None
+    return get_conditional_response(request, etag=etag)
+
+def add_validators(response, etag, private=True):
+    """Set the ETag and caching headers of a response (or a 304 from not_modified)"""
+    if etag is not None and response.status_code in (200, 304):
+        response['ETag'] = etag
+    if private:
+        # Per-user data: a browser may keep it but must revalidate every time
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+    else:
+        patch_cache_control(response, public=True, max_age=PHILOSOPHERS_MAX_AGE)
+    return response
@@ -2,7 +2,19 @@ import os
 import requests
 import json
 import logging
+import threading
+import asyncio
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from asgiref.sync import sync_to_async
+from http.cookiejar import DefaultCookiePolicy
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+from llm_cache import cache_key, get_response_cache
+from question_cache import get_question_cache, opening_question
+from .metrics import LLMCall
+from .singleflight import get_coalescer
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -10,40 +22,183 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+DEFAULT_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+
+# Marks the end of a streamed completion
+STREAM_DONE = object()
+
+# Process-wide HTTP transport shared by every GroqClient instance
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    """Return the process-wide requests.Session, creating it on first use.
+    
+    The session keeps a pool of keep-alive connections (GROQ_POOL_MAXSIZE,
+    sized to the number of worker threads) so each turn reuses an open
+    TCP+TLS connection. It is never mutated after creation and refuses
+    cookies, so it is safe to share between the threads of a gthread worker.
+    """
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                pool_maxsize = int(os.getenv("GROQ_POOL_MAXSIZE", "16"))
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+                
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                # Keep the shared session stateless between users
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                _http_session = session
+    return _http_session
+
+def get_timeout():
+    """Return the (connect, read) timeout for upstream requests"""
+    return (
+        float(os.getenv("GROQ_CONNECT_TIMEOUT", "5")),
+        float(os.getenv("GROQ_READ_TIMEOUT", "60"))
+    )
+
+# One pooled httpx.AsyncClient per event loop (uvicorn runs one loop per worker)
+_async_http_clients = weakref.WeakKeyDictionary()
+
+def get_async_http_client():
+    """Return the pooled httpx.AsyncClient for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_http_clients.get(loop)
+    if client is None:
+        connect_timeout, read_timeout = get_timeout()
+        pool_maxsize = int(os.getenv("GROQ_ASYNC_POOL_MAXSIZE", "200"))
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize)
+        )
+        _async_http_clients[loop] = client
+    return client
+
+def warm_connections(count=None):
+    """Open pooled connections to the API before the first request needs them.
+    
+    Meant to be called once per worker process at boot (see gunicorn.conf.py).
+    """
+    api_url = os.getenv("GROQ_API_URL", DEFAULT_API_URL)
+    count = count or int(os.getenv("GROQ_WARM_CONNECTIONS", "2"))
+    session = get_http_session()
+    
+    def open_connection(_):
+        try:
+            # Any response will do - we only want the connection in the pool
+            session.head(api_url, timeout=get_timeout()).close()
+            return True
+        except requests.RequestException as e:
+            logger.warning(f"Could not warm connection to {api_url}: {str(e)}")
+            return False
+    
+    # Open the connections concurrently so they do not all reuse the first one
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        warmed = sum(executor.map(open_connection, range(count)))
+    
+    logger.info(f"Warmed {warmed}/{count} connections to {api_url}")
+    return warmed
+
 class GroqClient:
     """Client for interacting with Groq API"""
     
     def __init__(self):
         """Initialize the Groq client"""
         self.api_key = os.getenv("GROQ_API_KEY")
-        self.api_url = "https://api.groq.com/openai/v1/chat/completions"
+        # Allow pointing the client at any OpenAI-compatible endpoint (e.g. a local stub)
+        self.api_url = os.getenv("GROQ_API_URL", DEFAULT_API_URL)
         self.model = os.getenv("GROQ_MODEL", "llama3-70b-8192")
+        self.temperature = 0.7
+        self.max_tokens = 1024
+        self.timeout = get_timeout()
+        self.http = get_http_session()
+        self.cache = get_response_cache()
+        # Optional near-duplicate cache for opening questions
+        self.question_cache = get_question_cache()
+        # Shares one upstream call between identical concurrent requests
+        self.coalescer = get_coalescer()
         
         if not self.api_key:
             logger.error("GROQ_API_KEY not found in environment variables.")
             raise ValueError("GROQ_API_KEY is required. Please set it in your environment variables.")
     
-    def generate_response(self, messages):
-        """Generate a response from the Groq API"""
-        try:
-            # Prepare the request
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            data = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": 0.7,
-                "max_tokens": 1024
-            }
-            
+    def _build_request(self, messages, stream=False):
+        """Build the headers and payload for a chat completion request"""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        data = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens
+        }
+        if stream:
+            data["stream"] = True
+        
+        return headers, data
+    
+    def _cached(self, messages, philosopher):
+        """Return (cache key, cached response); the key is None when exact caching is off"""
+        key = cached = None
+        if self.cache.enabled_for(philosopher):
+            key = cache_key(self.model, self.temperature, self.max_tokens, messages)
+            cached = self.cache.get(key)
+        
+        # Fall back to a paraphrase of an earlier opening question to the same philosopher
+        if cached is None and self.question_cache is not None and philosopher:
+            question = opening_question(messages)
+            if question:
+                cached, _ = self.question_cache.lookup(philosopher, question)
+        
+        return key, cached
+    
+    def _store(self, key, messages, philosopher, content):
+        """Remember a complete response in the caches"""
+        if key:
+            self.cache.set(key, content)
+        
+        if self.question_cache is not None and philosopher:
+            question = opening_question(messages)
+            if question:
+                self.question_cache.add(philosopher, question, content)
+    
+    @staticmethod
+    def _parse_stream_line(line):
+        """Return the token carried by one SSE line, None, or STREAM_DONE.
+        
+        The endpoint sends "data: {...}" lines and ends with "data: [DONE]".
+        """
+        if not line or not line.startswith("data:"):
+            return None
+        
+        payload = line[len("data:"):].strip()
+        if payload == "[DONE]":
+            return STREAM_DONE
+        
+        choices = json.loads(payload).get("choices") or []
+        if not choices:
+            return None
+        return (choices[0].get("delta") or {}).get("content")
+    
+    def _request_completion(self, messages, philosopher=None):
+        """Call the Groq API and return the completion text"""
+        # Prepare the request
+        headers, data = self._build_request(messages)
+        
+        with LLMCall(philosopher, self.model) as call:
             # Make the request
-            response = requests.post(
+            response = self.http.post(
                 self.api_url,
                 headers=headers,
-                json=data
+                json=data,
+                timeout=self.timeout
             )
             
             # Check for errors
@@ -54,9 +209,165 @@ class GroqClient:
             
             # Extract the content
             content = result["choices"][0]["message"]["content"]
+            call.record_tokens(messages, content, result.get("usage"))
+        return content
+    
+    def generate_response(self, messages, philosopher=None):
+        """Generate a response from the Groq API (or the response cache)"""
+        try:
+            # Identical requests are answered from the cache
+            key, cached = self._cached(messages, philosopher)
+            if cached is not None:
+                return cached
+            
+            def fetch():
+                content = self._request_completion(messages, philosopher)
+                self._store(key, messages, philosopher, content)
+                return content
+            
+            if self.coalescer is None:
+                return fetch()
+            
+            # Concurrent identical requests wait for the first one's answer
+            flight_key = key or cache_key(self.model, self.temperature, self.max_tokens, messages)
+            return self.coalescer.do(flight_key, fetch)
+        
+        except Exception as e:
+            logger.error(f"Error generating response from Groq API: {str(e)}")
+            raise
+    
+    def stream_response(self, messages, philosopher=None):
+        """Yield response tokens from the Groq API as they are generated.
+        
+        Closing the generator (e.g. when the HTTP client disconnects) closes
+        the upstream connection, so the provider stops generating tokens.
+        A cached response is yielded as a single chunk.
+        """
+        key, cached = self._cached(messages, philosopher)
+        if cached is not None:
+            yield cached
+            return
+        
+        headers, data = self._build_request(messages, stream=True)
+        with LLMCall(philosopher, self.model) as call:
+            response = self.http.post(
+                self.api_url,
+                headers=headers,
+                json=data,
+                stream=True,
+                timeout=self.timeout
+            )
+            
+            try:
+                response.raise_for_status()
+                
+                tokens = []
+                for line in response.iter_lines(decode_unicode=True):
+                    token = self._parse_stream_line(line)
+                    if token is STREAM_DONE:
+                        break
+                    if token:
+                        tokens.append(token)
+                        yield token
+                
+                content = ''.join(tokens)
+                call.record_tokens(messages, content)
+                # Only complete responses are cached
+                self._store(key, messages, philosopher, content)
+            
+            except GeneratorExit:
+                logger.info("Response stream closed by consumer, aborting upstream request")
+                raise
+            except Exception as e:
+                logger.error(f"Error streaming response from Groq API: {str(e)}")
+                raise
+            finally:
+                response.close()
+
+class AsyncGroqClient(GroqClient):
+    """Asyncio variant of GroqClient for the ASGI views.
+    
+    Waiting on the upstream API only suspends a coroutine, so one worker can
+    keep many conversations in flight.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.http = get_async_http_client()
+    
+    def _uses_caches(self, philosopher):
+        return self.cache.enabled_for(philosopher) or (self.question_cache is not None and bool(philosopher))
+    
+    async def _acached(self, messages, philosopher):
+        """_cached() off the event loop: the sqlite backend and question embeddings block"""
+        if not self._uses_caches(philosopher):
+            return None, None
+        return await sync_to_async(self._cached, thread_sensitive=False)(messages, philosopher)
+    
+    async def _astore(self, key, messages, philosopher, content):
+        if self._uses_caches(philosopher):
+            await sync_to_async(self._store, thread_sensitive=False)(key, messages, philosopher, content)
+    
+    async def generate_response(self, messages, philosopher=None):
+        """Generate a response from the Groq API (or the response cache)"""
+        try:
+            key, cached = await self._acached(messages, philosopher)
+            if cached is not None:
+                return cached
+            
+            async def fetch():
+                headers, data = self._build_request(messages)
+                
+                with LLMCall(philosopher, self.model) as call:
+                    response = await self.http.post(
+                        self.api_url,
+                        headers=headers,
+                        json=data
+                    )
+                    response.raise_for_status()
+                    
+                    result = response.json()
+                    content = result["choices"][0]["message"]["content"]
+                    call.record_tokens(messages, content, result.get("usage"))
+                
+                await self._astore(key, messages, philosopher, content)
+                return content
             
-            return content
+            if self.coalescer is None:
+                return await fetch()
+            
+            # Concurrent identical requests wait for the first one's answer
+            flight_key = key or cache_key(self.model, self.temperature, self.max_tokens, messages)
+            return await self.coalescer.ado(flight_key, fetch)
         
         except Exception as e:
             logger.error(f"Error generating response from Groq API: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+    
+    async def stream_response(self, messages, philosopher=None):
+        """Yield response tokens from the Groq API as they are generated"""
+        key, cached = await self._acached(messages, philosopher)
+        if cached is not None:
+            yield cached
+            return
+        
+        headers, data = self._build_request(messages, stream=True)
+        try:
+            with LLMCall(philosopher, self.model) as call:
+                async with self.http.stream("POST", self.api_url, headers=headers, json=data) as response:
+                    response.raise_for_status()
+                    tokens = []
+                    async for line in response.aiter_lines():
+                        token = self._parse_stream_line(line)
+                        if token is STREAM_DONE:
+                            break
+                        if token:
+                            tokens.append(token)
+                            yield token
+                    
+                    content = ''.join(tokens)
+                    call.record_tokens(messages, content)
+                    await self._astore(key, messages, philosopher, content)
+        except Exception as e:
+            logger.error(f"Error streaming response from Groq API: {str(e)}")
+            raise
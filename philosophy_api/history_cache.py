@@ -0,0 +1,144 @@
+"""Per-worker cache of the unfolded conversation history of chat sessions.
+
+add_message needs the messages of a session that are not yet folded into its
+rolling summary. Instead of reading them back on every turn, each worker
+keeps them as compact records and appends the messages it writes. An entry
+is only used while it matches the session row: every insert advances
+ChatSession.last_seq, so a message written by another worker (or a change
+of philosopher) makes the entry stale and the history is read again.
+
+Entries are evicted least recently used first once the cache holds more than
+CHAT_HISTORY_CACHE_MAX_BYTES of message text (0 disables the cache).
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+# Rough per-record cost of the record object and list slot, in bytes
+RECORD_OVERHEAD_BYTES = 64
+
+class HistoryRecord:
+    """One cached message; supports message['role'] like the dicts build_context expects"""
+    __slots__ = ('seq', 'role', 'content')
+    
+    def __init__(self, seq, role, content):
+        self.seq = seq
+        self.role = role
+        self.content = content
+    
+    def __getitem__(self, key):
+        return getattr(self, key)
+    
+    @property
+    def size(self):
+        return len(self.content) + RECORD_OVERHEAD_BYTES
+
+class _Entry:
+    __slots__ = ('last_seq', 'folded', 'records', 'size')
+    
+    def __init__(self, last_seq, folded, records):
+        self.last_seq = last_seq
+        self.folded = folded
+        self.records = records
+        self.size = sum(record.size for record in records)
+
+class HistoryCache:
+    """LRU-by-bytes map of session id to its unfolded history"""
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def _drop(self, session_pk):
+        entry = self._entries.pop(session_pk, None)
+        if entry is not None:
+            self.size -= entry.size
+    
+    def _evict(self):
+        while self.size > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self.size -= entry.size
+    
+    def put(self, session, records):
+        """Store the history read from the database for session as currently saved"""
+        entry = _Entry(session.last_seq, session.context_folded, list(records))
+        with self._lock:
+            self._drop(session.pk)
+            if entry.size <= self.max_bytes:
+                self._entries[session.pk] = entry
+                self.size += entry.size
+                self._evict()
+    
+    def append(self, session, message):
+        """Add a message just saved to session; returns the history, or None if it must be reloaded.
+        
+        The entry is only extended if it was current right before the insert,
+        i.e. nobody else wrote to the session since this worker last did.
+        """
+        with self._lock:
+            entry = self._entries.get(session.pk)
+            if entry is None or entry.last_seq != message.seq - 1 or entry.folded != session.context_folded:
+                self.misses += 1
+                self._drop(session.pk)
+                return None
+            
+            self.hits += 1
+            entry.last_seq = message.seq
+            if message.role != 'system':
+                record = HistoryRecord(message.seq, message.role, message.content)
+                entry.records.append(record)
+                entry.size += record.size
+                self.size += record.size
+            self._entries.move_to_end(session.pk)
+            self._evict()
+            return list(entry.records)
+    
+    def fold(self, session, folded):
+        """Forget the leading records that build_prompt folded into the summary"""
+        with self._lock:
+            entry = self._entries.get(session.pk)
+            if entry is None or folded <= entry.folded:
+                return
+            
+            dropped, entry.records = entry.records[:folded - entry.folded], entry.records[folded - entry.folded:]
+            removed = sum(record.size for record in dropped)
+            entry.folded = folded
+            entry.size -= removed
+            self.size -= removed
+    
+    def invalidate(self, session_pk):
+        with self._lock:
+            self._drop(session_pk)
+    
+    def stats(self):
+        """Hit/miss counters and memory use for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'sessions': len(self._entries),
+                'bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+# Process-wide cache shared by every request handled by this worker
+_history_cache = None
+_history_cache_lock = threading.Lock()
+
+def get_history_cache():
+    """Return the worker's HistoryCache, or None if CHAT_HISTORY_CACHE_MAX_BYTES is 0"""
+    global _history_cache
+    max_bytes = getattr(settings, 'CHAT_HISTORY_CACHE_MAX_BYTES', 0)
+    if not max_bytes:
+        return None
+    if _history_cache is None:
+        with _history_cache_lock:
+            if _history_cache is None:
+                _history_cache = HistoryCache(max_bytes)
+    return _history_cache
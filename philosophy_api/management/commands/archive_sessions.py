@@ -0,0 +1,102 @@
+import gzip
+import os
+import shutil
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from philosophy_api.archive import SegmentWriter, archive_session
+from philosophy_api.models import ChatSession
+from session_log import archive_idle_logs
+
+class Command(BaseCommand):
+    help = ("Move the messages of chat sessions idle for --days into compressed archive segments, "
+            "compress idle saved session files, then give the freed database pages back to the filesystem.")
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='archive sessions not updated for this many days')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='only report what would be archived')
+        parser.add_argument('--skip-vacuum', action='store_true')
+        parser.add_argument('--files-dir', action='append',
+                            help='directory of saved Streamlit sessions (default: sessions/ and anonymous_sessions/)')
+    
+    def handle(self, *args, **options):
+        idle_before = timezone.now() - timedelta(days=options['days'])
+        sessions = ChatSession.objects.filter(archived=False, updated_at__lt=idle_before, last_seq__gt=0)
+        
+        if options['dry_run']:
+            self.stdout.write(f"{sessions.count()} sessions idle since {idle_before:%Y-%m-%d} would be archived")
+            return
+        
+        # Database sessions
+        writer = SegmentWriter()
+        archived, skipped = 0, 0
+        try:
+            for session in sessions.order_by('updated_at').iterator(chunk_size=options['batch_size']):
+                if archive_session(session, writer, idle_before):
+                    archived += 1
+                else:
+                    skipped += 1
+        finally:
+            writer.close()
+        self.stdout.write(f"Archived {archived} sessions ({writer.bytes_written / 1024:.1f} KiB compressed), "
+                          f"skipped {skipped} written to meanwhile")
+        
+        # Saved Streamlit sessions, which keep naive local timestamps
+        files_before = datetime.now() - timedelta(days=options['days'])
+        files_dirs = options['files_dir'] or [settings.CHAT_SESSIONS_DIR, os.path.join(settings.BASE_DIR, 'anonymous_sessions')]
+        for files_dir in map(Path, files_dirs):
+            if files_dir.is_dir():
+                self.archive_files(files_dir, files_before)
+        
+        if not options['skip_vacuum']:
+            self.vacuum()
+    
+    def archive_files(self, files_dir, idle_before):
+        """Compress idle session logs in each user directory and idle flat dumps in files_dir"""
+        archived, saved = 0, 0
+        for path in files_dir.iterdir():
+            if path.is_dir():
+                count, size = archive_idle_logs(path, idle_before)
+                archived += count
+                saved += size
+            elif path.suffix == '.json' and datetime.fromtimestamp(path.stat().st_mtime) < idle_before:
+                # Anonymous sessions are written once and never read back by the app
+                size = path.stat().st_size
+                with open(path, 'rb') as src, gzip.open(f"{path}.gz", 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                saved += size - os.path.getsize(f"{path}.gz")
+                os.remove(path)
+                archived += 1
+        self.stdout.write(f"Compressed {archived} session files in {files_dir}, saving {saved / 1024:.1f} KiB")
+    
+    def vacuum(self):
+        """Return free pages to the filesystem (SQLite only)"""
+        if connection.vendor != 'sqlite':
+            return
+        
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA page_size")
+            page_size = cursor.fetchone()[0]
+            cursor.execute("PRAGMA freelist_count")
+            free_pages = cursor.fetchone()[0]
+            cursor.execute("PRAGMA auto_vacuum")
+            if cursor.fetchone()[0] != 2:
+                # Switching to incremental mode takes effect only through a full VACUUM, once
+                self.stdout.write("Enabling incremental auto_vacuum (one-time full VACUUM)")
+                cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                cursor.execute("VACUUM")
+            else:
+                cursor.execute("PRAGMA incremental_vacuum")
+            cursor.execute("PRAGMA page_count")
+            page_count = cursor.fetchone()[0]
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Released {free_pages} free pages ({free_pages * page_size / 1024:.1f} KiB); "
+            f"database is now {page_count * page_size / 1024:.1f} KiB"
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from philosophy_api.message_store import MongoMessageStore
+from philosophy_api.models import ChatMessage
+
+class Command(BaseCommand):
+    help = ("Copy ChatMessage rows into the MongoDB chat_messages collection, keeping ids and seqs, "
+            "before switching CHAT_MESSAGE_STORE to mongodb. Safe to rerun.")
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+    
+    def handle(self, *args, **options):
+        store = MongoMessageStore.from_settings()
+        store.ensure_indexes()
+        
+        messages = ChatMessage.objects.select_related('session').order_by('session', 'seq')
+        batch, copied, seen = [], 0, 0
+        for message in messages.iterator(chunk_size=options['batch_size']):
+            batch.append(message)
+            if len(batch) == options['batch_size']:
+                copied += store.copy(batch)
+                seen += len(batch)
+                batch = []
+        copied += store.copy(batch)
+        seen += len(batch)
+        
+        self.stdout.write(self.style.SUCCESS(f"Copied {copied} of {seen} messages ({seen - copied} already present)"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from philosophy_api.search import rebuild_search_index, search_index_exists
+
+class Command(BaseCommand):
+    help = ("Index every chat message for full-text search, e.g. the messages written before the search "
+            "index existed. New messages are indexed as they are saved. Safe to rerun.")
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+    
+    def handle(self, *args, **options):
+        if not search_index_exists():
+            raise CommandError("No search index: it needs SQLite with FTS5 and migration 0007_message_search")
+        
+        indexed = rebuild_search_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} messages"))
@@ -0,0 +1,375 @@
+"""Pluggable storage for the messages of chat sessions.
+
+Sessions, and the per-session sequence counter (ChatSession.last_seq), always
+live in the Django database. The messages themselves go to the store chosen
+by settings.CHAT_MESSAGE_STORE:
+
+    orm       ChatMessage rows in the Django database (default)
+    mongodb   the chat_messages collection of MONGODB_DATABASES['default'],
+              provisioned by setup_mongodb.py
+
+Both stores hand out ChatMessage instances (unsaved ones for MongoDB), so the
+views and serializers do not care where a message is kept.
+"""
+import functools
+import threading
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, TextField
+from django.db.models.functions import Coalesce, Substr
+from django.utils import timezone
+
+from .models import ChatMessage
+from .search import make_snippet, query_words, search_index_exists, search_messages
+
+# Characters of the latest message shown in session lists
+LAST_MESSAGE_PREVIEW_CHARS = 120
+
+class MessageStore:
+    """Interface of a message store"""
+    
+    def append(self, session, role, content):
+        """Save a message at the end of session and return it"""
+        raise NotImplementedError
+    
+    def append_many(self, session, messages):
+        """Save (role, content) pairs at the end of session in one batch; returns the messages"""
+        raise NotImplementedError
+    
+    def history(self, session):
+        """Messages not yet folded into the session's rolling summary, as dicts with seq, role and content.
+        
+        System rows only ever repeat a persona prompt (see change_philosopher), so
+        they are left out; the current persona is always sent as the system prompt.
+        """
+        raise NotImplementedError
+    
+    def page(self, session, after=None, before=None, limit=100):
+        """Up to limit + 1 messages with seq > after (oldest first) or seq < before (newest first)"""
+        raise NotImplementedError
+    
+    def transcript(self, session):
+        """All messages of session in order"""
+        raise NotImplementedError
+    
+    def delete_system(self, session):
+        """Remove the session's system messages"""
+        raise NotImplementedError
+    
+    def remove_transcript(self, session):
+        """Remove every message of session (after archiving it)"""
+        raise NotImplementedError
+    
+    def restore(self, session, messages):
+        """Put back ChatMessage instances of session with their original ids and seqs"""
+        raise NotImplementedError
+    
+    def search(self, user, text, limit=20):
+        """The user's messages best matching text, as ChatMessage instances with snippet and
+        rank (lower is better) set; messages of archived sessions are not searched"""
+        raise NotImplementedError
+    
+    def search_window(self, limit=20):
+        """How many of the user's newest matches search() picks its results from, or None for all of them"""
+        return None
+    
+    def annotate_summaries(self, sessions):
+        """Add message_count and last_message to a ChatSession queryset if the store can do it in SQL"""
+        return sessions
+    
+    def summarize(self, sessions):
+        """Set message_count and last_message on a page of sessions that annotate_summaries left out"""
+
+class ORMMessageStore(MessageStore):
+    """Messages as ChatMessage rows, read through the (session, seq) index"""
+    
+    def append(self, session, role, content):
+        return ChatMessage.objects.create(session=session, role=role, content=content)
+    
+    def append_many(self, session, messages):
+        with transaction.atomic(savepoint=False):
+            last_seq = session.allocate_seq(len(messages))
+            rows = [
+                ChatMessage(session=session, seq=seq, role=role, content=content)
+                for seq, (role, content) in enumerate(messages, start=last_seq - len(messages) + 1)
+            ]
+            return ChatMessage.objects.bulk_create(rows)
+    
+    def history_queryset(self, session):
+        return (ChatMessage.objects.filter(session=session).exclude(role='system')
+                .order_by('seq')[session.context_folded:].values('seq', 'role', 'content'))
+    
+    def history(self, session):
+        return list(self.history_queryset(session))
+    
+    def page_queryset(self, session, after=None, before=None, limit=100):
+        """Keyset query behind page(): a range scan of the (session, seq) index"""
+        messages = ChatMessage.objects.filter(session=session)
+        if before is not None:
+            messages = messages.filter(seq__lt=before).order_by('-seq')
+        else:
+            if after is not None:
+                messages = messages.filter(seq__gt=after)
+            messages = messages.order_by('seq')
+        return messages[:limit + 1]
+    
+    def page(self, session, after=None, before=None, limit=100):
+        return list(self.page_queryset(session, after=after, before=before, limit=limit))
+    
+    def transcript(self, session):
+        # Uses the prefetch cache when the caller loaded it with prefetch_related('messages')
+        return list(session.messages.all())
+    
+    def delete_system(self, session):
+        ChatMessage.objects.filter(session=session, role='system').delete()
+    
+    def remove_transcript(self, session):
+        ChatMessage.objects.filter(session=session).delete()
+    
+    def restore(self, session, messages):
+        # auto_now_add stamps the rows on insert; put the original times back
+        timestamps = [message.timestamp for message in messages]
+        ChatMessage.objects.bulk_create(messages, batch_size=500)
+        for message, timestamp in zip(messages, timestamps):
+            message.timestamp = timestamp
+        ChatMessage.objects.bulk_update(messages, ['timestamp'], batch_size=500)
+    
+    def search(self, user, text, limit=20):
+        if search_index_exists():
+            hits = search_messages(user, text, limit)
+            # Hits are shown by their snippet: the full content is not needed
+            found = ChatMessage.objects.defer('content').in_bulk([message_id for message_id, _, _ in hits])
+            results = []
+            for message_id, snippet, rank in hits:
+                message = found.get(uuid.UUID(message_id))
+                if message is not None:
+                    message.snippet, message.rank = snippet, rank
+                    results.append(message)
+            return results
+        
+        # Without the FTS index (databases other than SQLite): a scan, newest first
+        words = [word.rstrip('*') for word in query_words(text)]
+        if not words:
+            return []
+        messages = ChatMessage.objects.filter(session__user=user).exclude(role='system')
+        for word in words:
+            messages = messages.filter(content__icontains=word)
+        results = list(messages.order_by('-timestamp')[:limit])
+        for message in results:
+            message.snippet, message.rank = make_snippet(message.content, text), None
+        return results
+    
+    def search_window(self, limit=20):
+        # FTS5 ranks a window of the newest matches; the scan returns the newest limit unranked
+        return max(limit, settings.CHAT_SEARCH_CANDIDATES) if search_index_exists() else limit
+    
+    def annotate_summaries(self, sessions):
+        """Count and preview as correlated subqueries rather than a JOIN/GROUP BY,
+        so they are only evaluated for the sessions on the requested page."""
+        conversation = ChatMessage.objects.filter(session=OuterRef('pk')).exclude(role='system')
+        count = conversation.order_by().values('session').annotate(count=Count('pk')).values('count')
+        latest = conversation.order_by('-seq').values(preview=Substr('content', 1, LAST_MESSAGE_PREVIEW_CHARS))
+        # Archived sessions have no rows left; their stub keeps count and preview
+        return sessions.annotate(
+            message_count=Coalesce(Subquery(count), 'archive__message_count', 0, output_field=IntegerField()),
+            last_message=Coalesce(Subquery(latest[:1]), 'archive__last_message', output_field=TextField())
+        )
+
+class MongoMessageStore(MessageStore):
+    """Messages as documents in a MongoDB collection.
+    
+    Every query filters on session_id and sorts or ranges on seq, so a single
+    unique (session_id, seq) index serves them all, and reads project only the
+    fields they return. Documents are written once the SQL transaction that
+    allocated their seq has committed: a failed turn leaves a gap in the
+    numbering rather than a document the session row does not account for.
+    """
+    FIELDS = {'_id': 1, 'seq': 1, 'role': 1, 'content': 1, 'timestamp': 1}
+    
+    def __init__(self, collection):
+        self.collection = collection
+    
+    @classmethod
+    def from_settings(cls):
+        import pymongo
+        
+        config = settings.MONGODB_DATABASES['default']
+        client = pymongo.MongoClient(config['host'], config['port'], tz_aware=True,
+                                     serverSelectionTimeoutMS=5000)
+        return cls(client[config['name']]['chat_messages'])
+    
+    def ensure_indexes(self):
+        """Create the indexes the store relies on (also done by setup_mongodb.py)"""
+        import pymongo
+        
+        self.collection.create_index([('session_id', pymongo.ASCENDING), ('seq', pymongo.ASCENDING)],
+                                     unique=True, name='session_seq')
+        self.collection.create_index([('user_id', pymongo.ASCENDING)], name='user_id')
+        # Text queries must then match user_id exactly, which keeps them to one user's entries
+        self.collection.create_index([('user_id', pymongo.ASCENDING), ('content', pymongo.TEXT)],
+                                     name='user_content_text')
+    
+    def _document(self, session, seq, role, content):
+        return {
+            '_id': str(uuid.uuid4()),
+            'session_id': str(session.pk),
+            'user_id': session.user_id,
+            'seq': seq,
+            'role': role,
+            'content': content,
+            'timestamp': timezone.now(),
+        }
+    
+    def _message(self, session, document):
+        return ChatMessage(
+            id=uuid.UUID(document['_id']),
+            session=session,
+            seq=document['seq'],
+            role=document['role'],
+            content=document['content'],
+            timestamp=document['timestamp'],
+        )
+    
+    def append(self, session, role, content):
+        with transaction.atomic(savepoint=False):
+            document = self._document(session, session.allocate_seq(), role, content)
+            transaction.on_commit(functools.partial(self.collection.insert_one, document))
+        return self._message(session, document)
+    
+    def append_many(self, session, messages):
+        with transaction.atomic(savepoint=False):
+            last_seq = session.allocate_seq(len(messages))
+            documents = [
+                self._document(session, seq, role, content)
+                for seq, (role, content) in enumerate(messages, start=last_seq - len(messages) + 1)
+            ]
+            transaction.on_commit(functools.partial(self.collection.insert_many, documents))
+        return [self._message(session, document) for document in documents]
+    
+    def copy(self, messages):
+        """Bulk-insert existing ChatMessage rows keeping their ids and seqs; returns the number inserted.
+        
+        Messages already in the collection are skipped, so an interrupted copy can be rerun.
+        """
+        from pymongo.errors import BulkWriteError
+        
+        documents = [{
+            '_id': str(message.pk),
+            'session_id': str(message.session_id),
+            'user_id': message.session.user_id,
+            'seq': message.seq,
+            'role': message.role,
+            'content': message.content,
+            'timestamp': message.timestamp,
+        } for message in messages]
+        if not documents:
+            return 0
+        try:
+            return len(self.collection.insert_many(documents, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            if any(error['code'] != 11000 for error in e.details['writeErrors']):
+                raise
+            return e.details['nInserted']
+    
+    def history(self, session):
+        cursor = (self.collection
+                  .find({'session_id': str(session.pk), 'role': {'$ne': 'system'}},
+                        {'_id': 0, 'seq': 1, 'role': 1, 'content': 1})
+                  .sort('seq', 1)
+                  .skip(session.context_folded))
+        return list(cursor)
+    
+    def page(self, session, after=None, before=None, limit=100):
+        query = {'session_id': str(session.pk)}
+        if before is not None:
+            query['seq'] = {'$lt': before}
+            direction = -1
+        else:
+            if after is not None:
+                query['seq'] = {'$gt': after}
+            direction = 1
+        cursor = self.collection.find(query, self.FIELDS).sort('seq', direction).limit(limit + 1)
+        return [self._message(session, document) for document in cursor]
+    
+    def transcript(self, session):
+        cursor = self.collection.find({'session_id': str(session.pk)}, self.FIELDS).sort('seq', 1)
+        return [self._message(session, document) for document in cursor]
+    
+    def delete_system(self, session):
+        self.collection.delete_many({'session_id': str(session.pk), 'role': 'system'})
+    
+    def remove_transcript(self, session):
+        transaction.on_commit(functools.partial(self.collection.delete_many, {'session_id': str(session.pk)}))
+    
+    def restore(self, session, messages):
+        self.copy(messages)
+    
+    def search(self, user, text, limit=20):
+        words = [word.rstrip('*') for word in query_words(text)]
+        if not words:
+            return []
+        # Quoted words must all match, as in the FTS5 search
+        query = {'user_id': user.pk, 'role': {'$ne': 'system'},
+                 '$text': {'$search': ' '.join(f'"{word}"' for word in words)}}
+        cursor = (self.collection
+                  .find(query, {**self.FIELDS, 'session_id': 1, 'score': {'$meta': 'textScore'}})
+                  .sort([('score', {'$meta': 'textScore'})])
+                  .limit(limit))
+        results = []
+        for document in cursor:
+            message = ChatMessage(
+                id=uuid.UUID(document['_id']),
+                session_id=uuid.UUID(document['session_id']),
+                seq=document['seq'],
+                role=document['role'],
+                content=document['content'],
+                timestamp=document['timestamp'],
+            )
+            message.snippet, message.rank = make_snippet(message.content, text), -document['score']
+            results.append(message)
+        return results
+    
+    def summarize(self, sessions):
+        """One aggregation for the whole page instead of a query per session"""
+        sessions = list(sessions)
+        pipeline = [
+            {'$match': {'session_id': {'$in': [str(session.pk) for session in sessions]},
+                        'role': {'$ne': 'system'}}},
+            {'$sort': {'session_id': 1, 'seq': 1}},
+            {'$group': {'_id': '$session_id', 'count': {'$sum': 1}, 'last': {'$last': '$content'}}},
+        ]
+        summaries = {row['_id']: row for row in self.collection.aggregate(pipeline)}
+        for session in sessions:
+            summary = summaries.get(str(session.pk))
+            session.message_count = summary['count'] if summary else 0
+            session.last_message = summary['last'][:LAST_MESSAGE_PREVIEW_CHARS] if summary else None
+        
+        # Archived sessions have no documents left; their stub keeps count and preview
+        archived = [session for session in sessions if session.archived]
+        if archived:
+            from .models import SessionArchive
+            stubs = SessionArchive.objects.in_bulk([session.pk for session in archived])
+            for session in archived:
+                session.message_count = stubs[session.pk].message_count
+                session.last_message = stubs[session.pk].last_message
+
+# Process-wide store shared by every request handled by this worker
+_message_store = None
+_message_store_lock = threading.Lock()
+
+def get_message_store():
+    """Return the worker's MessageStore as configured by CHAT_MESSAGE_STORE"""
+    global _message_store
+    if _message_store is None:
+        with _message_store_lock:
+            if _message_store is None:
+                backend = getattr(settings, 'CHAT_MESSAGE_STORE', 'orm')
+                if backend == 'mongodb':
+                    _message_store = MongoMessageStore.from_settings()
+                elif backend == 'orm':
+                    _message_store = ORMMessageStore()
+                else:
+                    raise ValueError(f"Unknown CHAT_MESSAGE_STORE {backend!r}, expected 'orm' or 'mongodb'")
+    return _message_store
@@ -0,0 +1,343 @@
+"""In-process metrics, served in the Prometheus text format at /api/metrics/.
+
+Counters, gauges and histograms keep their samples in a dict keyed by label
+values behind a lock of their own, so recording one costs a dict update.
+Cache hit rates are not recorded per lookup at all: the caches already count
+hits and misses, and their counters are copied in when the metrics are read.
+
+gunicorn runs several worker processes and a scrape reaches only one of
+them. With METRICS_DIR set, every process writes its samples to
+METRICS_DIR/<pid>.json every METRICS_FLUSH_INTERVAL seconds and at exit, and
+the process answering a scrape adds the files up: counters and histograms of
+every process that has run since the server started (gunicorn.conf.py clears
+the directory), gauges of the live ones only.
+"""
+import atexit
+import bisect
+import contextvars
+import functools
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+from context_window import MESSAGE_OVERHEAD_TOKENS, count_tokens
+
+from . import timing
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Histogram buckets: seconds, and queries per request
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Every metric by name, in the order they are exposed
+REGISTRY = {}
+
+class Metric:
+    """Samples of one metric in this process, keyed by a tuple of label values"""
+    kind = 'untyped'
+    
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY[name] = self
+    
+    def samples(self):
+        """[labels, value] pairs of this process, for a snapshot"""
+        with self.lock:
+            return [[list(labels), value] for labels, value in self.values.items()]
+    
+    def merge(self, total, value):
+        return total + value
+    
+    def expose(self, values):
+        """Lines of the text format for values ({labels: value})"""
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}"
+
+class Counter(Metric):
+    kind = 'counter'
+    
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+    
+    def set_total(self, labels, value):
+        """Mirror a count kept elsewhere (the caches' own hit counters)"""
+        with self.lock:
+            self.values[labels] = value
+
+class Gauge(Metric):
+    kind = 'gauge'
+    
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+    
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+class Histogram(Metric):
+    """Per label set: a count per bucket (the last one is +Inf), then the sum"""
+    kind = 'histogram'
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+    
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+    
+    def samples(self):
+        with self.lock:
+            return [[list(labels), list(state)] for labels, state in self.values.items()]
+    
+    def merge(self, total, value):
+        return [a + b for a, b in zip(total, value)]
+    
+    def expose(self, values):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for labels, state in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else format_value(bound)
+                yield f"{self.name}_bucket{format_labels(self.labelnames + ('le',), labels + (le,))} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(state[-1])}"
+            yield f"{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}"
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+REQUEST_SECONDS = Histogram('http_request_duration_seconds',
+                            'Time to answer a request (to the first byte of streamed responses)',
+                            ('view', 'method', 'status'))
+REQUEST_DB_QUERIES = Histogram('http_request_db_queries', 'Database queries run by a request', ('view',),
+                               buckets=QUERY_BUCKETS)
+REQUEST_DB_SECONDS = Histogram('http_request_db_duration_seconds', 'Time a request spent in database queries',
+                               ('view',))
+LLM_SECONDS = Histogram('llm_request_duration_seconds', 'Duration of upstream LLM completions',
+                        ('philosopher', 'model'))
+LLM_REQUESTS = Counter('llm_requests_total', 'Upstream LLM completions by outcome (ok, error, aborted)',
+                       ('philosopher', 'model', 'outcome'))
+LLM_TOKENS = Counter('llm_tokens_total', 'Tokens sent to (prompt) and received from (completion) the LLM',
+                     ('philosopher', 'model', 'direction'))
+LLM_IN_FLIGHT = Gauge('llm_in_flight_requests', 'Upstream LLM completions in progress', ('model',))
+CACHE_HITS = Counter('cache_hits_total', 'Lookups answered by a cache', ('cache',))
+CACHE_MISSES = Counter('cache_misses_total', 'Lookups a cache could not answer', ('cache',))
+
+# Metrics summed over live processes only
+LIVE_ONLY = {LLM_IN_FLIGHT.name}
+
+HTTP_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+# [queries, seconds] of the request being handled, shared with threads it hands work to
+REQUEST_QUERIES = contextvars.ContextVar('request_queries', default=None)
+
+def observe_query(execute, sql, params, many, context):
+    """Database execute wrapper that adds each query to the current request's totals"""
+    totals = REQUEST_QUERIES.get()
+    if totals is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        totals[0] += 1
+        totals[1] += time.perf_counter() - start
+
+def instrument_connection(sender, connection, **kwargs):
+    """connection_created handler: time every query run on the connection"""
+    # Called again each time the same connection object reconnects
+    if observe_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(observe_query)
+
+def observe_request(request, response, started, totals):
+    """Record a finished request's latency and database work"""
+    match = request.resolver_match
+    # View names rather than paths, so ids in URLs do not each make a time series
+    view = match.view_name if match else 'unmatched'
+    method = request.method if request.method in HTTP_METHODS else 'other'
+    REQUEST_SECONDS.observe(time.perf_counter() - started, (view, method, f"{response.status_code // 100}xx"))
+    REQUEST_DB_QUERIES.observe(totals[0], (view,))
+    REQUEST_DB_SECONDS.observe(totals[1], (view,))
+
+# Every turn re-sends the persona prompt and most of the history (the same
+# string objects, whose hashes Python keeps), so their estimates are reused
+@functools.lru_cache(maxsize=1024)
+def estimated_message_tokens(content):
+    return count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+class LLMCall:
+    """Context manager timing one upstream completion and counting it as in flight"""
+    
+    def __init__(self, philosopher, model):
+        self.labels = (philosopher or 'none', model)
+        self.model = (model,)
+    
+    def __enter__(self):
+        LLM_IN_FLIGHT.inc(self.model)
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, traceback):
+        elapsed = time.perf_counter() - self.start
+        LLM_SECONDS.observe(elapsed, self.labels)
+        # Also the llm phase of Server-Timing (not for streams, whose header is already sent)
+        timing.record('llm', elapsed)
+        LLM_IN_FLIGHT.dec(self.model)
+        if exc_type is None:
+            outcome = 'ok'
+        elif issubclass(exc_type, GeneratorExit):
+            # The client went away mid-stream
+            outcome = 'aborted'
+        else:
+            outcome = 'error'
+        LLM_REQUESTS.inc(self.labels + (outcome,))
+        return False
+    
+    def record_tokens(self, messages, content, usage=None):
+        """Count the tokens of the call from the API's usage report, else estimate them"""
+        usage = usage or {}
+        prompt = usage.get('prompt_tokens') or sum(estimated_message_tokens(message['content']) for message in messages)
+        completion = usage.get('completion_tokens') or count_tokens(content)
+        LLM_TOKENS.inc(self.labels + ('prompt',), prompt)
+        LLM_TOKENS.inc(self.labels + ('completion',), completion)
+
+def collect_caches():
+    """Copy the caches' hit and miss counters into CACHE_HITS and CACHE_MISSES"""
+    from llm_cache import get_response_cache
+    from question_cache import get_question_cache
+    from .history_cache import get_history_cache
+    
+    caches = {'llm_response': get_response_cache(), 'question': get_question_cache(), 'history': get_history_cache()}
+    for name, cache in caches.items():
+        if cache is None:
+            continue
+        stats = cache.stats()
+        CACHE_HITS.set_total((name,), stats['hits'])
+        CACHE_MISSES.set_total((name,), stats['misses'])
+
+def local_values():
+    """{metric name: {labels: value}} of this process"""
+    return {name: {tuple(labels): value for labels, value in metric.samples()} for name, metric in REGISTRY.items()}
+
+def write_snapshot(directory):
+    """Replace this process's snapshot file in directory"""
+    collect_caches()
+    samples = {name: metric.samples() for name, metric in REGISTRY.items()}
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(samples, f)
+    os.replace(tmp, os.path.join(directory, f"{os.getpid()}.json"))
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def merged_values(directory):
+    """{metric name: {labels: value}} summed over the snapshot files in directory"""
+    totals = {name: {} for name in REGISTRY}
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            with open(path) as f:
+                samples = json.load(f)
+        except (OSError, ValueError):
+            # Removed or half-written by a process being replaced
+            continue
+        alive = process_alive(int(os.path.basename(path)[:-len('.json')]))
+        for name, metric in REGISTRY.items():
+            if name in LIVE_ONLY and not alive:
+                continue
+            values = totals[name]
+            for labels, value in samples.get(name, []):
+                labels = tuple(labels)
+                values[labels] = metric.merge(values[labels], value) if labels in values else value
+    return totals
+
+def render():
+    """The metrics of the deployment in the Prometheus text format"""
+    if settings.METRICS_DIR:
+        write_snapshot(settings.METRICS_DIR)
+        values = merged_values(settings.METRICS_DIR)
+    else:
+        collect_caches()
+        values = local_values()
+    lines = []
+    for name, metric in REGISTRY.items():
+        lines.extend(metric.expose(values[name]))
+    return '\n'.join(lines) + '\n'
+
+def flush():
+    try:
+        write_snapshot(settings.METRICS_DIR)
+    except OSError as e:
+        logger.warning(f"Could not write metrics to {settings.METRICS_DIR}: {str(e)}")
+
+# pid of the process whose flusher thread is running
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+def start_flusher():
+    """Write this process's snapshot every METRICS_FLUSH_INTERVAL seconds and at exit (needs METRICS_DIR)"""
+    global _flusher_pid
+    if not settings.METRICS_DIR:
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    
+    def flush_periodically():
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            flush()
+    
+    threading.Thread(target=flush_periodically, name='metrics-flusher', daemon=True).start()
+    atexit.register(flush)
+
+def _after_fork():
+    """A forked worker starts from zero, with a flusher of its own"""
+    global _flusher_lock
+    # A lock held by another thread at the fork would never be released
+    _flusher_lock = threading.Lock()
+    for metric in REGISTRY.values():
+        metric.lock = threading.Lock()
+        metric.values.clear()
+    if _flusher_pid is not None:
+        start_flusher()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
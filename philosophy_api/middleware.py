@@ -0,0 +1,114 @@
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import REQUEST_QUERIES, observe_request
+from .timing import CURRENT, RequestTimings, header_value
+
+logger = logging.getLogger(__name__)
+
+class MetricsMiddleware:
+    """Record the latency and database queries of every request, by view"""
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        
+        totals = [0, 0.0]
+        token = REQUEST_QUERIES.set(totals)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            REQUEST_QUERIES.reset(token)
+        observe_request(request, response, started, totals)
+        return response
+    
+    async def __acall__(self, request):
+        totals = [0, 0.0]
+        # Queries run through sync_to_async see the same list: it copies the context
+        token = REQUEST_QUERIES.set(totals)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            REQUEST_QUERIES.reset(token)
+        observe_request(request, response, started, totals)
+        return response
+
+class ServerTimingMiddleware:
+    """Report the phases of a request (see timing.py) in a Server-Timing header and a sampled log line.
+    
+    Placed inside MetricsMiddleware, whose per-request query totals it reports as the db phase.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        
+        sampled = random.random() < settings.REQUEST_LOG_SAMPLE_RATE
+        if not (settings.SERVER_TIMING_HEADER or sampled):
+            return self.get_response(request)
+        
+        timings = RequestTimings()
+        token = CURRENT.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            CURRENT.reset(token)
+        return self.report(request, response, timings, sampled)
+    
+    async def __acall__(self, request):
+        sampled = random.random() < settings.REQUEST_LOG_SAMPLE_RATE
+        if not (settings.SERVER_TIMING_HEADER or sampled):
+            return await self.get_response(request)
+        
+        timings = RequestTimings()
+        token = CURRENT.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            CURRENT.reset(token)
+        return self.report(request, response, timings, sampled)
+    
+    def report(self, request, response, timings, sampled):
+        total = time.perf_counter() - timings.started
+        queries = REQUEST_QUERIES.get()
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = header_value(timings.phases, total, queries)
+        if sampled:
+            match = request.resolver_match
+            entry = {
+                'view': match.view_name if match else None,
+                'method': request.method,
+                # Without the query string, which may carry search terms
+                'path': request.path,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 2),
+                'phases_ms': {name: round(seconds * 1000, 2) for name, seconds in timings.phases.items()},
+            }
+            if queries is not None:
+                entry['db_queries'] = queries[0]
+                entry['db_ms'] = round(queries[1] * 1000, 2)
+            logger.info(f"request {json.dumps(entry)}")
+        return response
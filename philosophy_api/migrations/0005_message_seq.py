@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_seq(apps, schema_editor):
+    """Number existing messages 1..n per session in (timestamp, id) order"""
+    ChatSession = apps.get_model('philosophy_api', 'ChatSession')
+    ChatMessage = apps.get_model('philosophy_api', 'ChatMessage')
+
+    for session_pk in ChatSession.objects.values_list('pk', flat=True).iterator():
+        messages = list(ChatMessage.objects.filter(session_id=session_pk).order_by('timestamp', 'id').only('pk'))
+        for seq, message in enumerate(messages, start=1):
+            message.seq = seq
+        ChatMessage.objects.bulk_update(messages, ['seq'], batch_size=500)
+        ChatSession.objects.filter(pk=session_pk).update(last_seq=len(messages))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('philosophy_api', '0004_session_list_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='last_seq',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='seq',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_seq, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='seq',
+            field=models.PositiveIntegerField(editable=False),
+        ),
+        migrations.AlterModelOptions(
+            name='chatmessage',
+            options={'ordering': ['seq']},
+        ),
+        migrations.AddConstraint(
+            model_name='chatmessage',
+            constraint=models.UniqueConstraint(fields=('session', 'seq'), name='chatmessage_session_seq'),
+        ),
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='session',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='philosophy_api.chatsession'),
+        ),
+    ]
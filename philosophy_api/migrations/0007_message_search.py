@@ -0,0 +1,72 @@
+from django.db import migrations
+
+# The schema as of this migration, spelled out rather than imported from
+# philosophy_api.search so later changes to that module cannot alter it
+CREATE_SQL = [
+    """CREATE TABLE IF NOT EXISTS philosophy_api_chatmessage_search (
+        fts_rowid INTEGER PRIMARY KEY,
+        message_id char(32) NOT NULL UNIQUE
+    )""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS philosophy_api_chatmessage_fts USING fts5(
+        content, owner, tokenize = 'porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS philosophy_api_chatmessage_fts_insert
+        AFTER INSERT ON philosophy_api_chatmessage WHEN new.role != 'system'
+    BEGIN
+        INSERT INTO philosophy_api_chatmessage_search (message_id) VALUES (new.id);
+        INSERT INTO philosophy_api_chatmessage_fts (rowid, content, owner) VALUES (
+            last_insert_rowid(),
+            new.content,
+            'u' || (SELECT user_id FROM philosophy_api_chatsession WHERE id = new.session_id)
+        );
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS philosophy_api_chatmessage_fts_delete
+        AFTER DELETE ON philosophy_api_chatmessage WHEN old.role != 'system'
+    BEGIN
+        DELETE FROM philosophy_api_chatmessage_fts WHERE rowid = (
+            SELECT fts_rowid FROM philosophy_api_chatmessage_search WHERE message_id = old.id
+        );
+        DELETE FROM philosophy_api_chatmessage_search WHERE message_id = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS philosophy_api_chatmessage_fts_update
+        AFTER UPDATE OF content ON philosophy_api_chatmessage WHEN new.role != 'system'
+    BEGIN
+        UPDATE philosophy_api_chatmessage_fts SET content = new.content
+        WHERE rowid = (SELECT fts_rowid FROM philosophy_api_chatmessage_search WHERE message_id = new.id);
+    END""",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS philosophy_api_chatmessage_fts_update",
+    "DROP TRIGGER IF EXISTS philosophy_api_chatmessage_fts_delete",
+    "DROP TRIGGER IF EXISTS philosophy_api_chatmessage_fts_insert",
+    "DROP TABLE IF EXISTS philosophy_api_chatmessage_fts",
+    "DROP TABLE IF EXISTS philosophy_api_chatmessage_search",
+]
+
+
+def create_index(apps, schema_editor):
+    # SQLite only: other databases search with a scan
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('philosophy_api', '0006_session_archive'),
+    ]
+
+    operations = [
+        # Messages that already exist are indexed by manage.py rebuild_search_index
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 import uuid
 from django.contrib.auth import get_user_model
 import os
@@ -11,22 +12,102 @@ class ChatSession(models.Model):
     session_id = models.CharField(max_length=100, unique=True)
     philosopher = models.CharField(max_length=50)
     summary = models.TextField(blank=True, null=True)
+    # Rolling summary of the turns that no longer fit in the LLM context window
+    context_summary = models.TextField(blank=True, default='')
+    # Number of leading non-system messages already folded into context_summary
+    context_folded = models.PositiveIntegerField(default=0)
+    # Sequence number of the newest message (see ChatMessage.seq)
+    last_seq = models.PositiveIntegerField(default=0, editable=False)
+    # Messages moved to a compressed segment file (see SessionArchive)
+    archived = models.BooleanField(default=False, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Session lists are paginated by recency per user
+            models.Index(fields=['user', 'updated_at'], name='chatsession_user_updated'),
+            # The admin changelist is paged by recency across all users
+            models.Index(fields=['updated_at', 'id'], name='chatsession_updated'),
+        ]
+    
+    # Written only by targeted updates (message appends, context folding,
+    # archiving), which a full save of an instance loaded earlier must not undo
+    SERVER_MANAGED_FIELDS = ('last_seq', 'archived', 'context_summary', 'context_folded')
+    
     def __str__(self):
         return f"{self.session_id} - {self.philosopher}"
+    
+    def save(self, *args, **kwargs):
+        """Save the session; an update without update_fields leaves SERVER_MANAGED_FIELDS alone"""
+        if not args and not self._state.adding and not kwargs.get('force_insert') \
+                and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.SERVER_MANAGED_FIELDS
+            ]
+        return super().save(*args, **kwargs)
+    
+    def allocate_seq(self, count=1):
+        """Reserve the next count message sequence numbers and return the last one.
+        
+        The UPDATE locks the session row, so concurrent writers get distinct numbers.
+        Inside a caller's transaction no savepoint is needed: a failure aborts it anyway.
+        """
+        with transaction.atomic(savepoint=False):
+            sessions = ChatSession.objects.filter(pk=self.pk)
+            sessions.update(last_seq=F('last_seq') + count)
+            self.last_seq = sessions.values_list('last_seq', flat=True).get()
+        return self.last_seq
 
 # Use SQLite for messages if MongoDB is not available
 class ChatMessage(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages')
+    # Indexed through the (session, seq) constraint below
+    session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages', db_index=False)
     role = models.CharField(max_length=20)  # 'user', 'assistant', 'system'
     content = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Position in the session (1, 2, ...), allocated from ChatSession.last_seq on insert
+    seq = models.PositiveIntegerField(editable=False)
     
     class Meta:
-        ordering = ['timestamp']
+        ordering = ['seq']
+        constraints = [
+            # Also the index behind every per-session range query
+            models.UniqueConstraint(fields=['session', 'seq'], name='chatmessage_session_seq'),
+        ]
+        indexes = [
+            # Admin changelist pages and date filters
+            models.Index(fields=['timestamp', 'id'], name='chatmessage_timestamp'),
+        ]
+    
+    def __str__(self):
+        return f"{self.role}: {self.content[:50]}..."
+    
+    def save(self, *args, **kwargs):
+        if self.seq is not None:
+            return super().save(*args, **kwargs)
+        
+        # Allocate from the instance the caller holds, if any, so it stays in step
+        session = self.session if ChatMessage.session.is_cached(self) else ChatSession(pk=self.session_id)
+        with transaction.atomic(savepoint=False):
+            self.seq = session.allocate_seq()
+            super().save(*args, **kwargs)
+
+class SessionArchive(models.Model):
+    """Stub left in the database for a session whose messages were archived.
+    
+    The transcript is one gzip member at offset..offset+length of a segment
+    file in CHAT_ARCHIVE_DIR; count and preview keep session lists working.
+    """
+    session = models.OneToOneField(ChatSession, on_delete=models.CASCADE, primary_key=True, related_name='archive')
+    segment = models.CharField(max_length=100)
+    offset = models.BigIntegerField()
+    length = models.BigIntegerField()
+    message_count = models.PositiveIntegerField()
+    last_message = models.TextField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f"{self.role}: {self.content[:50]}..."
\ No newline at end of file
+        return f"{self.session_id} in {self.segment}"
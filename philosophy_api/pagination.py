@@ -0,0 +1,100 @@
+import base64
+import binascii
+import json
+
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+
+class SessionCursorPagination(CursorPagination):
+    """Cursor pagination for chat session lists, most recently active first.
+    
+    Cursors stay stable while new messages bump sessions to the top, and each
+    page is a single indexed range query instead of an OFFSET scan.
+    """
+    ordering = '-updated_at'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+# Page sizes for GET /sessions/{id}/messages/
+MESSAGE_PAGE_SIZE = 100
+MAX_MESSAGE_PAGE_SIZE = 500
+
+def encode_message_cursor(message):
+    """Opaque cursor for a message's position in its session"""
+    return base64.urlsafe_b64encode(f"seq:{message.seq}".encode('ascii')).decode('ascii')
+
+def decode_message_cursor(cursor):
+    """Return the seq encoded in a cursor; raises ValueError if it is invalid"""
+    try:
+        prefix, seq = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('ascii').split(':')
+        if prefix != 'seq':
+            raise ValueError(prefix)
+        return int(seq)
+    except (binascii.Error, UnicodeError, TypeError, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+# Hits returned by GET /sessions/search/
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+def message_page_size(value, default=MESSAGE_PAGE_SIZE, maximum=MAX_MESSAGE_PAGE_SIZE):
+    """Parse the limit query parameter, clamped to maximum"""
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('limit must be a positive integer')
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(limit, maximum)
+
+# Filtered admin changelists count matching rows up to this many
+ESTIMATED_COUNT_CAP = 10000
+
+def estimated_count(queryset):
+    """Row count of queryset without a COUNT(*) over a large table.
+    
+    An unfiltered queryset on SQLite is estimated from sqlite_stat1 (written
+    by ANALYZE) or else the largest rowid, both index lookups. A filtered one
+    is counted up to ESTIMATED_COUNT_CAP rows.
+    """
+    connection = connections[queryset.db]
+    if not queryset.query.where and connection.vendor == 'sqlite':
+        table = queryset.model._meta.db_table
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+                row = cursor.fetchone()
+            except DatabaseError:
+                # No sqlite_stat1 until ANALYZE has run once
+                row = None
+            if row is None:
+                cursor.execute(f"SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}")
+                row = cursor.fetchone()
+        return int(str(row[0] or 0).split()[0])
+    return queryset.order_by()[:ESTIMATED_COUNT_CAP].count()
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator for admin changelists of large tables, counting with estimated_count()"""
+    
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
+
+def encode_keyset_cursor(direction, values):
+    """Opaque cursor for the admin's keyset pages: 'next' or 'previous' of a row's ordering values"""
+    return base64.urlsafe_b64encode(json.dumps([direction, *values]).encode()).decode('ascii')
+
+def decode_keyset_cursor(cursor):
+    """Return (direction, values) from a cursor; raises ValueError if it is invalid"""
+    try:
+        direction, *values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if direction not in ('next', 'previous'):
+            raise ValueError(direction)
+        return direction, values
+    except (binascii.Error, UnicodeError, TypeError, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor}")
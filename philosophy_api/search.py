@@ -0,0 +1,151 @@
+"""Full-text search over chat messages with SQLite FTS5.
+
+philosophy_api_chatmessage_fts indexes the content of every non-system
+ChatMessage, plus an owner token (u<user id>) so that a user's query only
+walks that user's part of the index. FTS5 rows are keyed by an integer
+rowid, and ChatMessage rows have no stable one (VACUUM may renumber the
+implicit rowid of a table without an INTEGER PRIMARY KEY), so
+philosophy_api_chatmessage_search maps each message id to its FTS rowid.
+
+Triggers on ChatMessage (created by migration 0007, SQLite only) keep both
+tables in step with inserts (including bulk_create and rehydrated archives),
+deletes and content edits, inside the writing transaction. manage.py
+rebuild_search_index fills the index for messages written before it existed.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'philosophy_api_chatmessage_fts'
+MAP_TABLE = 'philosophy_api_chatmessage_search'
+
+# Newest matches of an admin search across all users
+ADMIN_SEARCH_MATCHES = 1000
+
+# Words in a snippet, and characters in one built without FTS5
+SNIPPET_TOKENS = 12
+SNIPPET_CHARS = 80
+SNIPPET_OPEN, SNIPPET_CLOSE = '**', '**'
+# Marks around matches when counting them
+MATCH_OPEN, MATCH_CLOSE = '\x02', '\x03'
+
+# Set once the worker has seen the FTS index
+_index_exists = False
+
+def search_index_exists():
+    """Whether the database has the FTS index"""
+    global _index_exists
+    if not _index_exists and connection.vendor == 'sqlite':
+        # Only a positive answer is kept: the index appears when migrations run
+        _index_exists = FTS_TABLE in connection.introspection.table_names()
+    return _index_exists
+
+def rebuild_search_index(batch_size=10000):
+    """Reindex every non-system message, batch_size at a time; returns the number indexed.
+    
+    Runs in one transaction, so messages written meanwhile wait rather than
+    being indexed twice.
+    """
+    indexed, last_id, last_rowid = 0, '', 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(f"DELETE FROM {MAP_TABLE}")
+        while True:
+            # Walk the primary key so each batch is a range scan
+            cursor.execute(f"""
+                INSERT INTO {MAP_TABLE} (message_id)
+                SELECT id FROM philosophy_api_chatmessage WHERE id > %s AND role != 'system' ORDER BY id LIMIT %s
+            """, [last_id, batch_size])
+            if cursor.rowcount <= 0:
+                return indexed
+            
+            cursor.execute(f"""
+                INSERT INTO {FTS_TABLE} (rowid, content, owner)
+                SELECT search.fts_rowid, message.content, 'u' || session.user_id
+                FROM {MAP_TABLE} search
+                JOIN philosophy_api_chatmessage message ON message.id = search.message_id
+                JOIN philosophy_api_chatsession session ON session.id = message.session_id
+                WHERE search.fts_rowid > %s
+            """, [last_rowid])
+            indexed += cursor.rowcount
+            cursor.execute(f"SELECT fts_rowid, message_id FROM {MAP_TABLE} ORDER BY fts_rowid DESC LIMIT 1")
+            last_rowid, last_id = cursor.fetchone()
+
+def query_words(text):
+    """Words of a search box query; a trailing * marks a prefix"""
+    return re.findall(r'\w+\*?', text)
+
+def fts_query(text):
+    """An FTS5 query matching messages that contain every word of text (a trailing * searches a prefix)"""
+    terms = []
+    for word in query_words(text):
+        prefix = word.endswith('*')
+        # Quoted, so FTS5 operators and column names in user input are plain words
+        terms.append(f'"{word.rstrip("*")}"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+def score(marked, length, average_length, k1=1.2, b=0.75):
+    """BM25 term-frequency saturation and length normalization for one candidate"""
+    frequency = marked.count(MATCH_OPEN)
+    return frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * length / average_length))
+
+def search_messages(user, text, limit=20):
+    """The user's best matches for text as (message id, snippet, rank) tuples, best (lowest rank) first.
+    
+    FTS5's bm25() first counts every document containing each term, which
+    for a common word means walking its whole doclist across all users. So
+    candidates are instead the user's CHAT_SEARCH_CANDIDATES newest matches, read
+    by descending rowid (FTS5 stops as soon as it has them), and are scored
+    on how often and how densely they contain the terms.
+    """
+    query = fts_query(text)
+    if not query:
+        return []
+    match = f'owner : "u{user.pk}" AND content : ({query})'
+    
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT rowid, highlight({FTS_TABLE}, 0, %s, %s), length(content) - length(replace(content, ' ', '')) + 1
+            FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rowid DESC LIMIT %s
+        """, [MATCH_OPEN, MATCH_CLOSE, match, max(limit, settings.CHAT_SEARCH_CANDIDATES)])
+        candidates = cursor.fetchall()
+        if not candidates:
+            return []
+        
+        average_length = sum(length for _, _, length in candidates) / len(candidates)
+        # Ties go to the newer message, which the candidates are already ordered by
+        ranks = sorted(((-score(marked, length, average_length), rowid) for rowid, marked, length in candidates),
+                       key=lambda rank: rank[0])[:limit]
+        ranks = {rowid: rank for rank, rowid in ranks}
+        
+        # Snippets for the hits only. FTS5 seeks to a rowid range but scans
+        # for an IN list, and the range lies within the candidates.
+        cursor.execute(f"""
+            SELECT search.message_id, snippet({FTS_TABLE}, 0, %s, %s, '…', %s), {FTS_TABLE}.rowid
+            FROM {FTS_TABLE} JOIN {MAP_TABLE} search ON search.fts_rowid = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid BETWEEN %s AND %s
+        """, [SNIPPET_OPEN, SNIPPET_CLOSE, SNIPPET_TOKENS, match, min(ranks), max(ranks)])
+        hits = [(message_id, snippet, ranks[rowid]) for message_id, snippet, rowid in cursor.fetchall()
+                if rowid in ranks]
+    return sorted(hits, key=lambda hit: hit[2])
+
+def matching_message_ids(text, limit=ADMIN_SEARCH_MATCHES):
+    """Subquery of the ids of the newest limit messages of any user matching text, for pk__in filters"""
+    return RawSQL(f"""
+        SELECT message_id FROM {MAP_TABLE} WHERE fts_rowid IN (
+            SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rowid DESC LIMIT %s
+        )
+    """, [f'content : ({fts_query(text)})', limit])
+
+def make_snippet(content, text):
+    """A snippet of content around the first word of text it contains, for stores without FTS5"""
+    words = [word.rstrip('*') for word in query_words(text)]
+    if not words:
+        return content[:SNIPPET_CHARS]
+    pattern = re.compile('|'.join(re.escape(word) for word in words), re.IGNORECASE)
+    match = pattern.search(content)
+    start = max(0, match.start() - SNIPPET_CHARS // 2) if match else 0
+    excerpt = pattern.sub(lambda m: f"{SNIPPET_OPEN}{m.group(0)}{SNIPPET_CLOSE}", content[start:start + SNIPPET_CHARS])
+    return ('…' if start else '') + excerpt + ('…' if start + SNIPPET_CHARS < len(content) else '')
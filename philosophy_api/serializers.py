@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import ChatSession, ChatMessage
+from .message_store import get_message_store
 from django.contrib.auth import get_user_model, authenticate
 from django.contrib.auth.password_validation import validate_password
 
@@ -46,12 +47,41 @@ class LoginSerializer(serializers.Serializer):
 class ChatMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatMessage
-        fields = ['id', 'role', 'content', 'timestamp']
+        fields = ['id', 'seq', 'role', 'content', 'timestamp']
 
 class ChatSessionSerializer(serializers.ModelSerializer):
-    messages = ChatMessageSerializer(many=True, read_only=True)
+    messages = serializers.SerializerMethodField()
     
     class Meta:
         model = ChatSession
         fields = ['id', 'session_id', 'philosopher', 'summary', 'created_at', 'updated_at', 'messages']
-        read_only_fields = ['id', 'created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['id', 'created_at', 'updated_at']
+    
+    def get_messages(self, session):
+        return ChatMessageSerializer(get_message_store().transcript(session), many=True).data
+
+class ChatSessionListSerializer(serializers.ModelSerializer):
+    """Slim session representation for lists: no transcript, just a count and a preview"""
+    message_count = serializers.IntegerField(read_only=True)
+    last_message = serializers.CharField(read_only=True, allow_null=True)
+    
+    class Meta:
+        model = ChatSession
+        fields = ['id', 'session_id', 'philosopher', 'summary', 'created_at', 'updated_at',
+                  'message_count', 'last_message']
+        read_only_fields = fields
+
+class MessageSearchResultSerializer(serializers.ModelSerializer):
+    """A search hit: the matching message without its full content, a snippet and its session"""
+    snippet = serializers.CharField(read_only=True)
+    rank = serializers.FloatField(read_only=True, allow_null=True)
+    session = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ChatMessage
+        fields = ['id', 'seq', 'role', 'timestamp', 'snippet', 'rank', 'session']
+    
+    def get_session(self, message):
+        # Sessions of the hits, loaded together by the view
+        session = self.context['sessions'][message.session_id]
+        return {'id': str(session.pk), 'philosopher': session.philosopher, 'summary': session.summary}
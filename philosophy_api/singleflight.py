@@ -0,0 +1,250 @@
+"""Coalescing of identical concurrent LLM requests ("single flight").
+
+When several callers ask for the same completion at the same moment (a
+double-click, a client retry, a popular starter question), only the first
+one - the leader - calls the API; the others wait for and share its result.
+
+SingleFlight coalesces between the threads of one process, AsyncSingleFlight
+between the coroutines of one event loop (the ASGI views). LockTable adds
+coalescing between processes on one host (e.g. gunicorn workers) through a
+small SQLite table: the process that inserts the key first is the leader and
+writes the result back for the waiting processes to read. Only callers that
+arrived while the call was in flight share its result; answering later ones
+is left to the response cache, which honours its per-philosopher settings.
+"""
+import logging
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from asgiref.sync import async_to_sync, sync_to_async
+
+logger = logging.getLogger(__name__)
+
+class _Call:
+    """An in-flight call that followers can wait on"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Share one execution of fn between threads calling do() with the same key"""
+    
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+    
+    def do(self, key, fn):
+        """Run fn() unless a call with this key is already in flight, and return its result"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+    
+    def stats(self):
+        return {'executed': self.executed, 'coalesced': self.coalesced}
+
+class AsyncSingleFlight:
+    """Share one execution of a coroutine function between coroutines calling do() with the same key.
+    
+    The call runs as a task of its own, so it completes (and its result is
+    cached) even if the request that started it is cancelled.
+    """
+    
+    def __init__(self):
+        # Keyed by event loop too: a task can only be awaited from its own loop
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+    
+    async def do(self, key, fn):
+        """Await fn() unless a call with this key is already in flight, and return its result"""
+        flight = (asyncio.get_running_loop(), key)
+        task = self._calls.get(flight)
+        if task is None:
+            task = self._calls[flight] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._finished(flight, done))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+    
+    def _finished(self, flight, task):
+        self._calls.pop(flight, None)
+        if not task.cancelled():
+            # Marks the error as retrieved if every waiter was cancelled
+            task.exception()
+    
+    def stats(self):
+        return {'executed': self.executed, 'coalesced': self.coalesced}
+
+class LockTable:
+    """Coalesce identical calls across processes through a SQLite lock table.
+    
+    Results stay readable for result_ttl seconds after the leader finishes, so
+    followers polling the table can pick them up; a caller that arrives after
+    the call finished does not reuse its result but runs fn() itself. Results
+    are stored as JSON, so fn() must return a JSON-serializable value (the
+    completion text). A leader that has not
+    finished within lease seconds (e.g. because its process died) is presumed
+    dead and the next caller takes over.
+    """
+    
+    def __init__(self, path, lease=120, result_ttl=10, poll_interval=0.05):
+        self.path = str(path)
+        self.lease = lease
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        
+        with self._connection() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS inflight ('
+                'key TEXT PRIMARY KEY, owner INTEGER NOT NULL, started_at REAL NOT NULL, '
+                'finished_at REAL, result TEXT, error TEXT)'
+            )
+    
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+    
+    def _try_lead(self, connection, key, now):
+        """Claim the key; returns True if this process is now the leader"""
+        # Forget finished calls whose results nobody needs any more and abandoned leases
+        connection.execute(
+            'DELETE FROM inflight WHERE (finished_at IS NOT NULL AND finished_at < ?) '
+            'OR (finished_at IS NULL AND started_at < ?)',
+            (now - self.result_ttl, now - self.lease)
+        )
+        cursor = connection.execute(
+            'INSERT OR IGNORE INTO inflight (key, owner, started_at) VALUES (?, ?, ?)',
+            (key, os.getpid(), now)
+        )
+        return cursor.rowcount == 1
+    
+    def do(self, key, fn):
+        """Run fn() unless another process is already running it for this key"""
+        connection = self._connection()
+        deadline = time.monotonic() + self.lease
+        # Whether this caller has seen the call in flight, and so may share its result
+        joined = False
+        
+        while True:
+            if self._try_lead(connection, key, time.time()):
+                break
+            
+            row = connection.execute(
+                'SELECT finished_at, result, error FROM inflight WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                continue
+            finished_at, result, error = row
+            if finished_at is None:
+                joined = True
+            elif joined:
+                if error is not None:
+                    raise RuntimeError(f"Coalesced LLM call failed: {error}")
+                return json.loads(result)
+            else:
+                # Finished before this call started: clear it and lead a new one
+                connection.execute('DELETE FROM inflight WHERE key = ? AND finished_at IS NOT NULL', (key,))
+                continue
+            
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for in-flight call {key}")
+            time.sleep(self.poll_interval)
+        
+        try:
+            result = fn()
+        except Exception as e:
+            connection.execute(
+                'UPDATE inflight SET finished_at = ?, error = ? WHERE key = ? AND owner = ?',
+                (time.time(), str(e), key, os.getpid())
+            )
+            raise
+        
+        connection.execute(
+            'UPDATE inflight SET finished_at = ?, result = ? WHERE key = ? AND owner = ?',
+            (time.time(), json.dumps(result), key, os.getpid())
+        )
+        return result
+
+class Coalescer:
+    """Thread-level single flight, optionally backed by a cross-process lock table"""
+    
+    def __init__(self, lock_table=None):
+        self.threads = SingleFlight()
+        self.tasks = AsyncSingleFlight()
+        self.lock_table = lock_table
+    
+    def do(self, key, fn):
+        if self.lock_table is None:
+            return self.threads.do(key, fn)
+        # Only one thread per process reaches the lock table for a given key
+        return self.threads.do(key, lambda: self.lock_table.do(key, fn))
+    
+    async def ado(self, key, fn):
+        """do() for a coroutine function fn, from an event loop"""
+        if self.lock_table is None:
+            return await self.tasks.do(key, fn)
+        # The lock table polls SQLite, so it waits in a thread; a leader runs fn back on this loop
+        return await self.tasks.do(key, lambda: sync_to_async(self.lock_table.do, thread_sensitive=False)(
+            key, async_to_sync(fn)
+        ))
+    
+    def stats(self):
+        threads, tasks = self.threads.stats(), self.tasks.stats()
+        return {name: threads[name] + tasks[name] for name in threads}
+
+# Process-wide coalescer shared by every client instance
+_coalescer = None
+_coalescer_lock = threading.Lock()
+
+def get_coalescer():
+    """Return the process-wide Coalescer, or None if LLM_SINGLEFLIGHT is 0.
+    
+    Set LLM_SINGLEFLIGHT_LOCK_PATH to a SQLite file to also coalesce between
+    processes on the same host.
+    """
+    global _coalescer
+    if os.getenv('LLM_SINGLEFLIGHT', '1') in ('0', 'false', 'no'):
+        return None
+    if _coalescer is None:
+        with _coalescer_lock:
+            if _coalescer is None:
+                lock_path = os.getenv('LLM_SINGLEFLIGHT_LOCK_PATH')
+                _coalescer = Coalescer(LockTable(lock_path) if lock_path else None)
+    return _coalescer
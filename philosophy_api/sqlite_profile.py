@@ -0,0 +1,24 @@
+"""Per-connection SQLite tuning for the opt-in production profile.
+
+settings.SQLITE_PRAGMAS (filled in when SQLITE_PRODUCTION=1) is applied to
+every new SQLite connection through the connection_created signal.
+"""
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Run the configured PRAGMA statements on a new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+    logger.debug(f"Applied SQLite pragmas to {connection.alias}: {pragmas}")
@@ -0,0 +1,134 @@
+"""The same contract tests against every message store"""
+import unittest
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase
+
+from philosophy_api.message_store import LAST_MESSAGE_PREVIEW_CHARS, MongoMessageStore, ORMMessageStore
+from philosophy_api.models import ChatSession
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+TURNS = [('user', 'What is virtue?'), ('assistant', 'Living by reason.'),
+         ('user', 'And duty?'), ('assistant', 'What nature asks of us. ' * 10)]
+
+class MessageStoreContract:
+    """Tests every MessageStore must pass; subclasses set up self.store"""
+    
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('reader')
+        self.session = self.new_session('contract')
+    
+    def new_session(self, session_id):
+        return ChatSession.objects.create(session_id=session_id, philosopher='marcus_aurelius', user=self.user)
+    
+    def append(self, session, messages):
+        """append_many in a committed transaction, so writes deferred to on_commit happen"""
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.store.append_many(session, messages)
+    
+    def summaries(self, sessions):
+        """A page of sessions with message_count and last_message, as the session list view loads it"""
+        page = list(self.store.annotate_summaries(sessions).order_by('session_id'))
+        self.store.summarize(page)
+        return [(session.session_id, session.message_count, session.last_message) for session in page]
+    
+    def test_append_numbers_messages_in_order(self):
+        first = self.append(self.session, TURNS[:2])
+        with self.captureOnCommitCallbacks(execute=True):
+            last = self.store.append(self.session, *TURNS[2])
+        
+        self.assertEqual([message.seq for message in first + [last]], [1, 2, 3])
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.last_seq, 3)
+        self.assertEqual([(message.role, message.content) for message in self.store.transcript(self.session)],
+                         TURNS[:3])
+    
+    def test_rolled_back_append_leaves_no_messages(self):
+        with self.assertRaises(RuntimeError):
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    self.store.append_many(self.session, TURNS)
+                    raise RuntimeError('turn failed')
+        
+        self.assertEqual(self.store.transcript(self.session), [])
+    
+    def test_history_skips_system_and_folded_messages(self):
+        self.append(self.session, [('system', 'You are Marcus Aurelius.')] + TURNS)
+        
+        self.assertEqual(self.store.history(self.session), [
+            {'seq': seq, 'role': role, 'content': content} for seq, (role, content) in enumerate(TURNS, start=2)
+        ])
+        
+        self.session.context_folded = 2
+        self.assertEqual([row['seq'] for row in self.store.history(self.session)], [4, 5])
+    
+    def test_page_reads_ranges_of_seq(self):
+        self.append(self.session, TURNS * 3)
+        
+        self.assertEqual([message.seq for message in self.store.page(self.session, limit=4)], [1, 2, 3, 4, 5])
+        self.assertEqual([message.seq for message in self.store.page(self.session, after=9, limit=4)], [10, 11, 12])
+        self.assertEqual([message.seq for message in self.store.page(self.session, before=4, limit=4)], [3, 2, 1])
+    
+    def test_page_returns_whole_messages(self):
+        self.append(self.session, TURNS)
+        
+        message = self.store.page(self.session, after=3)[0]
+        
+        self.assertEqual((message.seq, message.role, message.content), (4, *TURNS[3]))
+        self.assertEqual(message.session, self.session)
+        self.assertIsNotNone(message.pk)
+        self.assertIsNotNone(message.timestamp)
+    
+    def test_summaries_count_and_preview_conversation(self):
+        other = self.new_session('contract-other')
+        empty = self.new_session('contract-empty')
+        self.append(self.session, [('system', 'You are Marcus Aurelius.')] + TURNS)
+        self.append(other, TURNS[:1])
+        
+        self.assertEqual(self.summaries(ChatSession.objects.filter(pk__in=[self.session.pk, other.pk, empty.pk])), [
+            ('contract', 4, TURNS[3][1][:LAST_MESSAGE_PREVIEW_CHARS]),
+            ('contract-empty', 0, None),
+            ('contract-other', 1, TURNS[0][1]),
+        ])
+    
+    def test_delete_system(self):
+        self.append(self.session, [('system', 'You are Marcus Aurelius.')] + TURNS)
+        
+        self.store.delete_system(self.session)
+        
+        self.assertEqual([message.role for message in self.store.transcript(self.session)],
+                         [role for role, _ in TURNS])
+
+class ORMMessageStoreTests(MessageStoreContract, TestCase):
+    def setUp(self):
+        self.store = ORMMessageStore()
+        super().setUp()
+
+@unittest.skipIf(mongomock is None, 'mongomock is not installed')
+class MongoMessageStoreTests(MessageStoreContract, TestCase):
+    def setUp(self):
+        collection = mongomock.MongoClient(tz_aware=True)['philosophy_ai_test']['chat_messages']
+        self.store = MongoMessageStore(collection)
+        self.store.ensure_indexes()
+        super().setUp()
+    
+    def test_documents_wait_for_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.store.append_many(self.session, TURNS)
+            self.assertEqual(self.store.collection.count_documents({}), 0)
+        
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.store.collection.count_documents({'session_id': str(self.session.pk)}), 4)
+    
+    def test_reads_project_stored_fields(self):
+        self.append(self.session, TURNS)
+        
+        self.assertEqual(set(self.store.collection.find_one()),
+                         {'_id', 'session_id', 'user_id', 'seq', 'role', 'content', 'timestamp'})
+        self.assertEqual(set(self.store.history(self.session)[0]), {'seq', 'role', 'content'})
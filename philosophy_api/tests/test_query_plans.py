@@ -0,0 +1,98 @@
+"""EXPLAIN QUERY PLAN for the hot chat queries on SQLite.
+
+Each query must search one index on its leading columns: no table scan and
+no temporary B-tree for ORDER BY. The indexes are not covering on purpose.
+Message reads return the content column, the session list returns the
+whole row, and its count and preview subqueries read role and content. Covering them would copy every message body into the index,
+which roughly doubles the write cost and the database size, and would save
+only one rowid lookup per row returned on a page of 20 or 100 rows.
+"""
+import unittest
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from philosophy_api.message_store import ORMMessageStore
+from philosophy_api.models import ChatSession
+
+def query_plan(sql, params=()):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+def index_name(table, columns):
+    """Name of the index on table whose columns are exactly columns.
+    
+    Unique constraints show up under generated sqlite_autoindex_* names.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA index_list({table})")
+        for name in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f"PRAGMA index_info({name})")
+            if [row[2] for row in cursor.fetchall()] == columns:
+                return name
+    raise AssertionError(f"no index on {table} ({', '.join(columns)})")
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite query plans')
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.store = ORMMessageStore()
+        user = get_user_model().objects.create_user('plans')
+        cls.sessions = ChatSession.objects.filter(user=user)
+        for i in range(3):
+            session = ChatSession.objects.create(session_id=f"plans-{i}", philosopher='marcus_aurelius', user=user)
+            cls.store.append_many(session, [('user', 'What is virtue?'), ('assistant', 'Living by reason.')] * 5)
+        cls.session = session
+    
+    def setUp(self):
+        self.sessions_index = index_name('philosophy_api_chatsession', ['id'])
+        self.messages_index = index_name('philosophy_api_chatmessage', ['session_id', 'seq'])
+        self.archives_index = index_name('philosophy_api_sessionarchive', ['session_id'])
+    
+    def assertPlan(self, queryset, expected):
+        self.assertEqual(query_plan(*queryset.query.sql_with_params()), expected)
+    
+    def test_session_list_page(self):
+        sessions = self.store.annotate_summaries(self.sessions).order_by('-updated_at')[:20]
+        messages = f"SEARCH U0 USING INDEX {self.messages_index} (session_id=?)"
+        self.assertPlan(sessions, [
+            'SEARCH philosophy_api_chatsession USING INDEX chatsession_user_updated (user_id=?)',
+            f"SEARCH philosophy_api_sessionarchive USING INDEX {self.archives_index} (session_id=?) LEFT-JOIN",
+            'CORRELATED SCALAR SUBQUERY 1',
+            messages,
+            'CORRELATED SCALAR SUBQUERY 2',
+            messages,
+        ])
+    
+    def test_messages_after_cursor(self):
+        self.assertPlan(self.store.page_queryset(self.session, after=4), [
+            f"SEARCH philosophy_api_chatmessage USING INDEX {self.messages_index} (session_id=? AND seq>?)",
+        ])
+    
+    def test_messages_before_cursor(self):
+        self.assertPlan(self.store.page_queryset(self.session, before=4), [
+            f"SEARCH philosophy_api_chatmessage USING INDEX {self.messages_index} (session_id=? AND seq<?)",
+        ])
+    
+    def test_context_history(self):
+        self.assertPlan(self.store.history_queryset(self.session), [
+            f"SEARCH philosophy_api_chatmessage USING INDEX {self.messages_index} (session_id=?)",
+        ])
+    
+    def test_session_transcript(self):
+        self.assertPlan(self.session.messages.all(), [
+            f"SEARCH philosophy_api_chatmessage USING INDEX {self.messages_index} (session_id=?)",
+        ])
+    
+    def test_last_seq_allocation(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.session.allocate_seq()
+        # The UPDATE that bumps last_seq and the SELECT that reads it back
+        plans = [query_plan(query['sql']) for query in queries.captured_queries]
+        self.assertEqual(plans, [
+            [f"SEARCH philosophy_api_chatsession USING INDEX {self.sessions_index} (id=?)"],
+            [f"SEARCH philosophy_api_chatsession USING INDEX {self.sessions_index} (id=?)"],
+        ])
@@ -0,0 +1,176 @@
+"""Single-flight coalescing between threads, coroutines and processes"""
+import asyncio
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from philosophy_api.singleflight import AsyncSingleFlight, LockTable, SingleFlight
+
+def lead_through_table(path, key, calls_path, barrier, results):
+    """Process target: coalesce a slow call through the lock table at path"""
+    table = LockTable(path)
+    
+    def fn():
+        with open(calls_path, 'a') as calls:
+            calls.write(f"{os.getpid()}\n")
+        time.sleep(0.5)
+        return f"answer from {os.getpid()}"
+    
+    barrier.wait()
+    results.put(table.do(key, fn))
+
+class SlowUpstream:
+    """Counts calls and takes delay seconds to answer each"""
+    
+    def __init__(self, delay=0.2, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+    
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return 'the answer'
+
+def run_threads(count, target):
+    """Start count threads on target at once and return what each returned or raised"""
+    barrier = threading.Barrier(count)
+    outcomes = [None] * count
+    
+    def run(i):
+        barrier.wait()
+        try:
+            outcomes[i] = target()
+        except Exception as e:
+            outcomes[i] = e
+    
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flight, upstream = SingleFlight(), SlowUpstream()
+        
+        results = run_threads(16, lambda: flight.do('key', upstream))
+        
+        self.assertEqual(upstream.calls, 1)
+        self.assertEqual(results, ['the answer'] * 16)
+        self.assertEqual(flight.stats(), {'executed': 1, 'coalesced': 15})
+    
+    def test_waiters_get_the_leaders_error(self):
+        error = RuntimeError('upstream failed')
+        flight, upstream = SingleFlight(), SlowUpstream(error=error)
+        
+        results = run_threads(8, lambda: flight.do('key', upstream))
+        
+        self.assertEqual(upstream.calls, 1)
+        self.assertEqual(results, [error] * 8)
+    
+    def test_next_call_runs_again(self):
+        flight, upstream = SingleFlight(), SlowUpstream(delay=0)
+        
+        flight.do('key', upstream)
+        flight.do('key', upstream)
+        
+        self.assertEqual(upstream.calls, 2)
+
+class AsyncSingleFlightTests(SimpleTestCase):
+    def test_concurrent_coroutines_share_one_call(self):
+        flight, calls = AsyncSingleFlight(), []
+        
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return 'the answer'
+        
+        async def main():
+            return await asyncio.gather(*[flight.do('key', fetch) for _ in range(16)])
+        
+        self.assertEqual(asyncio.run(main()), ['the answer'] * 16)
+        self.assertEqual(len(calls), 1)
+    
+    def test_call_outlives_a_cancelled_leader(self):
+        flight = AsyncSingleFlight()
+        
+        async def fetch():
+            await asyncio.sleep(0.1)
+            return 'the answer'
+        
+        async def main():
+            leader = asyncio.ensure_future(flight.do('key', fetch))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.do('key', fetch))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower
+        
+        self.assertEqual(asyncio.run(main()), 'the answer')
+
+class LockTableTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'locks.sqlite3')
+        self.calls_path = os.path.join(directory.name, 'calls.txt')
+    
+    def test_processes_share_one_call(self):
+        context = multiprocessing.get_context('spawn')
+        barrier, results = context.Barrier(4), context.Queue()
+        processes = [
+            context.Process(target=lead_through_table, args=(self.path, 'key', self.calls_path, barrier, results))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        answers = [results.get(timeout=30) for _ in processes]
+        for process in processes:
+            process.join()
+        
+        with open(self.calls_path) as calls:
+            leaders = calls.read().split()
+        self.assertEqual(len(leaders), 1)
+        self.assertEqual(answers, [f"answer from {leaders[0]}"] * 4)
+    
+    def test_late_arrival_runs_fn_again(self):
+        table, upstream = LockTable(self.path), SlowUpstream(delay=0)
+        
+        table.do('key', upstream)
+        # The first result is still in the table (result_ttl) but was not waited for
+        table.do('key', upstream)
+        
+        self.assertEqual(upstream.calls, 2)
+    
+    def test_expired_lease_is_taken_over(self):
+        table, upstream = LockTable(self.path, lease=1), SlowUpstream(delay=0)
+        # A leader that claimed the key and died without finishing
+        with sqlite3.connect(self.path) as connection:
+            connection.execute(
+                'INSERT INTO inflight (key, owner, started_at) VALUES (?, ?, ?)', ('key', 0, time.time() - 5)
+            )
+        
+        started = time.monotonic()
+        self.assertEqual(table.do('key', upstream), 'the answer')
+        
+        self.assertEqual(upstream.calls, 1)
+        self.assertLess(time.monotonic() - started, 1)
+    
+    def test_waiters_get_the_leaders_error(self):
+        upstream = SlowUpstream(error=RuntimeError('upstream failed'))
+        
+        results = run_threads(4, lambda: LockTable(self.path).do('key', upstream))
+        
+        self.assertEqual(upstream.calls, 1)
+        self.assertEqual(sum(isinstance(result, RuntimeError) for result in results), 4)
@@ -0,0 +1,54 @@
+"""Per-request phase timings for the Server-Timing header and a sampled request log.
+
+ServerTimingMiddleware starts a RequestTimings for each request; code on
+the request's path wraps its phases in span() (or calls record() with a
+duration it measured itself). Phases of the same name add up, and may
+overlap: "db" is the total of every query, including those run inside the
+"history" or "serialize" phases.
+
+Outside a request, or when neither the header nor the log wants this
+request, span() only checks a context variable.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+
+class RequestTimings:
+    """Seconds spent per phase by the request being handled"""
+    __slots__ = ('started', 'phases')
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+    
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+CURRENT = contextvars.ContextVar('request_timings', default=None)
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as phase name of the current request"""
+    timings = CURRENT.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+def record(name, seconds):
+    """Add seconds measured elsewhere to phase name of the current request"""
+    timings = CURRENT.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+def header_value(phases, total, queries=None):
+    """Server-Timing value for phases (in seconds), db queries ([count, seconds]) and the total"""
+    metrics = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in phases.items()]
+    if queries is not None:
+        metrics.append(f'db;desc="{queries[0]} queries";dur={queries[1] * 1000:.1f}')
+    metrics.append(f"total;dur={total * 1000:.1f}")
+    return ', '.join(metrics)
@@ -1,8 +1,9 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
+from . import async_views
 from .auth_views import RegisterView, LoginView
-from .views import PingView
+from .views import MetricsView, PingView
 
 # Create a router for viewsets
 router = DefaultRouter()
@@ -15,4 +16,12 @@ urlpatterns = [
     path('auth/register/', RegisterView.as_view(), name='register'),
     path('auth/login/', LoginView.as_view(), name='login'),
     path('ping/', PingView.as_view(), name='ping'),  # Use the PingView class
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    # Async endpoints for ASGI deployments (same payloads as /sessions/)
+    path('async/sessions/', async_views.session_list, name='async-session-list'),
+    path('async/sessions/create_session/', async_views.create_session, name='async-session-create'),
+    path('async/sessions/search/', async_views.session_search, name='async-session-search'),
+    path('async/sessions/<uuid:pk>/', async_views.session_detail, name='async-session-detail'),
+    path('async/sessions/<uuid:pk>/messages/', async_views.session_messages, name='async-session-messages'),
+    path('async/sessions/<uuid:pk>/add_message/', async_views.add_message, name='async-session-add-message'),
 ]
\ No newline at end of file
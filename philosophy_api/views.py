@@ -5,44 +5,212 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from .models import ChatSession, ChatMessage
-from .serializers import ChatSessionSerializer, ChatMessageSerializer
+from .serializers import (
+    ChatSessionSerializer, ChatSessionListSerializer, ChatMessageSerializer, MessageSearchResultSerializer
+)
+from .pagination import (
+    MAX_SEARCH_PAGE_SIZE, SEARCH_PAGE_SIZE, SessionCursorPagination, decode_message_cursor, encode_message_cursor,
+    message_page_size
+)
 from .groq_client_django import GroqClient
+from .history_cache import HistoryRecord, get_history_cache
+from .message_store import get_message_store
+from .archive import rehydrate
+from . import metrics
+from .timing import span
+from .conditional import (
+    add_validators, session_etag, not_modified, representation, session_list_etag, strong_etag
+)
 from datetime import datetime
+import hmac
 import uuid
 import logging
 import json
+from django.conf import settings
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from rest_framework.views import APIView
 
 # Import the philosophers module
-from philosophers import PHILOSOPHERS, get_all_philosophers
+from philosophers import PERSONA_PROMPTS, PHILOSOPHERS, PROMPT_STYLES, get_all_philosophers, get_system_message
+from context_window import build_context
+
+# The registry only changes with a deployment, so it is listed and hashed once
+PHILOSOPHER_LIST = get_all_philosophers()
+PHILOSOPHERS_VERSION = strong_etag(PHILOSOPHERS)
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
+# Session columns a chat turn changes. Saving only these never overwrites
+# last_seq, which ChatSession.allocate_seq() advances in the database.
+SESSION_TURN_FIELDS = ['updated_at', 'context_summary', 'context_folded']
+
+def cached_history(session, message):
+    """History up to message (just saved) from the worker's cache, or None if it must be read"""
+    cache = get_history_cache()
+    if cache is None:
+        return None
+    return cache.append(session, message)
+
+def remember_history(session, rows):
+    """Turn MessageStore.history() rows into records and cache them for the next turn"""
+    history = [HistoryRecord(row['seq'], row['role'], row['content']) for row in rows]
+    cache = get_history_cache()
+    if cache is not None:
+        cache.put(session, history)
+    return history
+
+@span('history')
+def history_for_turn(session, message):
+    """Unfolded history of session including message, read from the database only when the cache is cold"""
+    history = cached_history(session, message)
+    if history is None:
+        history = remember_history(session, get_message_store().history(session))
+    return history
+
+@span('save')
+def save_reply(session, content):
+    """Save the assistant's reply and the session changes of the turn in one transaction"""
+    with transaction.atomic():
+        message = get_message_store().append(session, 'assistant', content)
+        
+        # Update session timestamp (and the rolling summary from build_prompt)
+        session.updated_at = datetime.now()
+        session.save(update_fields=SESSION_TURN_FIELDS)
+    
+    cache = get_history_cache()
+    if cache is not None:
+        cache.append(session, message)
+    return message
+
+def session_summaries(user):
+    """The user's sessions for ChatSessionListSerializer; pass each page through summarize_page()"""
+    return get_message_store().annotate_summaries(ChatSession.objects.filter(user=user))
+
+def summarize_page(sessions):
+    """Fill in counts and previews the store could not annotate in SQL"""
+    get_message_store().summarize(sessions)
+    return sessions
+
+def message_page(session, after=None, before=None, limit=100):
+    """Up to limit + 1 messages after or before a cursor.
+    
+    Messages are ordered by their per-session seq, so each page is a range
+    scan of the (session, seq) index. The extra row tells whether there is
+    more to fetch. Raises ValueError for a malformed cursor.
+    """
+    return get_message_store().page(
+        session,
+        after=decode_message_cursor(after) if after and not before else None,
+        before=decode_message_cursor(before) if before else None,
+        limit=limit
+    )
+
+def message_page_data(rows, limit, after=None, before=None):
+    """Response body for a page fetched with message_page, oldest message first"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before:
+        rows.reverse()
+    
+    with span('serialize'):
+        results = ChatMessageSerializer(rows, many=True).data
+    return {
+        'results': results,
+        # Pass as ?after= to get newer messages, or as ?before= to get older ones
+        'next': encode_message_cursor(rows[-1]) if rows else (after or before),
+        'previous': encode_message_cursor(rows[0]) if rows else (before or after),
+        'has_more': has_more,
+    }
+
+@span('search')
+def search_results(user, text, limit):
+    """Response body for a search of the user's messages, best match first"""
+    store = get_message_store()
+    hits = store.search(user, text, limit)
+    sessions = ChatSession.objects.filter(user=user).only('id', 'philosopher', 'summary').in_bulk(
+        {message.session_id for message in hits}
+    )
+    hits = [message for message in hits if message.session_id in sessions]
+    return {
+        'query': text,
+        # Results are the best of this many newest matches (null: of all matches)
+        'searched_newest': store.search_window(limit),
+        'results': MessageSearchResultSerializer(hits, many=True, context={'sessions': sessions}).data,
+    }
+
+def prompt_style_error(prompt_style):
+    """Error message for an unknown prompt_style in a request, else None"""
+    if prompt_style is None or prompt_style in PROMPT_STYLES:
+        return None
+    return f"Unknown prompt_style {prompt_style!r}; expected one of {', '.join(PROMPT_STYLES)}"
+
+@span('prompt')
+def build_prompt(session, history, prompt_style=None):
+    """Build the message list sent to the LLM within the token budget.
+    
+    Turns that no longer fit are folded into session.context_summary; the
+    caller persists this with its next session.save(update_fields=SESSION_TURN_FIELDS).
+    prompt_style picks the full or compact persona (default: PERSONA_PROMPT_STYLE).
+    """
+    # Add system message first
+    try:
+        system_prompt = get_system_message(session.philosopher, prompt_style)
+    except KeyError:
+        # Fallback if philosopher not found
+        system_prompt = 'You are a wise philosopher.'
+        logger.error(f"Philosopher {session.philosopher} not found in PHILOSOPHERS dictionary")
+    
+    window = build_context(
+        system_prompt,
+        list(history),
+        summary=session.context_summary,
+        budget=settings.CHAT_CONTEXT_TOKEN_BUDGET,
+        summary_budget=settings.CHAT_CONTEXT_SUMMARY_BUDGET,
+        persona_prompts=PERSONA_PROMPTS
+    )
+    
+    if window.folded:
+        session.context_summary = window.summary
+        session.context_folded += window.folded
+        cache = get_history_cache()
+        if cache is not None:
+            cache.fold(session, session.context_folded)
+    
+    return window.messages
+
 class PhilosopherViewSet(viewsets.ViewSet):
     """ViewSet for retrieving philosopher information"""
     permission_classes = [AllowAny]  # Allow anyone to view philosophers
     
+    def etag(self, request):
+        return strong_etag('philosophers', PHILOSOPHERS_VERSION, *representation(request, request.accepted_renderer.format))
+    
     def list(self, request):
         """List all available philosophers"""
-        philosophers = get_all_philosophers()
-        return Response(philosophers)
+        etag = self.etag(request)
+        response = not_modified(request, etag) or Response(PHILOSOPHER_LIST)
+        return add_validators(response, etag, private=False)
     
     def retrieve(self, request, pk=None):
         """Retrieve a specific philosopher by ID"""
         philosopher = PHILOSOPHERS.get(pk)
         if not philosopher:
             return Response({'error': 'Philosopher not found'}, status=status.HTTP_404_NOT_FOUND)
-        return Response({
+        
+        etag = self.etag(request)
+        response = not_modified(request, etag) or Response({
             'id': pk,
             'name': philosopher['name'],
-            'avatar': philosopher['avatar']
+            'avatar': philosopher['avatar'],
+            'prompt_tokens': philosopher['prompt_tokens']
         })
+        return add_validators(response, etag, private=False)
 
 # Update the ChatSessionViewSet to require authentication
 class ChatSessionViewSet(viewsets.ModelViewSet):
@@ -50,12 +218,54 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
     queryset = ChatSession.objects.all()
     serializer_class = ChatSessionSerializer
     permission_classes = [IsAuthenticated]  # Require authentication
+    pagination_class = SessionCursorPagination
     
     def get_queryset(self):
         """Filter sessions by user"""
         user = self.request.user
+        if self.action == 'list':
+            # Counts and previews instead of full transcripts
+            return session_summaries(user)
         return ChatSession.objects.filter(user=user)
     
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return ChatSessionListSerializer
+        return ChatSessionSerializer
+    
+    def get_object(self, rehydrated=True):
+        """The requested session, with its messages brought back first if it was archived"""
+        session = super().get_object()
+        if rehydrated:
+            rehydrate(session)
+        return session
+    
+    def list(self, request, *args, **kwargs):
+        """List the user's sessions, one cursor page at a time"""
+        etag = session_list_etag(request, request.user, request.accepted_renderer.format)
+        response = not_modified(request, etag)
+        if response is None:
+            page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+            with span('serialize'):
+                data = self.get_serializer(summarize_page(page), many=True).data
+            response = self.get_paginated_response(data)
+        return add_validators(response, etag)
+    
+    def retrieve(self, request, *args, **kwargs):
+        """A session with its transcript; 304 if the client's copy is current.
+        
+        The session row gives the ETag, so a 304 costs one query and a full
+        response one more for the transcript.
+        """
+        session = self.get_object(rehydrated=False)
+        etag = session_etag(request, session, kwargs['pk'], request.accepted_renderer.format)
+        response = not_modified(request, etag)
+        if response is None:
+            rehydrate(session)
+            with span('serialize'):
+                response = Response(self.get_serializer(session).data)
+        return add_validators(response, etag)
+    
     @action(detail=False, methods=['post'])
     def create_session(self, request):
         """Create a new chat session"""
@@ -89,55 +299,72 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
             logger.error(f"Error creating session: {str(e)}")
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Full-text search of the user's messages: ?q=<words>, best of the newest matches first"""
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response({'error': 'No query provided'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            limit = message_page_size(request.query_params.get('limit'), SEARCH_PAGE_SIZE, MAX_SEARCH_PAGE_SIZE)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(search_results(request.user, text, limit))
+    
+    @action(detail=True, methods=['get'])
+    def messages(self, request, pk=None):
+        """Page through a session's messages: ?after=<cursor> for newer, ?before=<cursor> for older"""
+        session = self.get_object(rehydrated=False)
+        etag = session_etag(request, session, pk, request.accepted_renderer.format)
+        response = not_modified(request, etag)
+        if response is not None:
+            return add_validators(response, etag)
+        
+        rehydrate(session)
+        after = request.query_params.get('after')
+        before = request.query_params.get('before')
+        
+        try:
+            limit = message_page_size(request.query_params.get('limit'))
+            rows = message_page(session, after=after, before=before, limit=limit)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return add_validators(Response(message_page_data(rows, limit, after=after, before=before)), etag)
+    
     @action(detail=True, methods=['post'])
     def add_message(self, request, pk=None):
         """Add a message to a chat session and get AI response"""
         try:
             session = self.get_object()
             user_message = request.data.get('message', '')
+            prompt_style = request.data.get('prompt_style')
             
             if not user_message:
                 return Response({'error': 'No message provided'}, status=status.HTTP_400_BAD_REQUEST)
+            error = prompt_style_error(prompt_style)
+            if error:
+                return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
             
             # Save user message to database
-            ChatMessage.objects.create(
-                session=session,
-                role='user',
-                content=user_message
-            )
+            message = get_message_store().append(session, 'user', user_message)
             
-            # Get all messages for this session
-            messages = []
+            # Get the recent messages that fit in the context window
+            messages = build_prompt(session, history_for_turn(session, message), prompt_style)
             
-            # Add system message first
-            try:
-                philosopher = PHILOSOPHERS[session.philosopher]
-                messages.append({'role': 'system', 'content': philosopher['system_message']})
-            except KeyError:
-                # Fallback if philosopher not found
-                messages.append({'role': 'system', 'content': 'You are a wise philosopher.'})
-                logger.error(f"Philosopher {session.philosopher} not found in PHILOSOPHERS dictionary")
-            
-            # Add all previous messages
-            db_messages = ChatMessage.objects.filter(session=session).order_by('timestamp')
-            for msg in db_messages:
-                messages.append({'role': msg.role, 'content': msg.content})
+            # Stream tokens as Server-Sent Events if the client asked for it
+            if request.query_params.get('stream') in ('1', 'true', 'yes'):
+                return self._stream_response(session, messages)
             
             # Get AI response
             try:
                 groq_client = GroqClient()
-                response = groq_client.generate_response(messages)
+                response = groq_client.generate_response(messages, philosopher=session.philosopher)
                 
                 # Save AI response to database
-                ChatMessage.objects.create(
-                    session=session,
-                    role='assistant',
-                    content=response
-                )
-                
-                # Update session timestamp
-                session.updated_at = datetime.now()
-                session.save()
+                save_reply(session, response)
                 
                 return Response({
                     'response': response,
@@ -156,6 +383,46 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
                 'details': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    def _stream_response(self, session, messages):
+        """Return a text/event-stream response that forwards tokens as they arrive"""
+        
+        def event(data, name=None):
+            prefix = f"event: {name}\n" if name else ""
+            return f"{prefix}data: {json.dumps(data)}\n\n"
+        
+        def event_stream():
+            tokens = []
+            try:
+                groq_client = GroqClient()
+                stream = groq_client.stream_response(messages, philosopher=session.philosopher)
+                try:
+                    for token in stream:
+                        tokens.append(token)
+                        yield event({'token': token})
+                finally:
+                    # Closes the upstream connection if the client went away mid-stream
+                    stream.close()
+            except GeneratorExit:
+                logger.info(f"Client disconnected from stream for session {session.session_id}")
+                raise
+            except Exception as e:
+                logger.error(f"Error streaming response: {str(e)}")
+                yield event({'error': f"Error generating response: {str(e)}"}, name='error')
+                return
+            
+            response = ''.join(tokens)
+            
+            # Save AI response to database once the stream has finished
+            save_reply(session, response)
+            
+            yield event({'response': response, 'session_id': session.session_id}, name='done')
+        
+        response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Stop reverse proxies (nginx) from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
     @action(detail=True, methods=['patch'], url_path='change-philosopher')
     def change_philosopher(self, request, pk=None):
         """Change philosopher for an existing chat session"""
@@ -171,18 +438,15 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
                               status=status.HTTP_400_BAD_REQUEST)
             
             session.philosopher = new_philosopher
-            session.save()
+            session.save(update_fields=['philosopher', 'updated_at'])
             
             # Update system message in existing messages
-            ChatMessage.objects.filter(session=session, role='system').delete()
-            ChatMessage.objects.create(
-                session=session,
-                role='system',
-                content=PHILOSOPHERS[new_philosopher]['system_message']
-            )
+            store = get_message_store()
+            store.delete_system(session)
+            store.append(session, 'system', PHILOSOPHERS[new_philosopher]['system_message'])
             
             return Response(self.get_serializer(session).data)
-            
+        
         except Exception as e:
             logger.error(f"Error changing philosopher: {str(e)}")
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -193,4 +457,20 @@ class PingView(APIView):
     permission_classes = [AllowAny]
     
     def get(self, request):
-        return Response({'status': 'ok'})
\ No newline at end of file
+        return Response({'status': 'ok'})
+
+class MetricsView(APIView):
+    """Prometheus scrape endpoint (see metrics.py)"""
+    permission_classes = [AllowAny]
+    # Scrapers send METRICS_TOKEN rather than a user's JWT
+    authentication_classes = []
+    
+    def get(self, request):
+        token = settings.METRICS_TOKEN
+        if not token and not settings.DEBUG:
+            # Unprotected metrics are only served in development
+            return HttpResponse('Not Found', status=404, content_type='text/plain')
+        authorization = request.headers.get('Authorization', '').encode()
+        if token and not hmac.compare_digest(authorization, f"Bearer {token}".encode()):
+            return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+        return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
\ No newline at end of file
@@ -25,10 +25,12 @@ INSTALLED_APPS = [
     'corsheaders',
     'philosophy_api',
     'rest_framework_simplejwt',  # Add JWT support
-    'djongo',  # MongoDB connector
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the other middleware too
+    'philosophy_api.middleware.MetricsMiddleware',
+    'philosophy_api.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -67,15 +69,47 @@ DATABASES = {
     }
 }
 
+# Opt-in SQLite profile for serving traffic (SQLITE_PRODUCTION=1): WAL so
+# readers never block the writer, fsync only at checkpoints, larger page cache
+# and memory map, and a busy timeout instead of "database is locked" errors.
+# The pragmas are applied to each new connection (philosophy_api/sqlite_profile.py).
+SQLITE_PRODUCTION = os.getenv('SQLITE_PRODUCTION', '0') in ('1', 'true', 'yes')
+SQLITE_PRAGMAS = {}
+if SQLITE_PRODUCTION:
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+        # Negative cache_size is in KiB
+        'cache_size': -int(os.getenv('SQLITE_CACHE_SIZE_KB', '65536')),
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+        'temp_store': 'MEMORY',
+    }
+    DATABASES['default'].update({
+        # Keep connections (and their page cache) across requests
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Take the write lock at BEGIN, where busy_timeout can wait for it,
+            # rather than failing when a read transaction tries to upgrade
+            'transaction_mode': 'IMMEDIATE',
+        },
+    })
+
 # MongoDB connection for chat sessions
 MONGODB_DATABASES = {
     'default': {
-        'name': 'philosophy_ai',
-        'host': 'localhost',
-        'port': 27017,
+        'name': os.getenv('MONGODB_NAME', 'philosophy_ai'),
+        # A hostname or a full mongodb:// URI
+        'host': os.getenv('MONGODB_HOST', 'localhost'),
+        'port': int(os.getenv('MONGODB_PORT', '27017')),
     }
 }
 
+# Where chat messages are kept: 'orm' (the database above) or 'mongodb'
+# (MONGODB_DATABASES, set up with setup_mongodb.py). See philosophy_api/message_store.py.
+CHAT_MESSAGE_STORE = os.getenv('CHAT_MESSAGE_STORE', 'orm')
+
 # Add these imports
 from datetime import timedelta
 
@@ -152,7 +186,8 @@ CORS_ALLOW_ALL_ORIGINS = True  # For development - restrict this in production
 # Remove the duplicate REST_FRAMEWORK setting at the bottom and keep only this one
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication, timed as the auth phase of Server-Timing
+        'philosophy_api.authentication.TimedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',  # Default to requiring authentication
@@ -162,12 +197,39 @@ REST_FRAMEWORK = {
 # Directory for storing chat sessions
 CHAT_SESSIONS_DIR = os.path.join(BASE_DIR, 'sessions')
 
+# Prompt size limits for add_message (approximate tokens, see context_window.py)
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv('CHAT_CONTEXT_TOKEN_BUDGET', '4096'))
+CHAT_CONTEXT_SUMMARY_BUDGET = int(os.getenv('CHAT_CONTEXT_SUMMARY_BUDGET', '256'))
+
+# Per-worker cache of unfolded chat history in bytes of message text (0 disables it)
+CHAT_HISTORY_CACHE_MAX_BYTES = int(os.getenv('CHAT_HISTORY_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+# Segment files for the transcripts of idle sessions (manage.py archive_sessions)
+CHAT_ARCHIVE_DIR = os.getenv('CHAT_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archive'))
+CHAT_ARCHIVE_SEGMENT_BYTES = int(os.getenv('CHAT_ARCHIVE_SEGMENT_BYTES', str(64 * 1024 * 1024)))
+
+# Newest matches of a message search that are ranked (GET /api/sessions/search/);
+# older matches are not returned, and responses report the window as searched_newest
+CHAT_SEARCH_CANDIDATES = int(os.getenv('CHAT_SEARCH_CANDIDATES', '100'))
+
+# Metrics at /api/metrics/ (see philosophy_api/metrics.py). With several worker
+# processes, METRICS_DIR is where each one leaves its samples for the others.
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+# Scrapes must send "Authorization: Bearer <METRICS_TOKEN>"; without a token
+# the endpoint answers 404 unless DEBUG is on
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Phase timings of each request (auth, db, prompt, llm, ...) in a Server-Timing header.
+# Off by default outside DEBUG: the timings tell clients how the server spends its time.
+SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', '1' if DEBUG else '0') in ('1', 'true', 'yes')
+# Fraction of requests logged as a JSON line with the same timings (0 turns the log off)
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv('REQUEST_LOG_SAMPLE_RATE', '0'))
 
 # Add this near the top of the file, after the imports
 import logging
 logger = logging.getLogger(__name__)
 
-
 # Add this at the end of the file
 # Logging Configuration
 LOGGING = {
@@ -0,0 +1,173 @@
+"""Near-duplicate cache for the opening question of a conversation.
+
+Many sessions open with a close paraphrase of the same question ("I'm
+feeling anxious about the future..."). When enabled, the Django GroqClient
+looks up the opening user message here and serves the stored answer of the
+same philosopher if a previous opening question is similar enough.
+
+Similarity is estimated with MinHash signatures over character 4-grams of
+the normalized question, computed with NumPy; locality-sensitive hashing
+(banded signatures) narrows a lookup to a handful of candidates, so lookups
+stay well under a millisecond at 100k cached questions. No network models.
+
+Configured through environment variables:
+
+    QUESTION_CACHE_ENABLED        set to 1 to enable (off by default)
+    QUESTION_CACHE_THRESHOLD      minimum estimated Jaccard similarity for a hit (0.7)
+    QUESTION_CACHE_MAX_ENTRIES    questions kept per process before new ones are ignored (100000)
+"""
+import os
+import re
+from array import array
+import threading
+import time
+
+import numpy as np
+
+SHINGLE_SIZE = 4
+NUM_PERMUTATIONS = 64
+# 16 bands of 4 rows: pairs above ~0.6 similarity almost always share a bucket
+NUM_BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // NUM_BANDS
+# Buckets larger than this are skipped during lookup (see QuestionCache.lookup)
+MAX_BUCKET_SCAN = 512
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(1729)
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERMUTATIONS).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERMUTATIONS).astype(np.uint64)
+_SHINGLE_WEIGHTS = (np.uint64(257) ** np.arange(SHINGLE_SIZE - 1, -1, -1, dtype=np.uint64))
+
+def normalize(text):
+    """Lowercase, expand common contractions and strip punctuation"""
+    text = text.lower().replace("’", "'")
+    text = re.sub(r"\b(i)'m\b", r"\1 am", text)
+    text = re.sub(r"n't\b", " not", text)
+    text = re.sub(r"'(re|ve|ll|d|s)\b", r" \1", text)
+    text = re.sub(r"[^\w\s]", " ", text)
+    return ' '.join(text.split())
+
+def signature(text):
+    """MinHash signature (NUM_PERMUTATIONS uint32 values) of a question"""
+    data = np.frombuffer(f" {normalize(text)} ".encode('utf-8'), dtype=np.uint8).astype(np.uint64)
+    if len(data) < SHINGLE_SIZE:
+        data = np.pad(data, (0, SHINGLE_SIZE - len(data)))
+    
+    # Hash every character 4-gram at once via a sliding window
+    windows = np.lib.stride_tricks.sliding_window_view(data, SHINGLE_SIZE)
+    shingles = np.unique((windows * _SHINGLE_WEIGHTS).sum(axis=1) & _MAX_HASH)
+    
+    # One universal hash per permutation, minimum over all shingles
+    hashed = (np.outer(_PERM_A, shingles) + _PERM_B[:, None]) % _MERSENNE_PRIME
+    return (hashed & _MAX_HASH).min(axis=1).astype(np.uint32)
+
+class QuestionCache:
+    """MinHash/LSH index of opening questions and their answers, per philosopher"""
+    
+    def __init__(self, threshold=0.7, max_entries=100000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._signatures = np.empty((1024, NUM_PERMUTATIONS), dtype=np.uint32)
+        self._answers = []
+        self._buckets = {}
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+    
+    def _band_keys(self, philosopher, sig):
+        return [
+            (philosopher, band, sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes())
+            for band in range(NUM_BANDS)
+        ]
+    
+    def lookup(self, philosopher, question):
+        """Return (answer, similarity) of the closest cached question, or (None, 0.0)"""
+        start = time.perf_counter()
+        sig = signature(question)
+        
+        band_keys = self._band_keys(philosopher, sig)
+        
+        # Copy the candidates under the lock: add() appends to these arrays,
+        # which fails while a numpy view of one is alive
+        with self._lock:
+            buckets = [self._buckets[key] for key in band_keys if key in self._buckets]
+            # Bands shared by boilerplate phrasing collect huge buckets that a true
+            # near-duplicate does not need: it also matches in the selective bands
+            selective = [bucket for bucket in buckets if len(bucket) <= MAX_BUCKET_SCAN]
+            if buckets and not selective:
+                selective = [min(buckets, key=len)[-MAX_BUCKET_SCAN:]]
+            # Buckets are int64 arrays, so gathering candidates stays vectorized
+            ids = np.concatenate([np.frombuffer(bucket, dtype=np.int64) for bucket in selective]) if selective else None
+            signatures = self._signatures
+        
+        answer, similarity = None, 0.0
+        if ids is not None:
+            ids = np.unique(ids)
+            # Fraction of agreeing MinHash values estimates the Jaccard similarity
+            scores = (signatures[ids] == sig).mean(axis=1)
+            best = int(scores.argmax())
+            if scores[best] >= self.threshold:
+                answer, similarity = self._answers[ids[best]], float(scores[best])
+        
+        with self._lock:
+            self.lookup_seconds += time.perf_counter() - start
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return answer, similarity
+    
+    def add(self, philosopher, question, answer):
+        """Store the answer to an opening question"""
+        sig = signature(question)
+        with self._lock:
+            entry_id = len(self._answers)
+            if entry_id >= self.max_entries:
+                return
+            if entry_id == len(self._signatures):
+                self._signatures = np.concatenate([self._signatures, np.empty_like(self._signatures)])
+            
+            self._signatures[entry_id] = sig
+            self._answers.append(answer)
+            for key in self._band_keys(philosopher, sig):
+                self._buckets.setdefault(key, array('q')).append(entry_id)
+    
+    def stats(self):
+        """Hit rate and mean lookup latency for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._answers),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'mean_lookup_ms': self.lookup_seconds / lookups * 1000 if lookups else 0.0,
+            }
+
+def opening_question(messages):
+    """The user message if messages is the opening turn of a conversation, else None"""
+    turns = [m for m in messages if m['role'] != 'system']
+    if len(turns) == 1 and turns[0]['role'] == 'user':
+        return turns[0]['content']
+    return None
+
+# Process-wide cache shared by every client instance
+_question_cache = None
+_question_cache_lock = threading.Lock()
+
+def get_question_cache():
+    """Return the process-wide QuestionCache, or None unless QUESTION_CACHE_ENABLED is set"""
+    global _question_cache
+    if os.getenv('QUESTION_CACHE_ENABLED', '0') not in ('1', 'true', 'yes'):
+        return None
+    if _question_cache is None:
+        with _question_cache_lock:
+            if _question_cache is None:
+                _question_cache = QuestionCache(
+                    float(os.getenv('QUESTION_CACHE_THRESHOLD', '0.7')),
+                    int(os.getenv('QUESTION_CACHE_MAX_ENTRIES', '100000'))
+                )
+    return _question_cache
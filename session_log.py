@@ -0,0 +1,503 @@
+"""Append-only storage for saved chat sessions.
+
+A session is two files in its user's directory:
+
+    <name>.jsonl       one line per message: {"seq": n, "message": {...}}
+    <name>.meta.json   philosopher, summary, username, timestamps and how
+                       much of the log has been saved, replaced atomically
+                       (written to a temporary file, then renamed)
+
+A save appends only the messages past the stored count, so its cost follows
+what changed rather than the length of the transcript. Writers hold an
+exclusive lock on the user's directory, so concurrent saves never interleave
+lines. A crash can leave a torn last line, or lines appended before the
+metadata caught up: reading skips the former and lets the last line for a
+seq win, and the next save notices that the log is not the size the metadata
+records and rewrites it. The log is also compacted (rewritten from the
+current messages) every SESSION_LOG_COMPACT_EVERY saves.
+
+Sessions in the older single-file format (<name>.json with metadata,
+checkpoints and full_log) are still read, and are converted on their next save.
+
+Listing a user's sessions reads only a manifest: a small SQLite index of
+each session's metadata next to the user's directory (<user>.manifest.sqlite3),
+updated by every save and delete. It records the directory's mtime, so any
+change made behind its back (files copied in or removed by hand, older code)
+is noticed and the index is brought up to date from the metadata files.
+Transcripts are read only when a listed session's messages are used. Each
+process keeps its manifest connections open (in WAL mode) between saves.
+
+The log of a session left idle can be compressed in place (manage.py
+archive_sessions): <name>.jsonl becomes <name>.jsonl.gz, still listed and
+read under its .jsonl name, and decompressed again by its next save.
+
+Settings (environment variables):
+    SESSION_LOG_COMPACT_EVERY   saves between compactions (default 50)
+"""
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, a single writer is assumed
+    fcntl = None
+
+LOG_SUFFIX = '.jsonl'
+ARCHIVED_SUFFIX = '.gz'
+META_SUFFIX = '.meta.json'
+LEGACY_SUFFIX = '.json'
+MANIFEST_SUFFIX = '.manifest.sqlite3'
+
+COMPACT_EVERY = int(os.getenv('SESSION_LOG_COMPACT_EVERY', '50'))
+# Open manifest connections kept per process
+MANIFEST_CONNECTIONS = 64
+
+def session_stem(filename):
+    """Session name without the suffix of either format"""
+    for suffix in (LOG_SUFFIX, LEGACY_SUFFIX):
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+def list_session_files(user_dir):
+    """Filenames of the sessions in user_dir, in either format"""
+    if not user_dir.exists():
+        return []
+    names = []
+    for path in user_dir.iterdir():
+        if path.name.endswith(LOG_SUFFIX):
+            names.append(path.name)
+        elif path.name.endswith(LOG_SUFFIX + ARCHIVED_SUFFIX):
+            # An archived log keeps its session's name (and a crash while
+            # unarchiving can leave both files for a moment)
+            if not (user_dir / path.name[:-len(ARCHIVED_SUFFIX)]).exists():
+                names.append(path.name[:-len(ARCHIVED_SUFFIX)])
+        elif path.name.endswith(LEGACY_SUFFIX) and not path.name.endswith(META_SUFFIX):
+            # A legacy file is superseded once its session has been converted
+            if not (user_dir / f"{session_stem(path.name)}{LOG_SUFFIX}").exists():
+                names.append(path.name)
+    return names
+
+@contextmanager
+def locked(user_dir):
+    """Hold an exclusive lock on user_dir for the duration of a write"""
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(user_dir, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+def write_atomic(path, text):
+    """Replace path with text so readers see either the old or the new file, never a partial one"""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def log_lines(messages, start_seq=1):
+    """JSONL entries for messages numbered from start_seq"""
+    return ''.join(
+        json.dumps({'seq': seq, 'message': message}) + '\n'
+        for seq, message in enumerate(messages, start=start_seq)
+    )
+
+def read_log(log_path):
+    """Messages of a log file, skipping torn lines and keeping the last line written for each seq"""
+    messages = []
+    archived_path = log_path.with_name(log_path.name + ARCHIVED_SUFFIX)
+    opened = open(log_path) if log_path.exists() or not archived_path.exists() else gzip.open(archived_path, 'rt')
+    with opened as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                seq, message = entry['seq'], entry['message']
+            except (ValueError, KeyError, TypeError):
+                # Torn write from a crashed save
+                continue
+            if seq <= len(messages):
+                # Appended again after a save that did not update the metadata
+                messages[seq - 1] = message
+            else:
+                messages.append(message)
+    return messages
+
+def read_meta(meta_path):
+    """Metadata of a session, or None if it has not been saved in the new format"""
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def read_legacy(path):
+    """(metadata, messages) of a session in the single-file format"""
+    with open(path) as f:
+        data = json.load(f)
+    if not all(key in data for key in ['metadata', 'full_log']):
+        raise ValueError("Invalid session format")
+    return data['metadata'], data['full_log']
+
+def write_session(user_dir, filename, messages, metadata):
+    """Save a session's messages and metadata (philosopher, summary, username); returns its filename.
+    
+    A session saved under a legacy .json name is converted, and its .jsonl
+    name is returned instead.
+    """
+    stem = session_stem(filename)
+    log_path = user_dir / f"{stem}{LOG_SUFFIX}"
+    meta_path = user_dir / f"{stem}{META_SUFFIX}"
+    legacy_path = user_dir / f"{stem}{LEGACY_SUFFIX}"
+    archived_path = user_dir / f"{stem}{LOG_SUFFIX}{ARCHIVED_SUFFIX}"
+    now = str(datetime.now())
+    
+    with locked(user_dir), Manifest(user_dir) as manifest:
+        # An index that was already stale needs a full check rather than one entry
+        was_current = manifest.is_current()
+        if archived_path.exists():
+            # Saving to an archived session makes it a live one again
+            unarchive_log(archived_path, log_path)
+        meta = read_meta(meta_path)
+        if meta is None:
+            created_at = read_legacy(legacy_path)[0].get('created_at', now) if legacy_path.exists() else now
+            meta = {'created_at': created_at, 'message_count': 0, 'log_bytes': None}
+        
+        count = meta['message_count']
+        saves = meta.get('saves_since_compaction', 0) + 1
+        log_bytes = log_path.stat().st_size if log_path.exists() else None
+        if log_bytes is None or log_bytes != meta['log_bytes'] or len(messages) < count or saves >= COMPACT_EVERY:
+            # Rewrite the whole log: it is new, holds leftovers of a failed save,
+            # messages were removed, or it is due for compaction
+            lines = log_lines(messages)
+            write_atomic(log_path, lines)
+            log_bytes = len(lines.encode())
+            saves = 0
+        elif len(messages) > count:
+            lines = log_lines(messages[count:], start_seq=count + 1)
+            with open(log_path, 'a') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            log_bytes += len(lines.encode())
+        
+        write_atomic(meta_path, json.dumps({
+            'created_at': meta['created_at'],
+            'updated_at': now,
+            'philosopher': metadata['philosopher'],
+            'summary': metadata['summary'],
+            'username': metadata['username'],
+            'message_count': len(messages),
+            'log_bytes': log_bytes,
+            'saves_since_compaction': saves,
+        }))
+        
+        converted = legacy_path.exists()
+        if converted:
+            os.remove(legacy_path)
+        
+        if was_current:
+            if converted:
+                manifest.remove(legacy_path.name)
+            # The row of this session is all that changed
+            manifest.record(log_path.name, {
+                'timestamp': meta['created_at'],
+                'philosopher': metadata['philosopher'],
+                'summary': metadata['summary'],
+                'username': metadata['username'],
+                'message_count': len(messages),
+            })
+            manifest.mark_current()
+        else:
+            manifest.reconcile()
+    
+    return log_path.name
+
+def delete_session(user_dir, filename):
+    """Delete a session in either format; returns False if it did not exist"""
+    stem = session_stem(filename)
+    paths = [user_dir / f"{stem}{suffix}"
+             for suffix in (LOG_SUFFIX, LOG_SUFFIX + ARCHIVED_SUFFIX, META_SUFFIX, LEGACY_SUFFIX)]
+    if not any(path.exists() for path in paths):
+        return False
+    
+    with locked(user_dir), Manifest(user_dir) as manifest:
+        was_current = manifest.is_current()
+        for path in paths:
+            if path.exists():
+                os.remove(path)
+        if was_current:
+            for suffix in (LOG_SUFFIX, LEGACY_SUFFIX):
+                manifest.remove(f"{stem}{suffix}")
+            manifest.mark_current()
+        else:
+            manifest.reconcile()
+    return True
+
+def unarchive_log(archived_path, log_path):
+    """Decompress an archived log back in place; the caller holds the directory lock"""
+    tmp_path = log_path.with_name(f".{log_path.name}.tmp")
+    with gzip.open(archived_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.replace(tmp_path, log_path)
+    os.remove(archived_path)
+
+def archive_idle_logs(user_dir, idle_before):
+    """Compress the logs of sessions last saved before idle_before; returns (sessions, bytes saved)"""
+    archived, saved = 0, 0
+    with locked(user_dir), Manifest(user_dir) as manifest:
+        was_current = manifest.is_current()
+        for log_path in user_dir.glob(f"*{LOG_SUFFIX}"):
+            meta = read_meta(user_dir / f"{session_stem(log_path.name)}{META_SUFFIX}")
+            if meta is None or datetime.fromisoformat(meta.get('updated_at', meta['created_at'])) >= idle_before:
+                continue
+            
+            archived_path = log_path.with_name(log_path.name + ARCHIVED_SUFFIX)
+            tmp_path = log_path.with_name(f".{archived_path.name}.tmp")
+            with open(log_path, 'rb') as src, gzip.open(tmp_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            with open(tmp_path, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, archived_path)
+            saved += log_path.stat().st_size - archived_path.stat().st_size
+            os.remove(log_path)
+            archived += 1
+        
+        # Listed names do not change, so the index only needs to know it is still current
+        if was_current:
+            manifest.mark_current()
+    return archived, saved
+
+def read_session(user_dir, filename):
+    """Load a session saved in either format; raises ValueError if it cannot be read"""
+    path = user_dir / filename
+    try:
+        if filename.endswith(LOG_SUFFIX):
+            meta = read_meta(user_dir / f"{session_stem(filename)}{META_SUFFIX}")
+            if meta is None:
+                raise ValueError("Missing session metadata")
+            messages = read_log(path)
+        else:
+            meta, messages = read_legacy(path)
+        
+        return {
+            'filename': path.name,
+            'timestamp': meta['created_at'],
+            'philosopher': meta['philosopher'],
+            'summary': meta.get('summary'),
+            'messages': messages,
+            'username': meta['username']
+        }
+    except Exception as e:
+        raise ValueError(f"Error loading session {path}: {e}")
+
+def session_summary(user_dir, filename):
+    """The listing fields of a session, without its messages for the new format"""
+    if filename.endswith(LOG_SUFFIX):
+        meta = read_meta(user_dir / f"{session_stem(filename)}{META_SUFFIX}")
+        if meta is None:
+            raise ValueError(f"Missing session metadata for {user_dir / filename}")
+        message_count = meta['message_count']
+    else:
+        meta, messages = read_legacy(user_dir / filename)
+        message_count = len(messages)
+    return {
+        'timestamp': meta['created_at'],
+        'philosopher': meta['philosopher'],
+        'summary': meta.get('summary'),
+        'username': meta['username'],
+        'message_count': message_count,
+    }
+
+class ListedSession(dict):
+    """A session from list_sessions(); session['messages'] reads the transcript on first use"""
+    __slots__ = ('user_dir',)
+    
+    def __missing__(self, key):
+        if key != 'messages':
+            raise KeyError(key)
+        self['messages'] = read_session(self.user_dir, self['filename'])['messages']
+        return self['messages']
+
+class ManifestConnection:
+    """An open manifest database, created on first use and shared by the threads of a process"""
+    
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        # Saves commit a row or two: WAL appends just those pages instead of
+        # journaling them, and small pages keep that to a few KiB (page_size
+        # only takes effect on a new manifest)
+        self.conn.execute("PRAGMA page_size=1024")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                filename TEXT PRIMARY KEY,
+                timestamp TEXT,
+                philosopher TEXT,
+                summary TEXT,
+                username TEXT,
+                message_count INTEGER,
+                source_mtime_ns INTEGER
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS sessions_timestamp ON sessions (timestamp)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER)")
+        self.conn.commit()
+        self.inode = os.stat(path).st_ino
+        # One transaction at a time on the connection
+        self.lock = threading.Lock()
+
+_manifest_connections = OrderedDict()
+_manifest_connections_lock = threading.Lock()
+
+def manifest_connection(path):
+    """The open connection to the manifest at path, reopened if the file was replaced or removed"""
+    try:
+        inode = os.stat(path).st_ino
+    except FileNotFoundError:
+        inode = None
+    key = (os.getpid(), str(path))
+    with _manifest_connections_lock:
+        connection = _manifest_connections.get(key)
+        if connection is not None and connection.inode == inode:
+            _manifest_connections.move_to_end(key)
+            return connection
+        
+        connection = _manifest_connections[key] = ManifestConnection(path)
+        # Close the least recently used connections that are not in use
+        for old_key in list(_manifest_connections)[:-MANIFEST_CONNECTIONS]:
+            old = _manifest_connections[old_key]
+            if old.lock.acquire(blocking=False):
+                del _manifest_connections[old_key]
+                old.conn.close()
+                old.lock.release()
+        return connection
+
+class Manifest:
+    """Per-user SQLite index of session metadata; use as a context manager"""
+    COLUMNS = ('filename', 'timestamp', 'philosopher', 'summary', 'username', 'message_count')
+    
+    def __init__(self, user_dir):
+        self.user_dir = user_dir
+        # Kept beside the user's directory, not in it, so that writing the
+        # manifest does not change the directory mtime it is checked against
+        self.path = user_dir.parent / f"{user_dir.name}{MANIFEST_SUFFIX}"
+    
+    def __enter__(self):
+        self.connection = manifest_connection(self.path)
+        self.connection.lock.acquire()
+        self.conn = self.connection.conn
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.connection.lock.release()
+    
+    def _source_path(self, filename):
+        # The file a save replaces: the metadata of a log, or the legacy file itself
+        if filename.endswith(LOG_SUFFIX):
+            return self.user_dir / f"{session_stem(filename)}{META_SUFFIX}"
+        return self.user_dir / filename
+    
+    def record(self, filename, summary, source_mtime_ns=None):
+        if source_mtime_ns is None:
+            source_mtime_ns = self._source_path(filename).stat().st_mtime_ns
+        self.conn.execute(
+            """
+            INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (filename) DO UPDATE SET
+                timestamp = excluded.timestamp, philosopher = excluded.philosopher, summary = excluded.summary,
+                username = excluded.username, message_count = excluded.message_count,
+                source_mtime_ns = excluded.source_mtime_ns
+            """,
+            (filename, summary['timestamp'], summary['philosopher'], summary['summary'],
+             summary['username'], summary['message_count'], source_mtime_ns)
+        )
+    
+    def remove(self, filename):
+        self.conn.execute("DELETE FROM sessions WHERE filename = ?", (filename,))
+    
+    def mark_current(self):
+        """Record that the index matches the directory as it is now"""
+        self.conn.execute("INSERT OR REPLACE INTO state VALUES ('dir_mtime_ns', ?)",
+                          (self.user_dir.stat().st_mtime_ns,))
+    
+    def is_current(self):
+        row = self.conn.execute("SELECT value FROM state WHERE key = 'dir_mtime_ns'").fetchone()
+        return row is not None and row[0] == self.user_dir.stat().st_mtime_ns
+    
+    def reconcile(self):
+        """Bring the index up to date with the directory, reading only sessions that changed"""
+        indexed = dict(self.conn.execute("SELECT filename, source_mtime_ns FROM sessions"))
+        present = set(list_session_files(self.user_dir))
+        
+        for filename in present:
+            try:
+                mtime_ns = self._source_path(filename).stat().st_mtime_ns
+                if indexed.get(filename) != mtime_ns:
+                    self.record(filename, session_summary(self.user_dir, filename), mtime_ns)
+            except (OSError, ValueError) as e:
+                print(f"Error indexing session {self.user_dir / filename}: {e}")
+        
+        self.conn.executemany("DELETE FROM sessions WHERE filename = ?",
+                              [(filename,) for filename in indexed.keys() - present])
+        self.mark_current()
+    
+    def rows(self, limit=None):
+        """Tuples of COLUMNS, newest session first"""
+        return self.conn.execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM sessions ORDER BY timestamp DESC LIMIT ?",
+            (-1 if limit is None else limit,)
+        ).fetchall()
+
+def list_sessions(user_dir, limit=None):
+    """The user's sessions (the newest limit, or all), newest first, from the manifest.
+    
+    Messages are loaded lazily, the first time session['messages'] is used.
+    """
+    if not user_dir.exists():
+        return []
+    
+    with Manifest(user_dir) as manifest:
+        current = manifest.is_current()
+        if current:
+            rows = manifest.rows(limit)
+    
+    if not current:
+        # Writers take the directory lock before the manifest, so this does too
+        with locked(user_dir), Manifest(user_dir) as manifest:
+            if not manifest.is_current():
+                manifest.reconcile()
+            rows = manifest.rows(limit)
+    
+    sessions = []
+    for row in rows:
+        session = ListedSession(zip(Manifest.COLUMNS, row))
+        session.user_dir = user_dir
+        sessions.append(session)
+    return sessions
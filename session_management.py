@@ -1,7 +1,7 @@
 from datetime import datetime
-import json
 from pathlib import Path
 from chat_history import CHAT_HISTORY_DIR
+from session_log import read_session, write_session
 
 def create_session(philosopher_id, username):
     """Create a new chat session"""
@@ -33,43 +33,14 @@ def save_session(session_data, summary_generator):
     
     # If session has a filename, use it (for updating existing sessions)
     if 'filename' in session_data and session_data['filename']:
-        filename = user_dir / session_data['filename']
+        filename = session_data['filename']
     else:
         # Create new filename for new sessions
-        filename = user_dir / f"{first_message}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        filename = f"{first_message}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
     
-    with open(filename, 'w') as f:
-        json.dump({
-            'metadata': {
-                'created_at': str(datetime.now()),
-                'philosopher': session_data['philosopher'],
-                'summary': session_data['summary'],
-                'username': session_data['username']
-            },
-            'checkpoints': session_data['messages'][::5] + [session_data['messages'][-1]] if session_data['messages'] else [],
-            'full_log': session_data['messages']
-        }, f, indent=2)
-    
-    return filename.name
+    # Appends only the messages added since the last save (see session_log.py)
+    return write_session(user_dir, filename, session_data['messages'], session_data)
 
 def load_session(username, filename):
-    """Load a specific session by filename"""
-    user_dir = CHAT_HISTORY_DIR / username
-    file_path = user_dir / filename
-    
-    try:
-        with open(file_path) as f:
-            data = json.load(f)
-            if not all(key in data for key in ['metadata', 'full_log']):
-                raise ValueError("Invalid session format")
-            
-            return {
-                'filename': file_path.name,
-                'timestamp': data['metadata']['created_at'],
-                'philosopher': data['metadata']['philosopher'],
-                'summary': data['metadata']['summary'],
-                'messages': data['full_log'],
-                'username': data['metadata']['username']
-            }
-    except Exception as e:
-        raise ValueError(f"Error loading session {file_path}: {e}")
\ No newline at end of file
+    """Load a specific session by filename (either the .jsonl log or an older .json file)"""
+    return read_session(CHAT_HISTORY_DIR / username, filename)
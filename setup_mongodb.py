@@ -65,10 +65,20 @@ def setup_mongodb():
         # Create collections
         chat_messages = db["chat_messages"]
         
-        # Create indexes
-        chat_messages.create_index([("session_id", pymongo.ASCENDING)])
-        chat_messages.create_index([("user_id", pymongo.ASCENDING)])
-        chat_messages.create_index([("timestamp", pymongo.ASCENDING)])
+        # Create indexes. Every message query of philosophy_api/message_store.py
+        # filters on session_id and ranges or sorts on seq, which also keeps the
+        # numbering unique; its prefix makes a separate session_id index redundant.
+        chat_messages.create_index([("session_id", pymongo.ASCENDING), ("seq", pymongo.ASCENDING)],
+                                   unique=True, name="session_seq")
+        chat_messages.create_index([("user_id", pymongo.ASCENDING)], name="user_id")
+        # Full-text search of a user's messages (GET /api/sessions/search/)
+        chat_messages.create_index([("user_id", pymongo.ASCENDING), ("content", pymongo.TEXT)],
+                                   name="user_content_text")
+        
+        # Indexes from earlier versions that only slow down inserts
+        for name in ("session_id_1", "timestamp_1"):
+            if name in chat_messages.index_information():
+                chat_messages.drop_index(name)
         
         logger.info("MongoDB setup completed successfully")
         return True
@@ -21,8 +21,14 @@ export const getPhilosopher = (id) => {
 };
 
 // Chat sessions API calls
-export const getChatSessions = () => {
-  return axios.get(`${API_URL}/sessions/`);
+// Returns one cursor page: { next, previous, results }
+export const getChatSessions = (cursorUrl = null) => {
+  return axios.get(cursorUrl || `${API_URL}/sessions/`);
+};
+
+// Returns { query, results: [{ id, seq, role, timestamp, snippet, rank, session }] }
+export const searchChatSessions = (q, limit = 20) => {
+  return axios.get(`${API_URL}/sessions/search/`, { params: { q, limit } });
 };
 
 export const createChatSession = (philosopher) => {
@@ -78,7 +78,7 @@ const Chat = () => {
         ]);
         
         setSession(sessionResponse.data);
-        setChatSessions(sessionsResponse.data);
+        setChatSessions(sessionsResponse.data.results);
         
         // Get philosopher details
         const philosopherResponse = await getPhilosopher(sessionResponse.data.philosopher);
@@ -55,7 +55,7 @@ const Dashboard = () => {
         ]);
         
         setPhilosophers(philosophersResponse.data);
-        setChatSessions(sessionsResponse.data);
+        setChatSessions(sessionsResponse.data.results);
       } catch (err) {
         console.error('Error fetching data:', err);
         setError('Failed to load data. Please try again.');
@@ -32,6 +32,44 @@ if 'auth_token' not in st.session_state:
     st.session_state.auth_token = None
 if 'user' not in st.session_state:
     st.session_state.user = None
+if 'sessions_page_url' not in st.session_state:
+    st.session_state.sessions_page_url = None
+if 'messages_cursor' not in st.session_state:
+    st.session_state.messages_cursor = None
+if 'current_philosopher' not in st.session_state:
+    st.session_state.current_philosopher = None
+if 'http_cache' not in st.session_state:
+    st.session_state.http_cache = {}
+
+# Responses kept for revalidation
+HTTP_CACHE_SIZE = 50
+
+def cached_get(url, params=None, headers=None):
+    """GET JSON, revalidating the copy from the last identical request.
+    
+    The API sends an ETag with the philosopher list, session lists and
+    message pages; sending it back as If-None-Match gets an empty 304 when
+    nothing changed. Raises requests.HTTPError for error responses.
+    """
+    key = json.dumps([url, params or {}], sort_keys=True)
+    cache = st.session_state.http_cache
+    headers = dict(headers or {})
+    if key in cache:
+        headers["If-None-Match"] = cache[key][0]
+    
+    response = requests.get(url, params=params, headers=headers)
+    if response.status_code == 304 and key in cache:
+        return cache[key][1]
+    response.raise_for_status()
+    
+    data = response.json()
+    etag = response.headers.get("ETag")
+    if etag:
+        cache.pop(key, None)
+        cache[key] = (etag, data)
+        while len(cache) > HTTP_CACHE_SIZE:
+            cache.pop(next(iter(cache)))
+    return data
 
 # Authentication functions
 def register_user(username, email, password, password2):
@@ -113,11 +151,46 @@ def login_user(username, password):
                 return False, str(e)
         return False, str(e)
 
+def open_chat(chat_id, philosopher):
+    """Make chat_id the current chat; its messages are fetched by sync_messages"""
+    st.session_state.current_chat_id = chat_id
+    st.session_state.current_philosopher = philosopher
+    st.session_state.messages = []
+    st.session_state.messages_cursor = None
+
+def sync_messages():
+    """Append the current chat's messages that arrived since the last sync.
+    
+    Only messages after st.session_state.messages_cursor are downloaded, so a
+    refresh costs O(new messages) rather than the whole transcript.
+    """
+    headers = {"Authorization": f"Bearer {st.session_state.auth_token}"}
+    while True:
+        params = {"limit": 200}
+        if st.session_state.messages_cursor:
+            params["after"] = st.session_state.messages_cursor
+        page = cached_get(
+            f"{API_URL}/sessions/{st.session_state.current_chat_id}/messages/",
+            params=params,
+            headers=headers
+        )
+        
+        st.session_state.messages.extend(
+            {"role": msg["role"], "content": msg["content"]} for msg in page["results"]
+        )
+        st.session_state.messages_cursor = page["next"]
+        if not page["has_more"]:
+            break
+
 def logout_user():
     st.session_state.auth_token = None
     st.session_state.user = None
     st.session_state.messages = []
     st.session_state.current_chat_id = None
+    st.session_state.current_philosopher = None
+    st.session_state.messages_cursor = None
+    st.session_state.sessions_page_url = None
+    st.session_state.http_cache = {}
     st.rerun()
 
 # Authentication UI
@@ -197,8 +270,7 @@ def main():
             try:
                 # Add authentication headers to the philosophers request
                 headers = {"Authorization": f"Bearer {st.session_state.auth_token}"} if st.session_state.auth_token else {}
-                response = requests.get(f"{API_URL}/philosophers/", headers=headers)
-                philosophers = response.json()
+                philosophers = cached_get(f"{API_URL}/philosophers/", headers=headers)
                 
                 # Check if philosophers is empty or not a list
                 if not philosophers or not isinstance(philosophers, list):
@@ -242,8 +314,9 @@ def main():
                             session = response.json()
                             
                             # Set the current chat ID
-                            st.session_state.current_chat_id = session.get("id")
-                            st.session_state.messages = []
+                            open_chat(session.get("id"), session.get("philosopher", selected_philosopher))
+                            # Show the first page again so the new chat is listed
+                            st.session_state.sessions_page_url = None
                             st.rerun()
                 except Exception as e:
                     st.error(f"Error creating chat: {str(e)}")
@@ -254,36 +327,41 @@ def main():
                 # Add authentication headers to the sessions request
                 headers = {"Authorization": f"Bearer {st.session_state.auth_token}"} if st.session_state.auth_token else {}
                 
-                # Make the request
-                response = requests.get(
-                    f"{API_URL}/sessions/",
-                    headers=headers
-                )
-                
-                # Check if the response is successful
-                if response.status_code >= 400:
-                    st.error(f"Error loading chats: {response.text}")
+                # Make the request (one cursor page of sessions, newest first)
+                try:
+                    page = cached_get(
+                        st.session_state.sessions_page_url or f"{API_URL}/sessions/",
+                        headers=headers
+                    )
+                except requests.HTTPError as e:
+                    st.error(f"Error loading chats: {e.response.text}")
+                    st.session_state.sessions_page_url = None
                 else:
-                    # Parse the response
-                    sessions = response.json()
-                    
-                    # Reverse the sessions to show newest first
-                    sessions = sorted(sessions, key=lambda x: x.get('updated_at', ''), reverse=True)
+                    sessions = page.get('results', [])
                     
                     # Display the sessions
                     for session in sessions:
                         # Handle case where summary might be None
-                        summary = session.get('summary', 'New conversation')
+                        summary = session.get('summary') or session.get('last_message')
                         summary_text = summary[:20] + "..." if summary and len(summary) > 20 else summary or "New conversation"
                         
                         if st.button(f"{session['philosopher']} - {summary_text}", key=session["id"]):
-                            st.session_state.current_chat_id = session["id"]
-                            # Load messages
-                            st.session_state.messages = [
-                                {"role": msg["role"], "content": msg["content"]}
-                                for msg in session.get("messages", [])
-                            ]
-                            st.rerun()
+                            # The list only carries a preview, so load the transcript
+                            open_chat(session["id"], session["philosopher"])
+                            try:
+                                sync_messages()
+                                st.rerun()
+                            except requests.RequestException as e:
+                                st.error(f"Error loading chat: {str(e)}")
+                    
+                    # Page through older chats
+                    col1, col2 = st.columns(2)
+                    if page.get('previous') and col1.button("Newer chats"):
+                        st.session_state.sessions_page_url = page['previous']
+                        st.rerun()
+                    if page.get('next') and col2.button("Older chats"):
+                        st.session_state.sessions_page_url = page['next']
+                        st.rerun()
             except Exception as e:
                 st.error(f"Error loading chats: {str(e)}")
         
@@ -294,15 +372,10 @@ def main():
                 st.divider()
                 st.subheader("Current Chat Settings")
                 
-                # Get current philosopher from API
+                # Current philosopher as of the last time the chat was opened or changed
                 try:
                     headers = {"Authorization": f"Bearer {st.session_state.auth_token}"}
-                    response = requests.get(
-                        f"{API_URL}/sessions/{st.session_state.current_chat_id}/",
-                        headers=headers
-                    )
-                    current_session = response.json()
-                    current_philosopher_id = current_session.get('philosopher', 'marcus_aurelius')
+                    current_philosopher_id = st.session_state.current_philosopher or 'marcus_aurelius'
                     
                     # Philosopher switcher
                     new_philosopher = st.selectbox(
@@ -324,16 +397,9 @@ def main():
                             
                             if response.status_code == 200:
                                 st.success("Philosopher changed successfully!")
-                                # Reload messages after change
-                                response = requests.get(
-                                    f"{API_URL}/sessions/{st.session_state.current_chat_id}/",
-                                    headers=headers
-                                )
-                                updated_session = response.json()
-                                st.session_state.messages = [
-                                    {"role": msg["role"], "content": msg["content"]}
-                                    for msg in updated_session.get("messages", [])
-                                ]
+                                st.session_state.current_philosopher = new_philosopher
+                                # Fetch the messages added by the change
+                                sync_messages()
                                 st.rerun()
                             else:
                                 st.error(f"Failed to change philosopher: {response.text}")
@@ -341,7 +407,7 @@ def main():
                             st.error(f"Error changing philosopher: {str(e)}")
                 except Exception as e:
                     st.error(f"Error getting session details: {str(e)}")
-
+            
             # Display chat messages
             for message in st.session_state.messages:
                 if message["role"] == "user":
@@ -351,8 +417,7 @@ def main():
             
             # Input for new message
             if prompt := st.chat_input("What would you like to discuss?"):
-                # Add user message to chat
-                st.session_state.messages.append({"role": "user", "content": prompt})
+                # Show the user message right away; it is stored by the next sync
                 st.chat_message("user").write(prompt)
                 
                 # Get AI response
@@ -365,8 +430,10 @@ def main():
                             headers=headers
                         )
                         ai_response = response.json().get("response", "I apologize, but I'm having trouble responding right now.")
-                        st.session_state.messages.append({"role": "assistant", "content": ai_response})
                         st.chat_message("assistant").write(ai_response)
+                        
+                        # Pick up both new messages without re-downloading the transcript
+                        sync_messages()
                     except Exception as e:
                         st.error(f"Error getting response: {str(e)}")
         else: